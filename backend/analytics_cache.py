@@ -0,0 +1,113 @@
+"""
+In-process cache for analytics results.
+
+Results are keyed by function, arguments and the global data version
+(backend.data_version), which every ORM write bumps in its own transaction:
+a write makes all older entries unreachable, and they age out of the LRU.
+The TTL only bounds how long an entry can live without being used.
+Concurrent misses on the same key are computed once (single-flight).
+
+Cached values are shared between requests and must be treated as read-only.
+"""
+import functools
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+from sqlalchemy.orm import Session
+
+from backend import data_version
+
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "600"))
+
+
+class AnalyticsCache:
+    def __init__(self, max_entries: int = ANALYTICS_CACHE_SIZE, ttl: float = ANALYTICS_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, key: Hashable):
+        """Return (found, value); caller holds self._lock"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have filled the entry while we waited
+            with self._lock:
+                found, value = self._lookup(key)
+                if found:
+                    self.hits += 1
+                    return value
+                self.misses += 1
+            try:
+                value = compute()
+                with self._lock:
+                    self._entries[key] = (time.monotonic() + self.ttl, value)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+cache = AnalyticsCache()
+
+
+def _freeze(value):
+    """Hashable form of an argument (lists of years...)"""
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+def cached(fn):
+    """Cache fn(db, *args, **kwargs) per arguments and data version"""
+    @functools.wraps(fn)
+    def wrapper(db: Session, *args, **kwargs):
+        version = data_version.get_versions(db, [data_version.GLOBAL]).get(data_version.GLOBAL, (0, None))[0]
+        key = (fn.__module__, fn.__qualname__, _freeze(args), _freeze(kwargs), version)
+        return cache.get_or_compute(key, lambda: fn(db, *args, **kwargs))
+    wrapper.uncached = fn
+    return wrapper
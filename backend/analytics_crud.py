@@ -1,49 +1,43 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, extract, case
-from typing import List, Dict
+from sqlalchemy import func, case
+from typing import List, Dict, Optional
 import backend.models as models
 import backend.schemas as schemas
 from datetime import datetime
+from backend import analytics_snapshot
+from backend.analytics_cache import cached
 
-def get_monthly_evolution(db: Session, year: int) -> List[schemas.MonthlyEvolution]:
-    """Calculate monthly stats for a specific year"""
-    # SQLite friendly month extraction
-    
-    # Number of requests (all offers created/received in that year)
-    requests = db.query(
-        func.strftime('%m', models.Offer.mail_date).label('month'),
-        func.count(models.Offer.id).label('count')
-    ).filter(models.Offer.year_stats == year).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-
-    # Proposed (all except pending registration)
-    proposed = db.query(
-        func.strftime('%m', models.Offer.mail_date).label('month'),
-        func.count(models.Offer.id).label('count')
-    ).filter(
-        models.Offer.year_stats == year,
-        models.Offer.status != models.OfferStatus.PENDING_REGISTRATION
-    ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-
-    # Accepted (using offer_amount as order value fallback)
-    accepted = db.query(
-        func.strftime('%m', models.Offer.mail_date).label('month'),
-        func.count(models.Offer.id).label('count'),
-        func.sum(models.Offer.offer_amount).label('value')
-    ).filter(
-        models.Offer.year_stats == year,
-        models.Offer.status == models.OfferStatus.ACCETTATA
-    ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-    
-    # Declined/Not accepted
-    declined = db.query(
-        func.strftime('%m', models.Offer.mail_date).label('month'),
-        func.count(models.Offer.id).label('count')
-    ).filter(
-        models.Offer.year_stats == year,
-        models.Offer.status.in_([models.OfferStatus.DECLINATA, models.OfferStatus.NON_ACCETTATA])
-    ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
 
-    # Aggregate by month
+DECLINED_STATUSES = [models.OfferStatus.DECLINATA, models.OfferStatus.NON_ACCETTATA]
+
+
+def monthly_evolution_query(db: Session, years: List[int]):
+    """Per (year, month): requests, proposed, accepted, declined and accepted value.
+
+    One conditional-aggregation scan of offer_monthly_facts (backend.rollups);
+    shared by the monthly evolution, the reports and the year comparison.
+    """
+    fact = models.OfferMonthlyFact
+    accepted = fact.status == models.OfferStatus.ACCETTATA
+    not_proposed = ("", models.OfferStatus.PENDING_REGISTRATION)  # "" = no status
+    return db.query(
+        fact.year_stats.label('year'),
+        fact.mail_month.label('month'),
+        func.sum(fact.offer_count).label('requests'),
+        func.sum(case((fact.status.not_in(not_proposed), fact.offer_count), else_=0)).label('proposed'),
+        func.sum(case((accepted, fact.offer_count), else_=0)).label('accepted'),
+        func.sum(case((fact.status.in_(DECLINED_STATUSES), fact.offer_count), else_=0)).label('declined'),
+        # using offer_amount as order value fallback
+        func.sum(case((accepted, fact.offer_value), else_=0)).label('order_value'),
+    ).filter(fact.year_stats.in_(years)).group_by(fact.year_stats, fact.mail_month)
+
+
+def _monthly_evolution_rows(db: Session, years: List[int]):
+    snapshot = analytics_snapshot.active(db)
+    return snapshot.monthly_evolution(years) if snapshot else monthly_evolution_query(db, years).all()
+
+def _monthly_evolution_from(rows, year: int) -> List[schemas.MonthlyEvolution]:
+    """Monthly evolution of `year` from monthly_evolution_query rows"""
     months_data = {}
     for i in range(1, 13):
         months_data[i] = {
@@ -57,22 +51,55 @@ def get_monthly_evolution(db: Session, year: int) -> List[schemas.MonthlyEvoluti
             "order_value": 0.0
         }
 
-    for r in requests: 
-        if r.month: months_data[int(r.month)]["requests"] = r.count
-    for p in proposed: 
-        if p.month: months_data[int(p.month)]["proposed"] = p.count
-    for a in accepted:
-        if a.month:
-            months_data[int(a.month)]["accepted"] = a.count
-            months_data[int(a.month)]["order_value"] = float(a.value or 0)
-    for d in declined: 
-        if d.month: months_data[int(d.month)]["declined"] = d.count
+    for r in rows:
+        if not r.month or r.year != year:
+            continue
+        data = months_data[int(r.month)]
+        data["requests"] = r.requests
+        data["proposed"] = int(r.proposed or 0)
+        data["accepted"] = int(r.accepted or 0)
+        data["declined"] = int(r.declined or 0)
+        data["order_value"] = float(r.order_value or 0)
 
     return [schemas.MonthlyEvolution(**v) for v in months_data.values()]
 
 
-def get_comparison_data(db: Session, years: List[int]) -> Dict[str, List[dict]]:
-    """Get aggregated stats for multiple years for comparison charts"""
+@cached
+def get_monthly_evolution(db: Session, year: int) -> List[schemas.MonthlyEvolution]:
+    """Calculate monthly stats for a specific year"""
+    return _monthly_evolution_from(_monthly_evolution_rows(db, [year]), year)
+
+
+MAX_COMPARISON_YEARS = 10
+MIN_YEAR, MAX_YEAR = 2000, 2100
+
+
+def parse_years(years: str) -> List[int]:
+    """Parse and validate a comma separated year list (deduplicated, order kept)"""
+    result = []
+    for token in (t.strip() for t in years.split(',')):
+        if not token:
+            continue
+        if not token.isdigit() or not MIN_YEAR <= int(token) <= MAX_YEAR:
+            raise ValueError(f"Invalid year: {token!r} (expected {MIN_YEAR}-{MAX_YEAR})")
+        if int(token) not in result:
+            result.append(int(token))
+    if not result:
+        raise ValueError("At least one year is required")
+    if len(result) > MAX_COMPARISON_YEARS:
+        raise ValueError(f"At most {MAX_COMPARISON_YEARS} years can be compared")
+    return result
+
+
+def default_comparison_years(year: int) -> List[int]:
+    """Previous and current year (only the current one at MIN_YEAR), after checking `year`"""
+    if not MIN_YEAR <= year <= MAX_YEAR:
+        raise ValueError(f"Invalid year: {year} (expected {MIN_YEAR}-{MAX_YEAR})")
+    return [y for y in (year - 1, year) if y >= MIN_YEAR]
+
+
+def _comparison_from(rows, years: List[int]) -> Dict[str, List[dict]]:
+    """Comparison chart data of `years` from monthly_evolution_query rows"""
     metrics = {
         "requests": [],
         "declined": [],
@@ -88,73 +115,51 @@ def get_comparison_data(db: Session, years: List[int]) -> Dict[str, List[dict]]:
             for y in years:
                 item[str(y)] = 0
 
-    for year in years:
-        # 1. Requests
-        data = db.query(
-            func.strftime('%m', models.Offer.mail_date).label('m'), 
-            func.count(models.Offer.id).label('c')
-        ).filter(models.Offer.year_stats == year).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-        for r in data: 
-            if r.m: metrics["requests"][int(r.m)-1][str(year)] = r.c
-            
-        # 2. Declined
-        data = db.query(
-            func.strftime('%m', models.Offer.mail_date).label('m'), 
-            func.count(models.Offer.id).label('c')
-        ).filter(
-            models.Offer.year_stats == year, 
-            models.Offer.status.in_([models.OfferStatus.DECLINATA, models.OfferStatus.NON_ACCETTATA])
-        ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-        for r in data: 
-            if r.m: metrics["declined"][int(r.m)-1][str(year)] = r.c
-
-        # 3. Proposed
-        data = db.query(
-            func.strftime('%m', models.Offer.mail_date).label('m'), 
-            func.count(models.Offer.id).label('c')
-        ).filter(
-            models.Offer.year_stats == year, 
-            models.Offer.status != models.OfferStatus.PENDING_REGISTRATION
-        ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-        for r in data: 
-            if r.m: metrics["proposed"][int(r.m)-1][str(year)] = r.c
-
-        # 4. Accepted
-        data = db.query(
-            func.strftime('%m', models.Offer.mail_date).label('m'), 
-            func.count(models.Offer.id).label('c')
-        ).filter(
-            models.Offer.year_stats == year, 
-            models.Offer.status == models.OfferStatus.ACCETTATA
-        ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-        for r in data: 
-            if r.m: metrics["accepted"][int(r.m)-1][str(year)] = r.c
-
-        # 5. Value (using offer_amount)
-        data = db.query(
-            func.strftime('%m', models.Offer.mail_date).label('m'), 
-            func.sum(models.Offer.offer_amount).label('v')
-        ).filter(
-            models.Offer.year_stats == year, 
-            models.Offer.status == models.OfferStatus.ACCETTATA
-        ).group_by(func.strftime('%m', models.Offer.mail_date)).all()
-        for r in data: 
-            if r.m: metrics["order_value"][int(r.m)-1][str(year)] = float(r.v or 0)
-            
+    # One scan grouped by (year, month) for every year and metric, pivoted here
+    for r in rows:
+        if not r.month or r.year not in years:
+            continue
+        i, year = int(r.month) - 1, str(r.year)
+        metrics["requests"][i][year] = r.requests
+        metrics["declined"][i][year] = int(r.declined or 0)
+        metrics["proposed"][i][year] = int(r.proposed or 0)
+        metrics["accepted"][i][year] = int(r.accepted or 0)
+        if r.accepted:
+            metrics["order_value"][i][year] = float(r.order_value or 0)
+
     return metrics
 
 
+@cached
+def get_comparison_data(db: Session, years: List[int]) -> Dict[str, List[dict]]:
+    """Get aggregated stats for multiple years for comparison charts"""
+    return _comparison_from(_monthly_evolution_rows(db, years), years)
+
+
+@cached
 def get_reasons_stats(db: Session, year: int) -> schemas.ReasonsAnalysis:
     """Analyze reasons for declining/not accepting"""
-    # Declined Reasons
-    declined_q = db.query(
+    # One scan of both statuses, split per status here
+    snapshot = analytics_snapshot.active(db)
+    rows = snapshot.reasons(year) if snapshot else db.query(
+        models.Offer.status,
         models.Offer.declined_reason,
+        models.Offer.not_accepted_reason,
         func.count(models.Offer.id)
     ).filter(
         models.Offer.year_stats == year,
-        models.Offer.status == models.OfferStatus.DECLINATA
-    ).group_by(models.Offer.declined_reason).all()
-    
+        models.Offer.status.in_([models.OfferStatus.DECLINATA, models.OfferStatus.NON_ACCETTATA])
+    ).group_by(models.Offer.status, models.Offer.declined_reason, models.Offer.not_accepted_reason).all()
+    declined_counts, not_accepted_counts = {}, {}
+    for status, declined_reason, not_accepted_reason, count in rows:
+        if status == models.OfferStatus.DECLINATA:
+            declined_counts[declined_reason] = declined_counts.get(declined_reason, 0) + count
+        else:
+            not_accepted_counts[not_accepted_reason] = not_accepted_counts.get(not_accepted_reason, 0) + count
+    declined_q = list(declined_counts.items())
+    not_accepted_q = sorted(not_accepted_counts.items(), key=lambda rc: (rc[0] is not None, rc[0] or ""))
+
+    # Declined Reasons
     total_declined = sum(c for r, c in declined_q)
     declined_stats = []
     for reason, count in declined_q:
@@ -166,14 +171,6 @@ def get_reasons_stats(db: Session, year: int) -> schemas.ReasonsAnalysis:
             ))
 
     # Not Accepted Reasons (text based)
-    not_accepted_q = db.query(
-        models.Offer.not_accepted_reason,
-        func.count(models.Offer.id)
-    ).filter(
-        models.Offer.year_stats == year,
-        models.Offer.status == models.OfferStatus.NON_ACCETTATA
-    ).group_by(models.Offer.not_accepted_reason).all()
-
     total_na = sum(c for r, c in not_accepted_q)
     na_stats = []
     for reason, count in not_accepted_q:
@@ -190,8 +187,12 @@ def get_reasons_stats(db: Session, year: int) -> schemas.ReasonsAnalysis:
     )
 
 
+@cached
 def get_client_ranking(db: Session, year: int) -> List[schemas.ClientRanking]:
     """Get top clients for the year with detailed stats"""
+    snapshot = analytics_snapshot.active(db)
+    if snapshot:
+        return _client_ranking_from(snapshot.client_ranking(year))
     ranking = db.query(
         models.Client.name,
         func.count(models.Offer.id).label('requests'),
@@ -202,8 +203,14 @@ def get_client_ranking(db: Session, year: int) -> List[schemas.ClientRanking]:
         func.sum(case((models.Offer.status == models.OfferStatus.ACCETTATA, models.Offer.offer_amount), else_=0)).label('total_value')
     ).join(models.Offer).filter(
         models.Offer.year_stats == year
-    ).group_by(models.Client.name).order_by(func.sum(case((models.Offer.status == models.OfferStatus.ACCETTATA, models.Offer.offer_amount), else_=0)).desc()).limit(50).all()
+    ).group_by(models.Client.name).order_by(
+        func.sum(case((models.Offer.status == models.OfferStatus.ACCETTATA, models.Offer.offer_amount), else_=0)).desc(),
+        models.Client.name  # deterministic order for equal values
+    ).limit(50).all()
+    return _client_ranking_from(ranking)
+
 
+def _client_ranking_from(ranking) -> List[schemas.ClientRanking]:
     result = []
     for r in ranking:
         result.append(schemas.ClientRanking(
@@ -219,40 +226,98 @@ def get_client_ranking(db: Session, year: int) -> List[schemas.ClientRanking]:
     return result
 
 
+def year_mix_query(db: Session, year: int):
+    """Per (sector, new item): offer count and value of one year, in total and
+    for the offers with a client (the others have no sector).
+
+    Shared by the sector distribution and the new-vs-reorder split.
+    """
+    fact = models.OfferMonthlyFact
+    has_client = fact.client_id != 0
+    return db.query(
+        fact.sector,
+        fact.is_new_item,
+        func.sum(fact.offer_count).label('count'),
+        func.sum(fact.offer_value).label('value'),
+        func.sum(case((has_client, fact.offer_count), else_=0)).label('client_count'),
+        func.sum(case((has_client, fact.offer_value), else_=0)).label('client_value')
+    ).filter(
+        fact.year_stats == year
+    ).group_by(fact.sector, fact.is_new_item)
+
+
+def _year_mix_rows(db: Session, year: int):
+    snapshot = analytics_snapshot.active(db)
+    return snapshot.year_mix(year) if snapshot else year_mix_query(db, year).all()
+
+
+def _sector_distribution_from(rows) -> List[Dict]:
+    sectors = {}
+    for r in rows:
+        if r.client_count:
+            sector = sectors.setdefault(r.sector, {"sector": r.sector or "Altro", "count": 0, "value": 0.0})
+            sector["count"] += r.client_count
+            sector["value"] += float(r.client_value or 0)
+    return [s for s in sectors.values() if s["count"]]
+
+
+def _new_vs_reorder_from(rows) -> Dict:
+    stats = {"new": {"count": 0, "value": 0.0}, "reorder": {"count": 0, "value": 0.0}}
+    for r in rows:
+        key = "new" if r.is_new_item else "reorder"
+        stats[key]["count"] += r.count
+        stats[key]["value"] += float(r.value or 0)
+    return stats
+
+
+@cached
 def get_sector_distribution(db: Session, year: int) -> List[Dict]:
     """Calculate revenue and offer count per business sector"""
-    data = db.query(
-        models.Client.sector,
-        func.count(models.Offer.id).label('count'),
-        func.sum(models.Offer.offer_amount).label('value')
-    ).join(models.Offer).filter(
-        models.Offer.year_stats == year
-    ).group_by(models.Client.sector).all()
-
-    return [
-        {
-            "sector": d.sector or "Altro",
-            "count": d.count,
-            "value": float(d.value or 0)
-        } for d in data
-    ]
+    return _sector_distribution_from(_year_mix_rows(db, year))
 
 
+@cached
 def get_new_vs_reorder_stats(db: Session, year: int) -> Dict:
     """Compare New Article vs Re-order (Riordine) stats"""
-    data = db.query(
-        models.Offer.is_new_item,
-        func.count(models.Offer.id).label('count'),
-        func.sum(models.Offer.offer_amount).label('value')
-    ).filter(
-        models.Offer.year_stats == year
-    ).group_by(models.Offer.is_new_item).all()
+    return _new_vs_reorder_from(_year_mix_rows(db, year))
 
-    stats = {"new": {"count": 0, "value": 0.0}, "reorder": {"count": 0, "value": 0.0}}
-    
-    for item in data:
-        key = "new" if item.is_new_item else "reorder"
-        stats[key]["count"] = item.count
-        stats[key]["value"] = float(item.value or 0)
-        
-    return stats
+
+# Parts of /analytics/bundle/{year}, in response order
+ANALYTICS_PARTS = ("monthly_evolution", "reasons", "client_ranking", "sector_distribution", "item_mix", "comparison")
+
+
+def parse_parts(parts: Optional[str]) -> List[str]:
+    """Parse a comma separated list of ANALYTICS_PARTS (all of them when empty)"""
+    requested = {p.strip() for p in (parts or "").split(',') if p.strip()}
+    unknown = requested - set(ANALYTICS_PARTS)
+    if unknown:
+        raise ValueError(f"Unknown parts: {', '.join(sorted(unknown))} (expected {', '.join(ANALYTICS_PARTS)})")
+    return [p for p in ANALYTICS_PARTS if p in requested or not requested]
+
+
+@cached
+def get_analytics_bundle(db: Session, year: int, parts: List[str], comparison_years: List[int]) -> Dict:
+    """The requested analytics parts of a year, computed in one session.
+
+    The monthly evolution and the comparison share one monthly_evolution_query
+    scan, the sector distribution and the item mix one year_mix_query scan.
+    """
+    result = {}
+    if "monthly_evolution" in parts or "comparison" in parts:
+        years = sorted({year, *comparison_years}) if "comparison" in parts else [year]
+        rows = _monthly_evolution_rows(db, years)
+        if "monthly_evolution" in parts:
+            result["monthly_evolution"] = _monthly_evolution_from(rows, year)
+        if "comparison" in parts:
+            result["comparison"] = _comparison_from(rows, comparison_years)
+    if "sector_distribution" in parts or "item_mix" in parts:
+        rows = _year_mix_rows(db, year)
+        if "sector_distribution" in parts:
+            result["sector_distribution"] = _sector_distribution_from(rows)
+        if "item_mix" in parts:
+            result["item_mix"] = _new_vs_reorder_from(rows)
+    if "reasons" in parts:
+        result["reasons"] = get_reasons_stats.uncached(db, year)
+    if "client_ranking" in parts:
+        result["client_ranking"] = get_client_ranking.uncached(db, year)
+    return {part: result[part] for part in parts}
@@ -2,10 +2,14 @@
 New analytics CRUD functions for M54 enrichment
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, extract
+from sqlalchemy import DateTime, Float, String, and_, func, case, extract, literal, or_
 from datetime import datetime, timedelta
-from typing import List, Optional
-from backend import models, schemas
+from typing import List, Optional, Tuple
+import re
+import numpy as np
+import pandas as pd
+from backend import analytics_snapshot, business_calendar, models, schemas
+from backend.analytics_cache import cached
 
 
 def get_user_performance(db: Session, user_id: int, period: str) -> Optional[models.UserPerformanceMetrics]:
@@ -16,115 +20,222 @@ def get_user_performance(db: Session, user_id: int, period: str) -> Optional[mod
     ).first()
 
 
-def get_team_performance(db: Session, period: str) -> List[dict]:
-    """Get performance metrics for all team members in a period with user names"""
-    metrics = db.query(models.UserPerformanceMetrics).filter(
-        models.UserPerformanceMetrics.period == period
-    ).all()
-    
-    # Enrich with user names
-    result = []
-    for metric in metrics:
-        user = db.query(models.User).filter(models.User.id == metric.user_id).first()
-        metric_dict = {
-            'user_id': metric.user_id,
-            'user_name': user.full_name if user else f'User {metric.user_id}',
-            'period': metric.period,
-            'offers_handled': metric.offers_handled,
-            'avg_processing_time_hours': metric.avg_processing_time_hours,
-            'success_rate': metric.success_rate,
-            'current_workload': metric.current_workload,
-            'accepted_count': metric.accepted_count,
-            'declined_count': metric.declined_count
-        }
-        result.append(metric_dict)
-    
-    return result
+PERIOD_FORMAT = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")  # "2024-01"
 
 
-def calculate_workflow_timing_stats(db: Session, year: int):
-    """Calculate timing statistics for each workflow phase"""
-    # Get all workflow steps for the year
-    steps = db.query(models.WorkflowStep).join(models.Offer).filter(
+def parse_period_range(period: Optional[str], period_from: Optional[str], period_to: Optional[str]) -> Tuple[str, str]:
+    """(first, last) period of a team performance request: `period` alone or a from/to range"""
+    if period and (period_from or period_to):
+        raise ValueError("Use either period or period_from/period_to")
+    first, last = (period, period) if period else (period_from or period_to, period_to or period_from)
+    if not first:
+        raise ValueError("period or period_from/period_to is required")
+    for value in (first, last):
+        if not PERIOD_FORMAT.match(value):
+            raise ValueError(f"Invalid period: {value} (expected YYYY-MM)")
+    if first > last:
+        raise ValueError("period_from must not be after period_to")
+    return first, last
+
+
+def team_performance_query(db: Session, period_from: str, period_to: str):
+    """Metrics of every team member in the period range with the user name, one row per (period, user)"""
+    metric = models.UserPerformanceMetrics
+    user_name = case(
+        (models.User.id.is_(None), literal('User ') + func.cast(metric.user_id, String)),
+        else_=models.User.full_name,
+    )
+    return db.query(
+        metric.user_id,
+        user_name.label('user_name'),
+        metric.period,
+        metric.offers_handled,
+        metric.avg_processing_time_hours,
+        metric.success_rate,
+        metric.current_workload,
+        metric.accepted_count,
+        metric.declined_count,
+    ).outerjoin(models.User, models.User.id == metric.user_id).filter(
+        metric.period.between(period_from, period_to)  # "YYYY-MM" sorts chronologically
+    ).order_by(metric.period, metric.id)
+
+
+@cached
+def get_team_performance(db: Session, period_from: str, period_to: Optional[str] = None) -> List[dict]:
+    """Performance metrics of all team members with user names, for one period or a from/to range"""
+    return [row._asdict() for row in team_performance_query(db, period_from, period_to or period_from)]
+
+
+# Workflow timing: percentiles and fixed histogram buckets (hours, last one open-ended)
+TIMING_PERCENTILES = (50, 90, 99)
+TIMING_HISTOGRAM_HOURS = (0, 1, 4, 8, 24, 48, 72, 168)
+
+
+WORKFLOW_STEP_COLUMNS = ["department", "actual_duration_minutes", "bottleneck_flag", "started_at", "completed_at"]
+
+
+def workflow_steps_query(db: Session, year: int):
+    """WORKFLOW_STEP_COLUMNS of the year's steps, in id order"""
+    step = models.WorkflowStep
+    return db.query(
+        *[getattr(step, name) for name in WORKFLOW_STEP_COLUMNS]
+    ).join(models.Offer).filter(
         models.Offer.year_stats == year
-    ).all()
-    
-    # Group by department and calculate stats
-    stats_by_phase = {}
-    for step in steps:
-        phase = step.department
-        if phase not in stats_by_phase:
-            stats_by_phase[phase] = {
-                'durations': [],
-                'bottlenecks': 0,
-                'total': 0
-            }
-        
-        stats_by_phase[phase]['total'] += 1
-        if step.actual_duration_minutes:
-            stats_by_phase[phase]['durations'].append(step.actual_duration_minutes / 60)
-        if step.bottleneck_flag:
-            stats_by_phase[phase]['bottlenecks'] += 1
-    
-    # Format results
+    ).order_by(step.id)
+
+
+def _workflow_timing_from(steps: pd.DataFrame, business_minutes: np.ndarray) -> List[dict]:
+    """Per department (first-seen order): counts, avg/min/max, percentiles and
+    histogram of the durations, and the business hours (started_at to
+    completed_at, backend.business_calendar) of the steps that have both;
+    steps without a duration only count in total_steps, steps without a
+    department (NULL, "" in the snapshot) are left out"""
+    department = steps["department"].astype(object)
+    known = (department.notna() & (department != "")).to_numpy()
+    steps, business_minutes = steps[known], business_minutes[known]
+    minutes = steps["actual_duration_minutes"].astype(float)
+    frame = pd.DataFrame({
+        "phase": steps["department"].astype(str).to_numpy(),
+        "hours": (minutes.where(minutes != 0) / 60).to_numpy(),
+        "bottleneck": steps["bottleneck_flag"].fillna(False).astype(bool).to_numpy(),
+        "business_hours": business_minutes / 60,
+    })
+    grouped = frame.groupby("phase", sort=False)
+    summary = grouped.agg(
+        total=("hours", "size"), bottlenecks=("bottleneck", "sum"),
+        avg=("hours", "mean"), min=("hours", "min"), max=("hours", "max"),
+        avg_business=("business_hours", "mean"))
+    business_p90 = grouped["business_hours"].quantile(0.9)
+    quantiles = grouped["hours"].quantile([p / 100 for p in TIMING_PERCENTILES]).unstack()
+    edges = list(TIMING_HISTOGRAM_HOURS) + [np.inf]
+    buckets = pd.cut(frame["hours"], bins=edges, right=False, labels=False)
+    histogram = pd.crosstab(frame["phase"], buckets).reindex(
+        index=summary.index, columns=range(len(TIMING_HISTOGRAM_HOURS)), fill_value=0)
+
+    def hours(value):
+        return 0 if pd.isna(value) else float(value)
+
     results = []
-    for phase, data in stats_by_phase.items():
-        durations = data['durations']
-        results.append({
+    for phase, row in summary.iterrows():
+        result = {
             'phase': phase,
-            'avg_duration_hours': sum(durations) / len(durations) if durations else 0,
-            'min_duration_hours': min(durations) if durations else 0,
-            'max_duration_hours': max(durations) if durations else 0,
-            'bottleneck_count': data['bottlenecks'],
-            'total_steps': data['total']
-        })
-    
+            'avg_duration_hours': hours(row['avg']),
+            'min_duration_hours': hours(row['min']),
+            'max_duration_hours': hours(row['max']),
+            'bottleneck_count': int(row['bottlenecks']),
+            'total_steps': int(row['total'])
+        }
+        for p in TIMING_PERCENTILES:
+            result[f'p{p}_duration_hours'] = hours(quantiles.at[phase, p / 100])
+        result['avg_business_hours'] = hours(row['avg_business'])
+        result['p90_business_hours'] = hours(business_p90.at[phase])
+        result['histogram'] = [
+            {'from_hours': low, 'to_hours': high, 'count': int(histogram.at[phase, i])}
+            for i, (low, high) in enumerate(zip(TIMING_HISTOGRAM_HOURS, list(TIMING_HISTOGRAM_HOURS[1:]) + [None]))
+        ]
+        results.append(result)
     return results
 
 
-def get_bottleneck_alerts(db: Session, threshold_hours: float = 48):
-    """Get offers that are stuck in workflow phases"""
-    # Find workflow steps that exceed threshold
+@cached
+def calculate_workflow_timing_stats(db: Session, year: int):
+    """Calculate timing statistics for each workflow phase"""
+    snapshot = analytics_snapshot.active(db)
+    if snapshot:
+        steps = snapshot.workflow_steps(year)
+    else:
+        steps = pd.DataFrame.from_records(workflow_steps_query(db, year).all(), columns=WORKFLOW_STEP_COLUMNS)
+    if steps.empty:
+        return []
+    business = business_calendar.business_minutes(
+        db, pd.to_datetime(steps["started_at"]), pd.to_datetime(steps["completed_at"]))
+    return _workflow_timing_from(steps, business)
+
+
+def hours_since(column, now: datetime, dialect: str):
+    """SQL expression: hours elapsed from a DateTime column to `now`"""
+    now = literal(now, DateTime)
+    if dialect == "sqlite":
+        return (func.julianday(now) - func.julianday(column)) * 24
+    return extract('epoch', now - column) / 3600
+
+
+def bottleneck_alerts_query(db: Session, threshold_hours: float, now: datetime, cutoff: datetime):
+    """In-progress steps started before cutoff, longest first, with offer, client and user.
+
+    Elapsed time is live (now - started_at); steps without started_at fall
+    back to their stored actual_duration_minutes (over threshold_hours).
+    """
+    step = models.WorkflowStep
+    elapsed = hours_since(step.started_at, now, db.get_bind().dialect.name)
+    duration_hours = case((step.started_at.isnot(None), elapsed), else_=step.actual_duration_minutes / 60)
+    return db.query(
+        models.Offer.id.label('offer_id'),
+        func.coalesce(models.Offer.offer_number, literal('#') + func.cast(models.Offer.id, String)).label('offer_number'),
+        func.coalesce(models.Client.name, 'Unknown').label('client_name'),
+        step.department.label('phase'),
+        duration_hours.label('duration_hours'),
+        literal(threshold_hours, Float).label('threshold_hours'),
+        models.User.full_name.label('assigned_user'),
+        step.started_at,
+    ).select_from(step).join(
+        models.Offer, models.Offer.id == step.offer_id
+    ).outerjoin(
+        models.Client, models.Client.id == models.Offer.client_id
+    ).outerjoin(
+        models.User, models.User.id == step.assigned_to_id
+    ).filter(
+        step.status == models.WorkflowStepStatus.IN_PROGRESS.value,
+        or_(
+            step.started_at < cutoff,
+            and_(step.started_at.is_(None), step.actual_duration_minutes > threshold_hours * 60),
+        )
+    ).order_by(duration_hours.desc(), step.id)
+
+
+def get_bottleneck_alerts(db: Session, threshold_hours: float = 48, clock: str = "wall"):
+    """Get offers that are stuck in workflow phases (one statement, durations as of now).
+
+    clock: "wall" or "business" hours (backend.business_calendar) for the threshold;
+    every alert reports both durations.
+    """
+    now = datetime.utcnow()
+    cutoff = business_calendar.sla_cutoff(db, now, threshold_hours, clock)
+    rows = bottleneck_alerts_query(db, threshold_hours, now, cutoff).all()
+    business = business_calendar.business_minutes(
+        db, [row.started_at or np.datetime64("NaT") for row in rows], [now] * len(rows)) / 60
     alerts = []
-    stuck_steps = db.query(models.WorkflowStep).filter(
-        models.WorkflowStep.status == 'in_progress',
-        models.WorkflowStep.bottleneck_flag == True
-    ).all()
-    
-    for step in stuck_steps:
-        if step.offer and step.actual_duration_minutes:
-            duration_hours = step.actual_duration_minutes / 60
-            if duration_hours > threshold_hours:
-                alerts.append({
-                    'offer_id': step.offer.id,
-                    'offer_number': step.offer.offer_number or f"#{step.offer.id}",
-                    'client_name': step.offer.client.name if step.offer.client else "Unknown",
-                    'phase': step.department,
-                    'duration_hours': duration_hours,
-                    'threshold_hours': threshold_hours,
-                    'assigned_user': step.assigned_user.full_name if step.assigned_user else None
-                })
-    
+    for row, business_hours in zip(rows, business):
+        alert = row._asdict()
+        del alert['started_at']
+        alert['business_hours'] = None if np.isnan(business_hours) else float(business_hours)
+        alerts.append(alert)
     return alerts
 
 
+@cached
 def calculate_seasonal_trends(db: Session, year: int):
     """Calculate monthly trends and seasonal patterns"""
     # Get monthly aggregates
-    monthly_data = db.query(
-        func.strftime('%Y-%m', models.Offer.mail_date).label('month'),
-        func.count(models.Offer.id).label('total'),
-        func.sum(case((models.Offer.status == 'ACCETTATA', 1), else_=0)).label('accepted'),
-        func.sum(case((models.Offer.status == 'DECLINATA', 1), else_=0)).label('declined'),
-        func.avg(models.Offer.offer_amount).label('avg_value')
+    fact = models.OfferMonthlyFact
+    snapshot = analytics_snapshot.active(db)
+    monthly_data = snapshot.seasonal(year) if snapshot else db.query(
+        fact.mail_year.label('year'),
+        fact.mail_month.label('month'),
+        func.sum(fact.offer_count).label('total'),
+        func.sum(case((fact.status == 'ACCETTATA', fact.offer_count), else_=0)).label('accepted'),
+        func.sum(case((fact.status == 'DECLINATA', fact.offer_count), else_=0)).label('declined'),
+        (func.sum(fact.offer_value) / func.nullif(func.sum(fact.valued_count), 0)).label('avg_value')
     ).filter(
-        models.Offer.year_stats == year
-    ).group_by('month').all()
+        fact.year_stats == year
+    ).group_by(fact.mail_year, fact.mail_month).having(
+        func.sum(fact.offer_count) != 0
+    ).order_by(fact.mail_year, fact.mail_month).all()
     
     trends = []
     for row in monthly_data:
         trends.append({
-            'month': row.month,
+            'month': f"{int(row.year):04d}-{int(row.month):02d}" if row.month else None,
             'total_offers': row.total,
             'accepted': row.accepted,
             'declined': row.declined,
@@ -135,40 +246,30 @@ def calculate_seasonal_trends(db: Session, year: int):
     return trends
 
 
-def calculate_client_loyalty(db: Session, year: int):
-    """Calculate loyalty metrics for all clients"""
-    clients = db.query(models.Client).all()
-    
-    loyalty_data = []
-    for client in clients:
-        # Get offers for this client in the year
-        offers = db.query(models.Offer).filter(
-            models.Offer.client_id == client.id,
-            models.Offer.year_stats == year
-        ).all()
-        
-        if not offers:
-            continue
-        
-        new_items = sum(1 for o in offers if o.is_new_item)
-        reorders = len(offers) - new_items
-        total = len(offers)
-        
-        # Get last order date
-        last_order = max((o.order_date for o in offers if o.order_date), default=None)
-        
-        loyalty_data.append({
-            'client_id': client.id,
-            'client_name': client.name,
-            'loyalty_score': client.loyalty_score,
-            'new_items_count': new_items,
-            'reorder_count': reorders,
-            'total_offers': total,
-            'reorder_percentage': (reorders / total * 100) if total > 0 else 0,
-            'last_order_date': last_order
-        })
-    
-    # Sort by loyalty score descending
-    loyalty_data.sort(key=lambda x: x['loyalty_score'], reverse=True)
-    
-    return loyalty_data
+def client_loyalty_query(db: Session, year: int, limit: Optional[int] = None):
+    """Loyalty metrics of the clients with offers in the year, one grouped row per client,
+    by loyalty score (then client id)"""
+    offer = models.Offer
+    total = func.count(offer.id)
+    new_items = func.sum(case((offer.is_new_item.is_(True), 1), else_=0))
+    reorders = total - new_items
+    loyalty_score = func.coalesce(models.Client.loyalty_score, 0.0)
+    query = db.query(
+        models.Client.id.label('client_id'),
+        models.Client.name.label('client_name'),
+        loyalty_score.label('loyalty_score'),
+        new_items.label('new_items_count'),
+        reorders.label('reorder_count'),
+        total.label('total_offers'),
+        (reorders * 1.0 / total * 100).label('reorder_percentage'),
+        func.max(offer.order_date).label('last_order_date'),
+    ).join(offer, offer.client_id == models.Client.id).filter(
+        offer.year_stats == year
+    ).group_by(models.Client.id).order_by(loyalty_score.desc(), models.Client.id)
+    return query.limit(limit) if limit else query
+
+
+@cached
+def calculate_client_loyalty(db: Session, year: int, limit: Optional[int] = None):
+    """Calculate loyalty metrics for all clients (the top `limit` by loyalty score)"""
+    return [row._asdict() for row in client_loyalty_query(db, year, limit)]
@@ -0,0 +1,259 @@
+"""
+Columnar in-memory snapshot of offers and workflow steps for the analytics.
+
+With ANALYTICS_ENGINE=snapshot, analytics_crud and analytics_enrichment take
+their grouped rows from here instead of SQL: the same rows (same columns,
+same order) from vectorized pandas group-bys, fed to the same builders.
+
+The snapshot keeps one DataFrame per table: status, sector, client name,
+department and reasons are categoricals, ids and calendar columns int32
+(0 = missing, as in the rollups), amounts and durations float64 (NaN =
+missing), step start/completion datetime64 (NaT). It is refreshed lazily by the first analytics call after a write
+(backend.data_version counters): only rows whose updated_at is at or after
+the last one seen (minus REFRESH_OVERLAP) are reloaded, a changed clients
+table re-maps sector and client name, and a row count that no longer
+matches (deletes, raw SQL inserts) reloads the table.
+
+Frames are replaced, never modified in place: readers keep a consistent view.
+"""
+import os
+import threading
+from collections import namedtuple
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from backend import data_version, models
+
+ANALYTICS_ENGINE = os.getenv("ANALYTICS_ENGINE", "sql")  # "sql" or "snapshot"
+# Rows written by transactions that committed after a later updated_at was seen
+REFRESH_OVERLAP = timedelta(minutes=5)
+
+SNAPSHOT_TABLES = ("offers", "clients", "workflow_steps")
+
+OFFER_COLUMNS = {
+    # name: (dtype, missing value)
+    "id": ("int64", 0),
+    "year_stats": ("int32", 0),
+    "mail_year": ("int32", 0),
+    "mail_month": ("int32", 0),
+    "client_id": ("int32", 0),
+    "managed_by_id": ("int32", 0),
+    "status": ("category", ""),
+    "is_new_item": ("bool", False),
+    "offer_amount": ("float64", np.nan),
+    "declined_reason": ("category", None),
+    "not_accepted_reason": ("category", None),
+}
+STEP_COLUMNS = {
+    "id": ("int64", 0),
+    "offer_id": ("int64", 0),
+    "department": ("category", ""),
+    "status": ("category", ""),
+    "assigned_to_id": ("int32", 0),
+    "actual_duration_minutes": ("float64", np.nan),
+    "bottleneck_flag": ("bool", False),
+    "started_at": ("datetime64[ns]", None),
+    "completed_at": ("datetime64[ns]", None),
+}
+
+ACCEPTED = models.OfferStatus.ACCETTATA.value
+DECLINED = [models.OfferStatus.DECLINATA.value, models.OfferStatus.NON_ACCETTATA.value]
+NOT_PROPOSED = ["", models.OfferStatus.PENDING_REGISTRATION.value]
+
+
+def _frame(rows, columns: Dict[str, tuple]) -> pd.DataFrame:
+    """Typed DataFrame (indexed by id) from (*columns, updated_at) rows"""
+    names = list(columns) + ["updated_at"]
+    frame = pd.DataFrame.from_records(rows, columns=names, coerce_float=True)
+    for name, (dtype, missing) in columns.items():
+        if missing is not None:
+            frame[name] = frame[name].fillna(missing)
+        frame[name] = frame[name].astype(dtype)
+    return frame.set_index("id", drop=False).sort_index()
+
+
+def _rows(frame: pd.DataFrame) -> List[tuple]:
+    """Named tuples of plain Python values (NaN -> None), like Query.all() rows"""
+    Row = namedtuple("Row", frame.columns)
+    frame = frame.astype(object).where(frame.notna(), None)
+    return [Row(*values) for values in frame.itertuples(index=False, name=None)]
+
+
+class AnalyticsSnapshot:
+    def __init__(self):
+        # (offers, {year_stats: row positions}), swapped as one
+        self._offers: Tuple[Optional[pd.DataFrame], Dict[int, np.ndarray]] = (None, {})
+        self.steps: Optional[pd.DataFrame] = None
+        self.clients = pd.DataFrame(columns=["sector", "name"])
+        self._versions = None
+        self._lock = threading.Lock()
+
+    # ----- loading -----
+
+    def _load(self, db: Session, model, columns: Dict[str, tuple], since=None) -> pd.DataFrame:
+        table = model.__table__
+        query = select(*[table.c[name] for name in columns], table.c.updated_at)
+        if since is not None:
+            query = query.where(table.c.updated_at >= since - REFRESH_OVERLAP)
+        return _frame(db.execute(query).all(), columns)
+
+    def _refresh_table(self, db: Session, current: Optional[pd.DataFrame], model, columns) -> pd.DataFrame:
+        """Upsert the rows changed since the newest updated_at of `current` (or load everything)"""
+        watermark = current["updated_at"].max() if current is not None and len(current) else None
+        if current is None or pd.isna(watermark):
+            return self._load(db, model, columns)
+        changed = self._load(db, model, columns, since=watermark.to_pydatetime())
+        merged = pd.concat([current.drop(changed.index, errors="ignore"), changed]).sort_index()
+        if len(merged) != db.query(func.count(model.id)).scalar():
+            return self._load(db, model, columns)  # deletes or writes without updated_at
+        for name, (dtype, _) in columns.items():
+            if dtype == "category":  # concat falls back to object when categories differ
+                merged[name] = merged[name].astype("category")
+        return merged
+
+    def _with_clients(self, offers: pd.DataFrame) -> pd.DataFrame:
+        """Attach the client's sector ("" without client) and name (None) to the offers"""
+        offers = offers.copy()
+        client = self.clients.reindex(offers["client_id"].to_numpy())
+        offers["sector"] = pd.Categorical(client["sector"].fillna("").to_numpy())
+        offers["client_name"] = pd.Categorical(client["name"].to_numpy())
+        return offers
+
+    def refresh(self, db: Session) -> "AnalyticsSnapshot":
+        """Bring the snapshot up to date with the database (no-op when nothing was written)"""
+        versions = data_version.get_versions(db, SNAPSHOT_TABLES)
+        if versions == self._versions:
+            return self
+        with self._lock:
+            if versions == self._versions:
+                return self
+            changed = {t for t in SNAPSHOT_TABLES if self._versions is None or versions.get(t) != self._versions.get(t)}
+            if "clients" in changed:
+                rows = db.execute(select(models.Client.id, models.Client.sector, models.Client.name)).all()
+                self.clients = pd.DataFrame.from_records(rows, columns=["id", "sector", "name"], index="id")
+            if changed & {"offers", "clients"}:
+                offers = self.offers
+                if "offers" in changed:
+                    offers = self._refresh_table(db, offers, models.Offer, OFFER_COLUMNS)
+                offers = self._with_clients(offers)
+                self._offers = (offers, offers.groupby("year_stats", sort=False).indices)
+            if "workflow_steps" in changed:
+                self.steps = self._refresh_table(db, self.steps, models.WorkflowStep, STEP_COLUMNS)
+            self._versions = versions
+        return self
+
+    def stats(self) -> dict:
+        def size(frame):
+            return {"rows": 0 if frame is None else len(frame),
+                    "bytes": 0 if frame is None else int(frame.memory_usage(deep=True).sum())}
+        return {"engine": ANALYTICS_ENGINE, "offers": size(self.offers), "workflow_steps": size(self.steps)}
+
+    # ----- grouped rows, as the SQL queries of analytics_crud / analytics_enrichment -----
+
+    @property
+    def offers(self) -> Optional[pd.DataFrame]:
+        return self._offers[0]
+
+    def _years(self, *years: int) -> pd.DataFrame:
+        """Offers of the given years (one consistent version)"""
+        offers, year_rows = self._offers
+        return offers.iloc[np.concatenate([year_rows.get(y, np.empty(0, dtype=np.intp)) for y in years])]
+
+    def monthly_evolution(self, years: List[int]) -> List[tuple]:
+        """Rows of analytics_crud.monthly_evolution_query"""
+        o = self._years(*years)
+        accepted = o["status"] == ACCEPTED
+        frame = pd.DataFrame({
+            "year": o["year_stats"],
+            "month": o["mail_month"],
+            "requests": 1,
+            "proposed": ~o["status"].isin(NOT_PROPOSED),
+            "accepted": accepted,
+            "declined": o["status"].isin(DECLINED),
+            "order_value": o["offer_amount"].where(accepted, 0.0),
+        })
+        return _rows(frame.groupby(["year", "month"], sort=True).sum().reset_index())
+
+    def year_mix(self, year: int) -> List[tuple]:
+        """Rows of analytics_crud.year_mix_query"""
+        o = self._years(year)
+        has_client = o["client_id"] != 0
+        frame = pd.DataFrame({
+            "sector": o["sector"],
+            "is_new_item": o["is_new_item"],
+            "count": 1,
+            "value": o["offer_amount"].fillna(0.0),
+            "client_count": has_client,
+            "client_value": o["offer_amount"].fillna(0.0).where(has_client, 0.0),
+        })
+        grouped = frame.groupby(["sector", "is_new_item"], observed=True, sort=True).sum()
+        return _rows(grouped.reset_index())
+
+    def reasons(self, year: int) -> List[tuple]:
+        """(status, declined_reason, not_accepted_reason, count) of declined / not accepted offers"""
+        o = self._years(year)
+        o = o[o["status"].isin(DECLINED)]
+        counts = o.groupby(["status", "declined_reason", "not_accepted_reason"],
+                           observed=True, dropna=False).size()
+        rows = _rows(counts.rename("count").reset_index())
+        # GROUP BY order: NULL first, enums by stored name
+        return sorted(rows, key=lambda r: (
+            r.status,
+            r.declined_reason is not None, getattr(r.declined_reason, "name", ""),
+            r.not_accepted_reason is not None, r.not_accepted_reason or "",
+        ))
+
+    def client_ranking(self, year: int, limit: int = 50) -> List[tuple]:
+        """Rows of the client ranking query: per client name, ordered by accepted value"""
+        o = self._years(year)
+        o = o[o["client_name"].notna()]
+        status = o["status"]
+        accepted = status == ACCEPTED
+        frame = pd.DataFrame({
+            "name": o["client_name"],
+            "requests": 1,
+            "proposed": status != models.OfferStatus.PENDING_REGISTRATION.value,
+            "accepted": accepted,
+            "declined": status == models.OfferStatus.DECLINATA.value,
+            "not_accepted": status == models.OfferStatus.NON_ACCETTATA.value,
+            "total_value": o["offer_amount"].where(accepted, 0.0),
+        })
+        grouped = frame.groupby("name", observed=True, sort=True).sum().reset_index()
+        grouped = grouped.sort_values("total_value", ascending=False, kind="stable").head(limit)
+        return _rows(grouped)
+
+    def seasonal(self, year: int) -> List[tuple]:
+        """Rows of analytics_enrichment.calculate_seasonal_trends"""
+        o = self._years(year)
+        frame = pd.DataFrame({
+            "year": o["mail_year"],
+            "month": o["mail_month"],
+            "total": 1,
+            "accepted": o["status"] == ACCEPTED,
+            "declined": o["status"] == models.OfferStatus.DECLINATA.value,
+            "avg_value": o["offer_amount"],
+        })
+        grouped = frame.groupby(["year", "month"], sort=True).agg(
+            total=("total", "sum"), accepted=("accepted", "sum"), declined=("declined", "sum"),
+            avg_value=("avg_value", "mean"))
+        return _rows(grouped.reset_index())
+
+    def workflow_steps(self, year: int) -> pd.DataFrame:
+        """Workflow steps of the year's offers, in id order (as analytics_enrichment.workflow_steps_query)"""
+        offer_ids = self._years(year)["id"]
+        return self.steps[self.steps["offer_id"].isin(offer_ids)]
+
+
+snapshot = AnalyticsSnapshot()
+
+
+def active(db: Session) -> Optional[AnalyticsSnapshot]:
+    """The refreshed snapshot when ANALYTICS_ENGINE=snapshot, else None (SQL path)"""
+    if ANALYTICS_ENGINE != "snapshot":
+        return None
+    return snapshot.refresh(db)
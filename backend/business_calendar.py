@@ -0,0 +1,195 @@
+"""
+Working calendar: business minutes between timestamps, from the holidays table.
+
+A BusinessCalendar covers a range of whole years. It precomputes the
+business minutes of every day (0 on weekends and holidays, the shift length
+otherwise) and their prefix sums, so the business time from the calendar
+start to any instant is prefix[day] + the open shift minutes before that
+time of day. The business minutes between t1 and t2 are then a difference of
+two such positions: O(1) per interval, vectorized with numpy over arrays of
+intervals. add_minutes() inverts a position with a binary search on the
+prefix sums (deadlines, SLA cut-offs); sla_cutoff() and add_business_hours()
+widen the calendar until the result falls inside it, whatever the hours.
+
+Holidays: exact dates, plus the same day and month of every year for
+is_recurring ones. Shifts and working weekdays come from WORK_SHIFTS
+("08:00-12:00,13:00-17:00") and WORK_WEEKDAYS ("0,1,2,3,4", Monday = 0).
+Timestamps are naive, as stored.
+
+calendar_for(db, first, last) returns a cached calendar covering the dates,
+rebuilt when the holidays table changes (backend.data_version).
+"""
+import os
+import threading
+from datetime import date, datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from backend import data_version, models
+
+WORK_SHIFTS = os.getenv("WORK_SHIFTS", "08:00-12:00,13:00-17:00")
+WORK_WEEKDAYS = os.getenv("WORK_WEEKDAYS", "0,1,2,3,4")
+
+
+def parse_shifts(shifts: str) -> List[Tuple[int, int]]:
+    """[(start, end)] minutes of the day of "HH:MM-HH:MM,..." (ordered, not overlapping)"""
+    def minutes(value):
+        hours, mins = value.strip().split(":")
+        return int(hours) * 60 + int(mins)
+    result = []
+    for shift in shifts.split(","):
+        start, end = (minutes(v) for v in shift.split("-"))
+        if not 0 <= start < end <= 24 * 60 or (result and start < result[-1][1]):
+            raise ValueError(f"Invalid shifts: {shifts}")
+        result.append((start, end))
+    return result
+
+
+class BusinessCalendar:
+    def __init__(self, first: date, last: date, holidays: Iterable[Tuple[date, bool]] = (),
+                 shifts: str = WORK_SHIFTS, weekdays: str = WORK_WEEKDAYS):
+        """Calendar of the whole years first.year..last.year; holidays as (date, is_recurring)"""
+        self.start = np.datetime64(date(first.year, 1, 1), "D")
+        self.end = np.datetime64(date(last.year + 1, 1, 1), "D")  # exclusive
+        days = np.arange(self.start, self.end, dtype="datetime64[D]")
+
+        open_days = np.isin((days.view("int64") + 3) % 7, [int(d) for d in weekdays.split(",")])  # 1970-01-01 was a Thursday
+        closed = []
+        for day, recurring in holidays:
+            years = range(first.year, last.year + 1) if recurring else [day.year]
+            for year in years:
+                try:
+                    closed.append(day.replace(year=year))
+                except ValueError:
+                    pass  # recurring 29 February
+        open_days &= ~np.isin(days, np.array(closed, dtype="datetime64[D]"))
+
+        shift_list = parse_shifts(shifts)
+        self._shift_start = np.array([s for s, _ in shift_list], dtype=float)
+        self._shift_length = np.array([e - s for s, e in shift_list], dtype=float)
+        self._shift_offset = np.concatenate([[0.0], np.cumsum(self._shift_length)])  # before each shift
+        self.open_days = open_days
+        self.day_minutes = open_days * self._shift_offset[-1]
+        self.prefix = np.concatenate([[0.0], np.cumsum(self.day_minutes)])  # before each day
+        self._open_index = np.flatnonzero(open_days)
+        self._open_end = self.prefix[self._open_index + 1]  # after each open day
+
+    def covers(self, first: date, last: date) -> bool:
+        return self.start <= np.datetime64(first, "D") and np.datetime64(last, "D") < self.end
+
+    # ----- positions: business minutes from the calendar start -----
+
+    def position(self, times) -> np.ndarray:
+        """Business minutes from the calendar start to each time (clamped to the range, NaN for NaT)"""
+        t = np.asarray(times, dtype="datetime64[s]")
+        missing = np.isnat(t)
+        t = np.clip(np.where(missing, self.start, t), self.start, self.end).astype("datetime64[s]")
+        day = (t.astype("datetime64[D]") - self.start).astype("int64")
+        in_range = day < len(self.day_minutes)
+        day = np.minimum(day, len(self.day_minutes) - 1)
+        minute = (t - t.astype("datetime64[D]")).astype("int64")[..., None] / 60.0
+        within = np.clip(minute - self._shift_start, 0, self._shift_length).sum(axis=-1)
+        pos = np.where(in_range, self.prefix[day] + self.open_days[day] * within, self.prefix[-1])
+        return np.where(missing, np.nan, pos)
+
+    def at(self, positions) -> np.ndarray:
+        """Earliest open time at each business position (inverse of position): a position
+        on a day boundary is the close of the last open day before it, never a closed day"""
+        pos = np.clip(np.asarray(positions, dtype=float), 0, self.prefix[-1])
+        if not len(self._open_index):
+            return np.full(pos.shape, np.datetime64("NaT"), dtype="datetime64[s]")
+        # first open day ending at or after the position (zero-minute days are skipped)
+        day = self._open_index[np.minimum(np.searchsorted(self._open_end, pos, side="left"), len(self._open_index) - 1)]
+        rest = pos - self.prefix[day]
+        shift = np.minimum(np.searchsorted(self._shift_offset[1:], rest, side="left"), len(self._shift_start) - 1)
+        minute = self._shift_start[shift] + (rest - self._shift_offset[shift])
+        midnight = self.start + day.astype("timedelta64[D]")
+        return midnight.astype("datetime64[s]") + np.round(minute * 60).astype("timedelta64[s]")
+
+    # ----- intervals -----
+
+    def minutes_between(self, starts, ends) -> np.ndarray:
+        """Business minutes of each [start, end] interval (NaN when either end is missing)"""
+        return self.position(ends) - self.position(starts)
+
+    def add_minutes(self, times, minutes) -> np.ndarray:
+        """Earliest time `minutes` business minutes after (before, if negative) each time"""
+        return self.at(self.position(times) + np.asarray(minutes, dtype=float))
+
+
+def _as_datetime(value) -> datetime:
+    return np.asarray(value).astype("datetime64[us]").item()
+
+
+_cache: Tuple[Optional[tuple], Optional[BusinessCalendar]] = (None, None)
+_lock = threading.Lock()
+
+
+def calendar_for(db: Session, first: date, last: date) -> BusinessCalendar:
+    """Cached calendar covering first..last (whole years), built from the holidays table"""
+    global _cache
+    version = data_version.get_versions(db, ["holidays"]).get("holidays")
+    cached_version, calendar = _cache
+    if calendar is not None and cached_version == version and calendar.covers(first, last):
+        return calendar
+    with _lock:
+        cached_version, calendar = _cache
+        if calendar is not None and cached_version == version:
+            if calendar.covers(first, last):
+                return calendar
+            # widen the cached range
+            first = min(first, _as_datetime(calendar.start).date())
+            last = max(last, _as_datetime(calendar.end - 1).date())
+        holidays = [(d.date(), bool(recurring)) for d, recurring in
+                    db.query(models.Holiday.date, models.Holiday.is_recurring).all()]
+        calendar = BusinessCalendar(first, last, holidays)
+        _cache = (version, calendar)
+    return calendar
+
+
+MAX_SPAN_DAYS = 100 * 366
+
+
+def _add_minutes(db: Session, time: datetime, minutes: float) -> datetime:
+    """time + `minutes` business minutes (- if negative), on a calendar widened until it holds the result"""
+    span = timedelta(days=366)
+    while span.days <= MAX_SPAN_DAYS:
+        first, last = (time - span, time) if minutes < 0 else (time, time + span)
+        calendar = calendar_for(db, first.date(), last.date())
+        position = calendar.position(time) + minutes
+        inside = position > 0 if minutes < 0 else position < calendar.prefix[-1]
+        if inside:  # not clamped to the calendar range
+            return _as_datetime(calendar.at(position))
+        span *= 2
+    raise ValueError(f"No {abs(minutes) / 60:g} business hours within {MAX_SPAN_DAYS // 366} years of {time}")
+
+
+CLOCKS = ("business", "wall")
+
+
+def sla_cutoff(db: Session, now: datetime, hours: float, clock: str = "business") -> datetime:
+    """Steps started before the returned time have been open more than `hours` hours at `now`,
+    counted in business hours or on the wall clock"""
+    if clock not in CLOCKS:
+        raise ValueError(f"Unknown clock: {clock} (expected {', '.join(CLOCKS)})")
+    if clock == "wall":
+        return now - timedelta(hours=hours)
+    return _add_minutes(db, now, -hours * 60)
+
+
+def add_business_hours(db: Session, start: datetime, hours: float) -> datetime:
+    """Time `hours` business hours after start (deadlines)"""
+    return _add_minutes(db, start, hours * 60)
+
+
+def business_minutes(db: Session, starts, ends) -> np.ndarray:
+    """Business minutes of each (start, end) pair of two datetime arrays (NaN when either is missing)"""
+    starts = np.asarray(starts, dtype="datetime64[s]")
+    ends = np.asarray(ends, dtype="datetime64[s]")
+    known = np.concatenate([starts[~np.isnat(starts)], ends[~np.isnat(ends)]])
+    if not len(known):
+        return np.full(starts.shape, np.nan)
+    calendar = calendar_for(db, _as_datetime(known.min()).date(), _as_datetime(known.max()).date())
+    return calendar.minutes_between(starts, ends)
@@ -0,0 +1,126 @@
+"""
+Response compression for the JSON-heavy endpoints.
+
+- CompressionMiddleware: brotli when the client accepts it and the `brotli`
+  package is installed, gzip otherwise; responses below COMPRESSION_MIN_SIZE
+  and already-compressed types (xlsx, images...) are sent as they are.
+- ExportCache: generated export files kept in memory together with their
+  compressed variants, so a repeated download costs neither the report
+  generation nor the compression.
+"""
+import gzip
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import DEFAULT_EXCLUDED_CONTENT_TYPES, GZipMiddleware, IdentityResponder
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+EXPORT_CACHE_SIZE = int(os.getenv("EXPORT_CACHE_SIZE", "32"))
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+EXCLUDED_CONTENT_TYPES = DEFAULT_EXCLUDED_CONTENT_TYPES + (XLSX_MEDIA_TYPE,)
+
+
+def accepts(request_headers, encoding: str) -> bool:
+    """True if the Accept-Encoding header lists the encoding (q=0 means refused)"""
+    for part in request_headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() == encoding:
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app, minimum_size: int, quality: int = BROTLI_QUALITY, **kwargs):
+        super().__init__(app, minimum_size, **kwargs)
+        self.quality = quality
+        self._compressor = None
+
+    async def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        if self._compressor is None:
+            self._compressor = brotli.Compressor(quality=self.quality)
+        data = self._compressor.process(body)
+        return data + (self._compressor.flush() if more_body else self._compressor.finish())
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """GZipMiddleware that prefers brotli when available"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE, gzip_level: int = GZIP_LEVEL,
+                 brotli_quality: int = BROTLI_QUALITY):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=gzip_level,
+                         exclude_content_types=EXCLUDED_CONTENT_TYPES)
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and brotli is not None and accepts(Headers(scope=scope), "br"):
+            responder = BrotliResponder(self.app, self.minimum_size, quality=self.brotli_quality,
+                                        exclude_content_types=self.exclude_content_types)
+            await responder(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+class ExportCache:
+    """Small LRU of generated exports with their precompressed variants.
+
+    Keys must identify immutable content (e.g. include the data version), so
+    entries never need invalidation; old ones just fall off the LRU.
+    """
+
+    def __init__(self, max_entries: int = EXPORT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Dict[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _variants(self, body: bytes, media_type: str) -> Dict[str, bytes]:
+        variants = {"identity": body}
+        if media_type in EXCLUDED_CONTENT_TYPES:
+            return variants
+        compressed = {"gzip": gzip.compress(body, compresslevel=9)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(body, quality=11)
+        # Keep a variant only when it is worth the Content-Encoding
+        variants.update({k: v for k, v in compressed.items() if len(v) < len(body) * 0.9})
+        return variants
+
+    def get(self, key: Hashable, build: Callable[[], bytes], media_type: str) -> Dict[str, bytes]:
+        with self._lock:
+            variants = self._entries.get(key)
+            if variants is not None:
+                self._entries.move_to_end(key)
+                return variants
+        variants = self._variants(build(), media_type)
+        with self._lock:
+            self._entries[key] = variants
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return variants
+
+    def response(self, request: Request, key: Hashable, build: Callable[[], bytes], media_type: str,
+                 headers: Optional[Dict[str, str]] = None) -> Response:
+        """Serve the best cached variant the client accepts"""
+        variants = self.get(key, build, media_type)
+        headers = dict(headers or {})
+        encoding = next((e for e in ("br", "gzip") if e in variants and accepts(request.headers, e)), None)
+        if len(variants) > 1:
+            headers["Vary"] = "Accept-Encoding"
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(variants[encoding or "identity"], media_type=media_type, headers=headers)
+
+
+export_cache = ExportCache()
@@ -1,8 +1,11 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, joinedload, aliased
+from sqlalchemy import and_, case, func, or_, select
+from typing import Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime
+import base64
 import backend.models as models
 import backend.schemas as schemas
+from backend import business_calendar, rollups, sla_watchdog
 from backend.auth import get_password_hash
 
 
@@ -81,6 +84,12 @@ def get_clients(db: Session, skip: int = 0, limit: int = 100) -> List[models.Cli
     return db.query(models.Client).offset(skip).limit(limit).all()
 
 
+def get_client_rows(db: Session, skip: int = 0, limit: int = 100) -> List[dict]:
+    """Get clients as plain dicts shaped like schemas.Client (fast JSON path)"""
+    stmt = select(*[getattr(models.Client, f) for f in _OFFER_CLIENT_FIELDS]).offset(skip).limit(limit)
+    return [dict(row) for row in db.execute(stmt).mappings()]
+
+
 def update_client(db: Session, client_id: int, client_update: schemas.ClientUpdate) -> Optional[models.Client]:
     """Update a client"""
     db_client = get_client(db, client_id)
@@ -144,9 +153,38 @@ def create_offer(db: Session, offer: schemas.OfferCreate) -> models.Offer:
     return db_offer
 
 
+def offer_loader_options():
+    """Eager-load the relationships serialized by schemas.Offer.
+
+    All three are many-to-one, so a LEFT OUTER JOIN fetches them in the same
+    statement instead of up to three lazy SELECTs per offer.
+    """
+    return (
+        joinedload(models.Offer.client),
+        joinedload(models.Offer.manager),
+        joinedload(models.Offer.purchasing_manager),
+    )
+
+
 def get_offer(db: Session, offer_id: int) -> Optional[models.Offer]:
     """Get offer by ID"""
-    return db.query(models.Offer).filter(models.Offer.id == offer_id).first()
+    return db.query(models.Offer).options(*offer_loader_options()).filter(models.Offer.id == offer_id).first()
+
+
+def encode_offer_cursor(created_at: datetime, offer_id: int) -> str:
+    """Build the opaque cursor pointing just after an offer in the list order"""
+    raw = f"{created_at.isoformat()}|{offer_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_offer_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_offer_cursor, raising ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, offer_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(offer_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
 
 
 def get_offers(
@@ -156,11 +194,33 @@ def get_offers(
     status: Optional[models.OfferStatus] = None,
     priority: Optional[models.Priority] = None,
     client_id: Optional[int] = None,
-    managed_by_id: Optional[int] = None
+    managed_by_id: Optional[int] = None,
+    cursor: Optional[str] = None
 ) -> List[models.Offer]:
-    """Get offers with optional filters"""
-    query = db.query(models.Offer)
-    
+    """Get offers with optional filters, newest first.
+
+    Pages either with `skip` or, preferably, with a `cursor` from
+    encode_offer_cursor: the keyset (created_at, id) seeks straight to the
+    next page instead of scanning and discarding `skip` rows.
+    """
+    query = filter_offers(
+        db.query(models.Offer).options(*offer_loader_options()),
+        status, priority, client_id, managed_by_id, cursor
+    )
+    if skip:
+        query = query.offset(skip)
+    return query.limit(limit).all()
+
+
+def filter_offers(
+    query,
+    status: Optional[models.OfferStatus] = None,
+    priority: Optional[models.Priority] = None,
+    client_id: Optional[int] = None,
+    managed_by_id: Optional[int] = None,
+    cursor: Optional[str] = None
+):
+    """Apply the offer list filters, cursor and ordering to an ORM Query or a Core select()"""
     if status:
         query = query.filter(models.Offer.status == status)
     if priority:
@@ -169,14 +229,169 @@ def get_offers(
         query = query.filter(models.Offer.client_id == client_id)
     if managed_by_id:
         query = query.filter(models.Offer.managed_by_id == managed_by_id)
+    if cursor:
+        created_at, offer_id = decode_offer_cursor(cursor)
+        query = query.filter(or_(
+            models.Offer.created_at < created_at,
+            and_(models.Offer.created_at == created_at, models.Offer.id < offer_id)
+        ))
     
-    return query.order_by(models.Offer.created_at.desc()).offset(skip).limit(limit).all()
+    return query.order_by(models.Offer.created_at.desc(), models.Offer.id.desc())
+
+
+def get_offers_page(db: Session, limit: int = 100, cursor: Optional[str] = None, **filters) -> dict:
+    """Get one page of offers plus the cursor of the next page (None on the last page)"""
+    offers = get_offers(db, limit=limit + 1, cursor=cursor, **filters)
+    next_cursor = None
+    if len(offers) > limit:
+        next_cursor = encode_offer_cursor(offers[limit - 1].created_at, offers[limit - 1].id)
+    return {"offers": offers[:limit], "next_cursor": next_cursor}
+
+
+# Fields of the nested Client/User objects serialized by schemas.Offer
+_OFFER_CLIENT_FIELDS = ("name", "email_domain", "sector", "management_time", "strategic", "voto", "notes",
+                        "new_items_count", "reorder_count", "loyalty_score", "id", "created_at")
+_OFFER_USER_FIELDS = ("username", "email", "role", "department", "full_name", "id", "active", "created_at")
+
+
+def get_offer_rows_page(db: Session, limit: int = 100, cursor: Optional[str] = None, **filters) -> dict:
+    """Same page as get_offers_page, shaped like schemas.Offer but built from plain rows.
+
+    One Core select() joins clients and both users; the result is nested into
+    dicts without creating ORM entities or pydantic models (fast JSON path).
+    """
+    manager = aliased(models.User)
+    purchasing_manager = aliased(models.User)
+    nested = (
+        ("client", models.Client, _OFFER_CLIENT_FIELDS),
+        ("manager", manager, _OFFER_USER_FIELDS),
+        ("purchasing_manager", purchasing_manager, _OFFER_USER_FIELDS),
+    )
+    nested_names = {name for name, _, _ in nested}
+    offer_columns = [f for f in schemas.Offer.model_fields if f not in nested_names]
+    columns = [getattr(models.Offer, key) for key in offer_columns]
+    for name, entity, fields in nested:
+        columns += [getattr(entity, f).label(f"{name}__{f}") for f in fields]
+
+    stmt = (
+        select(*columns)
+        .select_from(models.Offer)
+        .outerjoin(models.Client, models.Offer.client_id == models.Client.id)
+        .outerjoin(manager, models.Offer.managed_by_id == manager.id)
+        .outerjoin(purchasing_manager, models.Offer.purchasing_manager_id == purchasing_manager.id)
+    )
+    stmt = filter_offers(stmt, cursor=cursor, **filters).limit(limit + 1)
+    rows = db.execute(stmt).all()
+
+    n_offer = len(offer_columns)
+    offers = []
+    for row in rows[:limit]:
+        offer = dict(zip(offer_columns, row[:n_offer]))
+        pos = n_offer
+        for name, _, fields in nested:
+            values = row[pos:pos + len(fields)]
+            pos += len(fields)
+            if values[fields.index("id")] is None:
+                offer[name] = None
+            else:
+                offer[name] = dict(zip(fields, values))
+        offers.append(offer)
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_offer_cursor(last.created_at, last.id)
+    return {"offers": offers, "next_cursor": next_cursor}
+
+
+# Columns of the offer grid, selected without building ORM entities
+OFFER_SUMMARY_COLUMNS = {
+    "id": models.Offer.id,
+    "offer_number": models.Offer.offer_number,
+    "status": models.Offer.status,
+    "priority": models.Offer.priority,
+    "mail_date": models.Offer.mail_date,
+    "year_stats": models.Offer.year_stats,
+    "client_id": models.Offer.client_id,
+    "client_name": models.Client.name,
+    "item_name": models.Offer.item_name,
+    "email_subject": models.Offer.email_subject,
+    "offer_amount": models.Offer.offer_amount,
+    "managed_by_name": models.Offer.managed_by_name,
+    "created_at": models.Offer.created_at,
+}
+
+
+def get_offer_summaries_page(
+    db: Session,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    fields: Optional[Sequence[str]] = None,
+    **filters
+) -> dict:
+    """Get one page of offer summaries as plain dicts, optionally restricted to `fields`"""
+    fields = list(fields) if fields else list(OFFER_SUMMARY_COLUMNS)
+    unknown = [f for f in fields if f not in OFFER_SUMMARY_COLUMNS]
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(OFFER_SUMMARY_COLUMNS)}"
+        )
+
+    # created_at and id are always fetched to build the next cursor
+    selected = list(dict.fromkeys(fields + ["created_at", "id"]))
+    stmt = select(*[OFFER_SUMMARY_COLUMNS[f].label(f) for f in selected]).select_from(models.Offer)
+    if "client_name" in selected:
+        stmt = stmt.outerjoin(models.Client, models.Offer.client_id == models.Client.id)
+    stmt = filter_offers(stmt, cursor=cursor, **filters).limit(limit + 1)
+
+    rows = db.execute(stmt).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = encode_offer_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["id"])
+    offers = [{f: row[f] for f in fields} for row in rows[:limit]]
+    return {"offers": offers, "next_cursor": next_cursor}
+
+
+# Rows fetched per round trip by the streaming export
+OFFER_EXPORT_BATCH_SIZE = 1000
+
+
+def offer_export_statement(**filters):
+    """Core select() of the flat export rows (schemas.Offer scalars plus the related names),
+    filtered and ordered like the offer list"""
+    manager = aliased(models.User)
+    purchasing_manager = aliased(models.User)
+    nested = {"client", "manager", "purchasing_manager"}
+    columns = [getattr(models.Offer, f) for f in schemas.Offer.model_fields if f not in nested]
+    columns += [
+        models.Client.name.label("client_name"),
+        manager.username.label("manager_username"),
+        purchasing_manager.username.label("purchasing_manager_username"),
+    ]
+    stmt = (
+        select(*columns)
+        .select_from(models.Offer)
+        .outerjoin(models.Client, models.Offer.client_id == models.Client.id)
+        .outerjoin(manager, models.Offer.managed_by_id == manager.id)
+        .outerjoin(purchasing_manager, models.Offer.purchasing_manager_id == purchasing_manager.id)
+    )
+    return filter_offers(stmt, **filters)
+
+
+def iter_offer_export_rows(db: Session, batch_size: int = OFFER_EXPORT_BATCH_SIZE, **filters) -> Iterator[Tuple]:
+    """Yield every matching offer as a flat row, fetching `batch_size` rows at a time.
+
+    yield_per streams from a server-side cursor (PostgreSQL) / fetchmany (SQLite),
+    so memory does not grow with the size of the register.
+    """
+    stmt = offer_export_statement(**filters).execution_options(yield_per=batch_size)
+    yield from db.execute(stmt)
 
 
 def get_offers_for_department(db: Session, user_id: int, skip: int = 0, limit: int = 100) -> List[models.Offer]:
     """Get offers assigned to a specific user through workflow steps"""
     # Get offers where user has an active workflow step
-    offers = db.query(models.Offer).join(models.WorkflowStep).filter(
+    offers = db.query(models.Offer).options(*offer_loader_options()).join(models.WorkflowStep).filter(
         models.WorkflowStep.assigned_to_id == user_id,
         models.WorkflowStep.status.in_([models.WorkflowStepStatus.PENDING, models.WorkflowStepStatus.IN_PROGRESS])
     ).order_by(models.Offer.priority.desc(), models.WorkflowStep.deadline).offset(skip).limit(limit).all()
@@ -236,6 +451,10 @@ def update_workflow_step(db: Session, step_id: int, step_update: schemas.Workflo
     update_data = step_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(db_step, field, value)
+    if db_step.started_at and db_step.deadline is None:
+        # SLA deadline on the working calendar (same threshold as the SLA watchdog)
+        db_step.deadline = business_calendar.add_business_hours(
+            db, db_step.started_at, sla_watchdog.SLA_THRESHOLD_HOURS)
     
     db_step.updated_at = datetime.utcnow()
     db.commit()
@@ -325,8 +544,63 @@ def update_note(db: Session, note_id: int, note_update: schemas.OfferNoteUpdate)
 
 # ============= Statistics =============
 
+# Dashboard counter fed by each (upper-cased) offer status
+DASHBOARD_STATUS_COUNTERS = {
+    "PENDING_REGISTRATION": "pending_registration",
+    "IN_LAVORO": "in_progress",
+    "CHECKS_IN_PROGRESS": "in_progress",
+    "READY_TO_SEND": "ready_to_send",
+    "SENT": "sent",
+    "ACCETTATA": "accepted",
+    "DECLINATA": "declined",
+    "NON_ACCETTATA": "declined",
+}
+
+
+def _add_bucket(target: dict, key: str, count: int, value: float):
+    bucket = target.setdefault(key, {"count": 0, "value": 0.0})
+    bucket["count"] += count
+    bucket["value"] += value
+
+
+def _aggregate_dashboard_buckets(db: Session, filters: list):
+    """Dashboard buckets aggregated straight from the offers matching `filters`"""
+    count_col = func.count(models.Offer.id)
+    value_col = func.coalesce(func.sum(models.Offer.offer_amount), 0.0)
+    bucket_cols = (
+        models.Offer.year_stats,
+        models.Offer.mail_year,
+        models.Offer.mail_month,
+        func.upper(models.Offer.status),
+    )
+    rows = db.query(*bucket_cols, count_col, value_col).filter(*filters).group_by(*bucket_cols).all()
+    client_counts = db.query(models.Offer.client_id, count_col, value_col).filter(*filters).group_by(
+        models.Offer.client_id).all()
+    return rows, client_counts
+
+
+def _aggregate_department_steps(db: Session, filters: list):
+    """(department, total steps, open steps) of the offers matching filters"""
+    open_step = models.WorkflowStep.status.in_([models.WorkflowStepStatus.PENDING, models.WorkflowStepStatus.IN_PROGRESS])
+    return db.query(
+        models.WorkflowStep.department,
+        func.count(models.WorkflowStep.id),
+        func.sum(case((open_step, 1), else_=0)),
+    ).join(models.Offer, models.WorkflowStep.offer_id == models.Offer.id
+    ).filter(*filters).group_by(models.WorkflowStep.department).all()
+
+
 def get_dashboard_stats(db: Session, user_role: models.UserRole = None, user_id: int = None, year: int = None) -> dict:
-    """Get dashboard statistics"""
+    """Get dashboard statistics.
+
+    Built from (year, month, status) buckets for the totals, by_year and
+    monthly_stats and from per-client buckets for by_client. They are read from
+    the offer_counters rollup (backend.rollups), or aggregated from the offers
+    for department users, who only see their assigned offers. by_department
+    counts the workflow steps of the same offers per department (total and
+    still open), from the department_step_counters rollup or, for department
+    users, from the steps themselves.
+    """
     stats = {
         "total_offers": 0,
         "pending_registration": 0,
@@ -341,47 +615,47 @@ def get_dashboard_stats(db: Session, user_role: models.UserRole = None, user_id:
         "by_department": {},
         "by_year": {}
     }
-    
-    # Base query
-    query = db.query(models.Offer)
-    
+
+    filters = []
     # Filter by user role
     role_str = str(user_role).lower() if user_role else None
-    if role_str and role_str not in ["admin", "commerciale"]:
+    department_user = bool(role_str and role_str not in ["admin", "commerciale"])
+    if department_user:
         # Department users see only their assigned offers
-        query = query.join(models.WorkflowStep).filter(models.WorkflowStep.assigned_to_id == user_id)
-    
+        assigned = select(models.WorkflowStep.offer_id).where(models.WorkflowStep.assigned_to_id == user_id)
+        filters.append(models.Offer.id.in_(assigned))
     # Filter by year if provided
     if year:
-        query = query.filter(models.Offer.year_stats == year)
-    
-    offers = query.all()
-    
-    stats["total_offers"] = len(offers)
-    
-    for offer in offers:
-        # Count by year
-        offer_year = str(offer.year_stats) if offer.year_stats else "N/A"
-        stats["by_year"][offer_year] = stats["by_year"].get(offer_year, 0) + 1
-        # Count by status
-        status_str = str(offer.status).upper() if offer.status else ""
-        if status_str == "PENDING_REGISTRATION":
-            stats["pending_registration"] += 1
-        elif status_str in ["IN_LAVORO", "CHECKS_IN_PROGRESS"]:
-            stats["in_progress"] += 1
-        elif status_str == "READY_TO_SEND":
-            stats["ready_to_send"] += 1
-        elif status_str == "SENT":
-            stats["sent"] += 1
-        elif status_str == "ACCETTATA":
-            stats["accepted"] += 1
-        elif status_str == "DECLINATA":
-            stats["declined"] += 1
-        elif status_str == "NON_ACCETTATA":
-            stats["declined"] += 1
-        
-        # Total value
-        if offer.offer_amount:
-            stats["total_value"] += offer.offer_amount
-    
+        filters.append(models.Offer.year_stats == year)
+
+    if department_user:
+        rows, client_counts = _aggregate_dashboard_buckets(db, filters)
+        step_rows = _aggregate_department_steps(db, filters)
+    else:
+        rows = rollups.dashboard_buckets(db, year)
+        client_counts = rollups.client_buckets(db, year)
+        step_rows = rollups.department_buckets(db, year)
+
+    for offer_year, mail_year, month, status_str, count, value in rows:
+        value = float(value or 0)
+        stats["total_offers"] += count
+        stats["total_value"] += value
+        counter = DASHBOARD_STATUS_COUNTERS.get(status_str or "")
+        if counter:
+            stats[counter] += count
+        offer_year = str(offer_year) if offer_year else "N/A"
+        stats["by_year"][offer_year] = stats["by_year"].get(offer_year, 0) + count
+        month_key = f"{int(mail_year):04d}-{int(month):02d}" if month else "N/A"
+        _add_bucket(stats["monthly_stats"], month_key, count, value)
+
+    client_names = dict(db.query(models.Client.id, models.Client.name).filter(
+        models.Client.id.in_([c for c, _, _ in client_counts if c is not None])
+    ).all())
+    for client_id, count, value in client_counts:
+        _add_bucket(stats["by_client"], client_names.get(client_id) or "N/A", count, float(value or 0))
+
+    # By department: workflow steps of the same offers
+    for department, total, open_count in step_rows:
+        stats["by_department"][department or "N/A"] = {"total": total, "open": int(open_count or 0)}
+
     return stats
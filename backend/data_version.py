@@ -0,0 +1,164 @@
+"""
+Data-version counters used as cheap cache validators.
+
+Every ORM write (flush or bulk UPDATE/DELETE) bumps the counter of each
+written table, plus the "global" counter, inside the same transaction, so
+readers in any worker process see a new version exactly when they can see
+the new data. Endpoints turn these counters into ETag/Last-Modified headers
+instead of re-running their queries.
+
+Scripts writing with plain sqlite3 bypass the ORM events: they call bump()
+before committing, and `python -m backend.data_version --bump [table ...]`
+does the same after SQL run by hand.
+"""
+import sys
+from datetime import datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend import models
+
+GLOBAL = "global"
+
+# Tables whose writes change what the dashboard and analytics return
+TRACKED_TABLES = (
+    "offers",
+    "clients",
+    "workflow_steps",
+    "users",
+    "user_performance_metrics",
+    "holidays",
+)
+
+
+def ensure_rows(engine):
+    """Create the counter rows once (called at startup after create_all)"""
+    names = (GLOBAL,) + TRACKED_TABLES
+    try:
+        with engine.begin() as conn:
+            existing = set(conn.execute(select(models.DataVersion.name)).scalars())
+            missing = [{"name": n, "version": 0, "updated_at": datetime.utcnow()} for n in names if n not in existing]
+            if missing:
+                conn.execute(insert(models.DataVersion), missing)
+    except IntegrityError:
+        pass  # another worker created them first
+
+
+def _bump(session: Session, tables: Iterable[str]):
+    """Bump the counters of the given tables (once per transaction) and the global one"""
+    pending = {t for t in tables if t in TRACKED_TABLES}
+    bumped = session.info.setdefault("data_versions_bumped", set())
+    pending -= bumped
+    if not pending:
+        return
+    names = pending if GLOBAL in bumped else pending | {GLOBAL}
+    now = datetime.utcnow()
+    connection = session.connection()
+    result = connection.execute(
+        update(models.DataVersion)
+        .where(models.DataVersion.name.in_(names))
+        .values(version=models.DataVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount < len(names):  # counters not created yet (database made outside main.py)
+        existing = set(connection.execute(
+            select(models.DataVersion.name).where(models.DataVersion.name.in_(names))
+        ).scalars())
+        connection.execute(insert(models.DataVersion), [
+            {"name": n, "version": 1, "updated_at": now} for n in names - existing
+        ])
+    bumped |= names
+
+
+def bump(conn, *tables: str):
+    """Bump the counters of the given tables and the global one on a DB-API connection.
+
+    Runs in the connection's open transaction: the new versions become visible
+    with the caller's commit, together with the data it wrote.
+    """
+    unknown = set(tables) - set(TRACKED_TABLES)
+    if unknown:
+        raise ValueError(f"Untracked tables: {', '.join(sorted(unknown))}")
+    now = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    conn.executemany(
+        "INSERT INTO data_versions (name, version, updated_at) VALUES (?, 1, ?) "
+        "ON CONFLICT(name) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at",
+        [(name, now) for name in sorted(set(tables) | {GLOBAL})],
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_after_flush(session, flush_context):
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    _bump(session, {obj.__table__.name for obj in objects if hasattr(obj, "__table__")})
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _bump_after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None:
+            _bump(orm_execute_state.session, {mapper.persist_selectable.name})
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_bumped(session):
+    session.info.pop("data_versions_bumped", None)
+
+
+def get_versions(db: Session, names: Iterable[str]) -> Dict[str, Tuple[int, Optional[datetime]]]:
+    """Current (version, updated_at) of the given counters"""
+    rows = db.execute(
+        select(models.DataVersion.name, models.DataVersion.version, models.DataVersion.updated_at)
+        .where(models.DataVersion.name.in_(list(names)))
+    ).all()
+    return {r.name: (r.version, r.updated_at) for r in rows}
+
+
+def version_validator(db: Session, *names: str) -> Tuple[str, Optional[datetime]]:
+    """ETag token and Last-Modified for data depending on the given counters (default: global)"""
+    names = names or (GLOBAL,)
+    versions = get_versions(db, names)
+    token = "-".join(f"{n}{versions.get(n, (0, None))[0]}" for n in names)
+    stamps = [v[1] for v in versions.values() if v[1] is not None]
+    return token, max(stamps) if stamps else None
+
+
+def offers_validator(db: Session, *related: str) -> Tuple[str, Optional[datetime]]:
+    """ETag token and Last-Modified for offer lists: row count plus max(updated_at).
+
+    `related` names counters of tables embedded in the response (e.g. the
+    client names of the summary rows) so that their edits change the ETag too.
+    """
+    count, last_update = db.execute(
+        select(func.count(models.Offer.id), func.max(models.Offer.updated_at))
+    ).one()
+    token = f"offers{count}-{last_update.isoformat() if last_update else '0'}"
+    if related:
+        related_token, related_update = version_validator(db, *related)
+        token = f"{token}-{related_token}"
+        if related_update and (last_update is None or related_update > last_update):
+            last_update = related_update
+    return token, last_update
+
+
+if __name__ == "__main__":
+    from backend.database import engine
+    args = sys.argv[1:]
+    if "--bump" in args:
+        tables = [a for a in args if a != "--bump"] or list(TRACKED_TABLES)
+        raw = engine.raw_connection()
+        try:
+            bump(raw, *tables)
+            raw.commit()
+        finally:
+            raw.close()
+    with engine.connect() as conn:
+        for name, version, updated_at in conn.execute(
+            select(models.DataVersion.name, models.DataVersion.version, models.DataVersion.updated_at)
+            .order_by(models.DataVersion.name)
+        ):
+            print(f"{name}: {version} ({updated_at})")
@@ -1,9 +1,11 @@
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, BackgroundTasks
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Form, Query, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from contextlib import asynccontextmanager
 from datetime import timedelta
+import asyncio
 import os
 import sys
 from pathlib import Path
@@ -31,17 +33,39 @@ from backend.auth import (
 )
 from backend.email_importer import EmailImporter
 from backend.reports import ReportGenerator
+from backend.responses import FastJSONResponse, conditional, csv_chunks, ndjson_chunks
+from backend.compression import CompressionMiddleware, XLSX_MEDIA_TYPE, export_cache
+from backend import analytics_cache, data_version, migrations, sla_watchdog
 from fastapi import WebSocket, WebSocketDisconnect
 from fastapi.responses import StreamingResponse
 import io
 
-# Create database tables
-models.Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Prepare the database, then run the SLA watchdog (backend.sla_watchdog) while the app is up.
+
+    Schema work happens here rather than at import time, so importing
+    backend.main (benchmarks, TestClient without `with`) leaves the
+    configured database untouched.
+    """
+    # Create database tables
+    models.Base.metadata.create_all(bind=engine)
+    migrations.run_migrations(engine)
+    data_version.ensure_rows(engine)
+
+    watchdog = None
+    if sla_watchdog.SLA_CHECK_SECONDS > 0:
+        watchdog = asyncio.create_task(sla_watchdog.run(SessionLocal, manager.broadcast))
+    yield
+    if watchdog:
+        watchdog.cancel()
+
 
 app = FastAPI(
     title="M54 Offer Management System",
     description="Sistema completo di gestione offerte Benozzi",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration
@@ -54,6 +78,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
 
 # ============= WebSocket Manager =============
 
@@ -66,14 +91,18 @@ class ConnectionManager:
         self.active_connections.append(websocket)
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        if websocket in self.active_connections:  # broadcast may have dropped it already
+            self.active_connections.remove(websocket)
 
     async def send_personal_message(self, message: str, websocket: WebSocket):
         await websocket.send_text(message)
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        for connection in list(self.active_connections):
+            try:
+                await connection.send_json(message)
+            except Exception:
+                self.active_connections.remove(connection)  # closed without a disconnect
 
 manager = ConnectionManager()
 
@@ -89,6 +118,16 @@ async def websocket_endpoint(websocket: WebSocket):
 
 
 
+# ============= Fast JSON path =============
+
+FAST_QUERY = Query(False, description="Encode rows directly, skipping response validation")
+
+
+def respond(content, fast: bool):
+    """Return content through FastAPI's response_model, or straight to the fast JSON encoder"""
+    return FastJSONResponse(content) if fast else content
+
+
 # ============= Authentication Endpoints =============
 
 @app.post("/auth/login", response_model=schemas.Token)
@@ -255,13 +294,20 @@ def create_client(
 
 @app.get("/clients/", response_model=List[schemas.Client])
 def read_clients(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get all clients"""
-    return crud.get_clients(db, skip=skip, limit=limit)
+    def compute():
+        if fast:
+            return FastJSONResponse(crud.get_client_rows(db, skip=skip, limit=limit))
+        return crud.get_clients(db, skip=skip, limit=limit)
+    return conditional(request, response, data_version.version_validator(db, "clients"), compute)
 
 
 @app.get("/clients/{client_id}", response_model=schemas.Client)
@@ -316,28 +362,116 @@ def create_offer(
     return crud.create_offer(db, offer)
 
 
-@app.get("/offers/", response_model=List[schemas.Offer])
+OFFERS_PAGE_SIZE = 100
+OFFERS_MAX_PAGE_SIZE = 1000
+
+
+@app.get("/offers/", response_model=schemas.OfferPage)
 def read_offers(
-    skip: int = 0,
-    limit: int = 10000,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(OFFERS_PAGE_SIZE, ge=1, le=OFFERS_MAX_PAGE_SIZE),
     status: Optional[models.OfferStatus] = None,
     priority: Optional[models.Priority] = None,
     client_id: Optional[int] = None,
     managed_by_id: Optional[int] = None,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db)
 ):
-    """Get offers with optional filters - NO AUTH REQUIRED"""
-    return crud.get_offers(db, skip, limit, status, priority, client_id, managed_by_id)
+    """Get one page of offers with optional filters - NO AUTH REQUIRED.
+
+    Pass the returned `next_cursor` back as `cursor` to get the next page.
+    """
+    filters = dict(status=status, priority=priority, client_id=client_id, managed_by_id=managed_by_id)
+
+    def compute():
+        if fast:
+            return FastJSONResponse(crud.get_offer_rows_page(db, limit, cursor, **filters))
+        return crud.get_offers_page(db, limit, cursor, **filters)
+    try:
+        return conditional(request, response, data_version.offers_validator(db, "clients", "users"), compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@app.get("/offers/my-offers", response_model=List[schemas.Offer])
+@app.get("/offers/my-offers", response_model=schemas.OfferPage)
 def read_my_offers(
-    skip: int = 0,
-    limit: int = 100,
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(OFFERS_PAGE_SIZE, ge=1, le=OFFERS_MAX_PAGE_SIZE),
     db: Session = Depends(auth.get_db)
 ):
     """Get offers assigned to current user - FORCED ADMIN ACCESS"""
-    return crud.get_offers(db, skip, limit)
+    try:
+        return conditional(
+            request, response, data_version.offers_validator(db, "clients", "users"),
+            lambda: crud.get_offers_page(db, limit, cursor)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/offers/summary", response_model=schemas.OfferSummaryPage, response_model_exclude_unset=True)
+def read_offer_summaries(
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(OFFERS_PAGE_SIZE, ge=1, le=OFFERS_MAX_PAGE_SIZE),
+    fields: Optional[str] = Query(None, description="Comma separated subset of the summary columns"),
+    status: Optional[models.OfferStatus] = None,
+    priority: Optional[models.Priority] = None,
+    client_id: Optional[int] = None,
+    managed_by_id: Optional[int] = None,
+    fast: bool = FAST_QUERY,
+    db: Session = Depends(auth.get_db)
+):
+    """Get one page of lightweight offer rows for the offer grid - NO AUTH REQUIRED"""
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+
+    def compute():
+        page = crud.get_offer_summaries_page(
+            db, limit, cursor, field_list,
+            status=status, priority=priority, client_id=client_id, managed_by_id=managed_by_id
+        )
+        return respond(page, fast)
+    try:
+        return conditional(request, response, data_version.offers_validator(db, "clients"), compute)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/offers/export")
+def export_offers(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[models.OfferStatus] = None,
+    priority: Optional[models.Priority] = None,
+    client_id: Optional[int] = None,
+    managed_by_id: Optional[int] = None,
+    db: Session = Depends(auth.get_db)
+):
+    """Stream the whole offer register (filtered like GET /offers/) as NDJSON or CSV"""
+    filters = dict(status=status, priority=priority, client_id=client_id, managed_by_id=managed_by_id)
+    batch_size = crud.OFFER_EXPORT_BATCH_SIZE
+    columns = [c.name for c in crud.offer_export_statement(**filters).selected_columns]
+
+    def stream():
+        try:
+            rows = crud.iter_offer_export_rows(db, batch_size, **filters)
+            if format == "csv":
+                yield from csv_chunks(columns, rows, batch_size)
+            else:
+                yield from ndjson_chunks(rows, batch_size)
+        finally:
+            db.close()
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename=offerte_M54.{format}"}
+    )
 
 
 @app.get("/offers/{offer_id}", response_model=schemas.Offer)
@@ -562,90 +696,166 @@ def update_note(
 @app.get("/analytics/monthly-evolution/{year}", response_model=List[schemas.MonthlyEvolution])
 def get_monthly_evolution(
     year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get monthly evolution stats"""
-    return analytics_crud.get_monthly_evolution(db, year)
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_crud.get_monthly_evolution(db, year), fast))
 
 
 @app.get("/analytics/reasons/{year}", response_model=schemas.ReasonsAnalysis)
 def get_reasons_stats(
     year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get declined/not accepted reasons stats"""
-    return analytics_crud.get_reasons_stats(db, year)
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_crud.get_reasons_stats(db, year), fast))
 
 
 @app.get("/analytics/client-ranking/{year}", response_model=List[schemas.ClientRanking])
-def get_client_ranking(year: int, db: Session = Depends(auth.get_db)):
-    return analytics_crud.get_client_ranking(db, year)
+def get_client_ranking(
+    year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
+    db: Session = Depends(auth.get_db)
+):
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_crud.get_client_ranking(db, year), fast))
 
 
 @app.get("/analytics/sector-distribution/{year}")
-def get_sector_distribution(year: int, db: Session = Depends(auth.get_db)):
-    return analytics_crud.get_sector_distribution(db, year)
+def get_sector_distribution(
+    year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
+    db: Session = Depends(auth.get_db)
+):
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_crud.get_sector_distribution(db, year), fast))
 
 
 @app.get("/analytics/item-mix/{year}")
-def get_new_vs_reorder_stats(year: int, db: Session = Depends(auth.get_db)):
-    return analytics_crud.get_new_vs_reorder_stats(db, year)
+def get_new_vs_reorder_stats(
+    year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
+    db: Session = Depends(auth.get_db)
+):
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_crud.get_new_vs_reorder_stats(db, year), fast))
 
 
 @app.get("/analytics/comparison", response_model=dict)
 def get_comparison_data(
+    request: Request,
+    response: Response,
     years: str = "2024,2025",
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
-    """Get comparison stats for multiple years (comma separated)"""
-    year_list = [int(y) for y in years.split(',') if y.isdigit()]
-    return analytics_crud.get_comparison_data(db, year_list)
+    """Get comparison stats for multiple years (comma separated, at most 10)"""
+    try:
+        year_list = analytics_crud.parse_years(years)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return conditional(
+        request, response, data_version.version_validator(db),
+        lambda: respond(analytics_crud.get_comparison_data(db, year_list), fast)
+    )
+
+
+@app.get("/analytics/bundle/{year}", response_model=dict)
+def get_analytics_bundle(
+    year: int,
+    request: Request,
+    response: Response,
+    parts: Optional[str] = None,
+    years: Optional[str] = None,
+    fast: bool = FAST_QUERY,
+    db: Session = Depends(auth.get_db),
+):
+    """Analytics page data of a year in one response.
+
+    parts: comma separated subset of monthly_evolution, reasons, client_ranking,
+    sector_distribution, item_mix, comparison (default: all); years: the
+    comparison years (default: previous and current year).
+    """
+    try:
+        part_list = analytics_crud.parse_parts(parts)
+        default_years = analytics_crud.default_comparison_years(year)
+        year_list = analytics_crud.parse_years(years) if years else default_years
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return conditional(
+        request, response, data_version.version_validator(db),
+        lambda: respond(analytics_crud.get_analytics_bundle(db, year, part_list, year_list), fast)
+    )
 
 
 @app.get("/analytics/export/excel/{year}")
 def export_excel_report(
     year: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(auth.get_db),
     
 ):
-    """Export analytics to Excel"""
-    generator = ReportGenerator(db)
-    file_handle = generator.generate_excel_analytics(year)
-    return StreamingResponse(
-        file_handle,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    """Export analytics to Excel (cached per data version)"""
+    validator = data_version.version_validator(db)
+    return conditional(request, response, validator, lambda: export_cache.response(
+        request, ("excel", year, validator[0]),
+        lambda: ReportGenerator(db).generate_excel_analytics(year).getvalue(),
+        media_type=XLSX_MEDIA_TYPE,
         headers={"Content-Disposition": f"attachment; filename=Report_M54_{year}.xlsx"}
-    )
+    ))
 
 
 @app.get("/analytics/export/pdf/{year}")
 def export_pdf_report(
     year: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(auth.get_db),
     
 ):
-    """Export analytics to PDF"""
-    generator = ReportGenerator(db)
-    file_handle = generator.generate_pdf_summary(year)
-    return StreamingResponse(
-        file_handle,
+    """Export analytics to PDF (cached per data version, precompressed)"""
+    validator = data_version.version_validator(db)
+    return conditional(request, response, validator, lambda: export_cache.response(
+        request, ("pdf", year, validator[0]),
+        lambda: ReportGenerator(db).generate_pdf_summary(year).getvalue(),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename=Report_M54_{year}.pdf"}
-    )
+    ))
+
+
+@app.get("/analytics/cache-stats")
+def get_analytics_cache_stats():
+    """Hit/miss counters of the analytics result cache"""
+    return analytics_cache.cache.stats()
 
 
 # ============= Dashboard Endpoints =============
 
 @app.get("/dashboard/stats", response_model=schemas.DashboardStats)
 def get_dashboard_stats(
+    request: Request,
+    response: Response,
     year: Optional[int] = None,
     db: Session = Depends(auth.get_db)
 ):
     """Get dashboard statistics - NO AUTH"""
-    return crud.get_dashboard_stats(db, None, None, year)
+    return conditional(
+        request, response, data_version.version_validator(db),
+        lambda: crud.get_dashboard_stats(db, None, None, year)
+    )
 
 
 # ============= New Analytics Endpoints =============
@@ -667,57 +877,87 @@ def get_user_performance_endpoint(
 
 @app.get("/analytics/team-performance")
 def get_team_performance_endpoint(
-    period: str = Query(..., description="Period in format YYYY-MM"),
+    request: Request,
+    response: Response,
+    period: Optional[str] = Query(None, description="Period in format YYYY-MM"),
+    period_from: Optional[str] = Query(None, description="First period of a range (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, description="Last period of a range (YYYY-MM)"),
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
-    """Get performance metrics for all team members"""
+    """Get performance metrics for all team members, for one period or a period_from/period_to range
+    (one row per member and period, in period order)"""
     from backend import analytics_enrichment
-    return analytics_enrichment.get_team_performance(db, period)
+    try:
+        first, last = analytics_enrichment.parse_period_range(period, period_from, period_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return conditional(
+        request, response, data_version.version_validator(db),
+        lambda: respond(analytics_enrichment.get_team_performance(db, first, last), fast)
+    )
 
 
 @app.get("/analytics/workflow-timing/{year}")
 def get_workflow_timing_endpoint(
     year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get workflow timing statistics by phase"""
     from backend import analytics_enrichment
-    return analytics_enrichment.calculate_workflow_timing_stats(db, year)
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_enrichment.calculate_workflow_timing_stats(db, year), fast))
 
 
 @app.get("/analytics/bottlenecks")
 def get_bottlenecks_endpoint(
     threshold_hours: float = Query(48, description="Alert threshold in hours"),
+    clock: str = Query("wall", description="Threshold in 'wall' (default) or 'business' (working calendar) hours"),
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
-    """Get alerts for stuck offers in workflow"""
+    """Get alerts for stuck offers in workflow (in-progress steps over the threshold, longest first).
+    Durations are live, so the response is not cached."""
     from backend import analytics_enrichment
-    return analytics_enrichment.get_bottleneck_alerts(db, threshold_hours)
+    try:
+        alerts = analytics_enrichment.get_bottleneck_alerts(db, threshold_hours, clock)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return respond(alerts, fast)
 
 
 @app.get("/analytics/seasonal-trends/{year}")
 def get_seasonal_trends_endpoint(
     year: int,
+    request: Request,
+    response: Response,
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get seasonal trends and monthly patterns"""
     from backend import analytics_enrichment
-    return analytics_enrichment.calculate_seasonal_trends(db, year)
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_enrichment.calculate_seasonal_trends(db, year), fast))
 
 
 @app.get("/analytics/client-loyalty/{year}")
 def get_client_loyalty_endpoint(
     year: int,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Only the top N clients by loyalty score"),
+    fast: bool = FAST_QUERY,
     db: Session = Depends(auth.get_db),
     
 ):
     """Get client loyalty metrics"""
     from backend import analytics_enrichment
-    return analytics_enrichment.calculate_client_loyalty(db, year)
+    return conditional(request, response, data_version.version_validator(db), lambda: respond(analytics_enrichment.calculate_client_loyalty(db, year, limit), fast))
 
 
 # ============= Health Check =============
@@ -0,0 +1,147 @@
+"""
+Versioned schema migrations.
+
+create_all() only creates missing tables, so changes to existing tables
+(new indexes, columns...) are applied here, in order, and recorded in
+schema_migrations. run_migrations() is called at startup after create_all
+and is a no-op once everything is applied.
+
+Usage: python -m backend.migrations   (applies pending migrations to DATABASE_URL)
+"""
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import insert, inspect, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import IntegrityError
+
+from backend import models
+
+
+def _create_indexes(conn: Connection, table, names: Tuple[str, ...]):
+    """Create the named indexes declared on the model table, if missing"""
+    declared = {index.name: index for index in table.indexes}
+    for name in names:
+        declared[name].create(bind=conn, checkfirst=True)
+
+
+def _add_columns(conn: Connection, table, names: Tuple[str, ...]):
+    """Add the named columns declared on the model table, if missing (nullable, no default)"""
+    existing = {column["name"] for column in inspect(conn).get_columns(table.name)}
+    for name in names:
+        if name not in existing:
+            column_type = table.c[name].type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type}")
+
+
+def _001_query_indexes(conn: Connection):
+    _create_indexes(conn, models.Offer.__table__, (
+        "ix_offers_year_status_mail_date",
+        "ix_offers_client_year",
+        "ix_offers_created_at_id",
+        "ix_offers_managed_by_created_at",
+    ))
+    _create_indexes(conn, models.WorkflowStep.__table__, (
+        "ix_workflow_steps_offer_order",
+        "ix_workflow_steps_assigned_to_id",
+    ))
+
+
+def _002_offer_counters(conn: Connection):
+    from backend import rollups
+    models.OfferCounter.__table__.create(bind=conn, checkfirst=True)
+    rollups.refill(conn, models.OfferCounter, from_mail_date=True)
+
+
+def _003_offer_monthly_facts(conn: Connection):
+    from backend import rollups
+    models.OfferMonthlyFact.__table__.create(bind=conn, checkfirst=True)
+    rollups.refill(conn, models.OfferMonthlyFact, from_mail_date=True)
+
+
+def _004_mail_calendar(conn: Connection):
+    # the rollups are now computed from these columns: refill them once they exist
+    from backend import rollups
+    _add_columns(conn, models.Offer.__table__, ("mail_year", "mail_month", "mail_week"))
+    rollups.fill_mail_calendar(conn)
+    _create_indexes(conn, models.Offer.__table__, ("ix_offers_mail_year_month",))
+    rollups.refill(conn, models.OfferCounter, models.OfferMonthlyFact)  # the rollups that exist at this point
+
+
+def _005_offer_monthly_facts_mix_index(conn: Connection):
+    # replaces ix_offer_monthly_facts_year_sector, which missed is_new_item (year_mix_query)
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_offer_monthly_facts_year_sector")
+    _create_indexes(conn, models.OfferMonthlyFact.__table__, ("ix_offer_monthly_facts_year_mix",))
+
+
+def _006_user_performance_period_index(conn: Connection):
+    _create_indexes(conn, models.UserPerformanceMetrics.__table__, ("ix_user_performance_metrics_period_user",))
+
+
+def _007_client_analytics_fields(conn: Connection):
+    columns = ("new_items_count", "reorder_count", "loyalty_score")
+    _add_columns(conn, models.Client.__table__, columns)
+    conn.exec_driver_sql(  # schemas.Client requires values
+        "UPDATE clients SET " + ", ".join(f"{c} = COALESCE({c}, 0)" for c in columns)
+    )
+
+
+def _008_workflow_steps_status_started_at_index(conn: Connection):
+    _create_indexes(conn, models.WorkflowStep.__table__, ("ix_workflow_steps_status_started_at",))
+
+
+def _009_dated_holidays(conn: Connection):
+    # import_enrichment_data.py stored the dated FESTIVITA sheet (weekends and
+    # holidays of given years) as recurring: it would repeat on other weekdays
+    conn.exec_driver_sql("UPDATE holidays SET is_recurring = 0 WHERE description = 'Festivita M77'")
+
+
+def _010_department_step_counters(conn: Connection):
+    from backend import rollups
+    models.DepartmentStepCounter.__table__.create(bind=conn, checkfirst=True)
+    rollups.refill(conn, models.DepartmentStepCounter)
+
+
+# (version, description, upgrade) - append only, never renumber
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Composite/covering indexes for analytics, offer lists and workflow steps", _001_query_indexes),
+    (2, "offer_counters rollup for the dashboard", _002_offer_counters),
+    (3, "offer_monthly_facts rollup for the year analytics", _003_offer_monthly_facts),
+    (4, "Stored mail_year/mail_month/mail_week on offers", _004_mail_calendar),
+    (5, "Covering index for the sector / new-vs-reorder split of offer_monthly_facts", _005_offer_monthly_facts_mix_index),
+    (6, "Period index for the team performance range query", _006_user_performance_period_index),
+    (7, "Map the client analytics fields (new_items_count, reorder_count, loyalty_score)", _007_client_analytics_fields),
+    (8, "(status, started_at) index on workflow_steps for the SLA watchdog", _008_workflow_steps_status_started_at_index),
+    (9, "Imported FESTIVITA dates are not recurring", _009_dated_holidays),
+    (10, "department_step_counters rollup for the dashboard by_department", _010_department_step_counters),
+]
+
+
+def applied_versions(conn: Connection) -> set:
+    return set(conn.execute(select(models.SchemaMigration.version)).scalars())
+
+
+def run_migrations(engine) -> List[int]:
+    """Apply pending migrations, each in its own transaction; return the versions applied"""
+    models.SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    applied = []
+    for version, description, upgrade in MIGRATIONS:
+        try:
+            with engine.begin() as conn:
+                if version in applied_versions(conn):
+                    continue
+                upgrade(conn)
+                conn.execute(insert(models.SchemaMigration).values(
+                    version=version, description=description, applied_at=datetime.utcnow()
+                ))
+        except IntegrityError:
+            continue  # applied concurrently by another worker
+        applied.append(version)
+    return applied
+
+
+if __name__ == "__main__":
+    from backend.database import engine
+    models.Base.metadata.create_all(bind=engine)
+    done = run_migrations(engine)
+    print(f"Applied migrations: {done}" if done else "Database already up to date")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Text, Index, Enum as SQLEnum, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 import enum
@@ -102,6 +102,11 @@ class Client(Base):
     voto = Column(Integer)  # Client score/rating (1-10)
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Analytics fields
+    new_items_count = Column(Integer, default=0)
+    reorder_count = Column(Integer, default=0)
+    loyalty_score = Column(Float, default=0.0)
     
     # Relationships
     offers = relationship("Offer", back_populates="client")
@@ -164,6 +169,11 @@ class Offer(Base):
     week_stats = Column(Integer)
     month_stats = Column(String(20))
     year_stats = Column(Integer)
+
+    # Calendar of mail_date, derived on every assignment (see _derive_mail_calendar)
+    mail_year = Column(Integer)
+    mail_month = Column(Integer)
+    mail_week = Column(Integer)  # ISO week
     
     # Timestamps
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -178,6 +188,32 @@ class Offer(Base):
     messages = relationship("OfferMessage", back_populates="offer", cascade="all, delete-orphan")
     notes = relationship("OfferNote", back_populates="offer", cascade="all, delete-orphan")
 
+    # Access paths of the analytics and list queries (existing databases get
+    # them from backend/migrations.py)
+    __table_args__ = (
+        # year filter + status/month grouping; offer_amount makes it covering
+        Index("ix_offers_year_status_mail_date", "year_stats", "status", "mail_date", "offer_amount"),
+        # per-client filters and the client ranking/sector joins
+        Index("ix_offers_client_year", "client_id", "year_stats", "status", "offer_amount"),
+        # keyset pagination order (created_at desc, id desc)
+        Index("ix_offers_created_at_id", "created_at", "id"),
+        Index("ix_offers_managed_by_created_at", "managed_by_id", "created_at", "id"),
+        # calendar grouping without parsing mail_date
+        Index("ix_offers_mail_year_month", "mail_year", "mail_month", "mail_week"),
+    )
+
+
+def mail_calendar(mail_date):
+    """(year, month, ISO week) of a mail date, or Nones"""
+    if mail_date is None:
+        return None, None, None
+    return mail_date.year, mail_date.month, mail_date.isocalendar()[1]
+
+
+@event.listens_for(Offer.mail_date, "set")
+def _derive_mail_calendar(offer, value, oldvalue, initiator):
+    offer.mail_year, offer.mail_month, offer.mail_week = mail_calendar(value)
+
 
 class WorkflowStep(Base):
     __tablename__ = "workflow_steps"
@@ -208,6 +244,13 @@ class WorkflowStep(Base):
     offer = relationship("Offer", back_populates="workflow_steps")
     assigned_user = relationship("User", back_populates="workflow_steps")
 
+    __table_args__ = (
+        Index("ix_workflow_steps_offer_order", "offer_id", "order_index"),
+        Index("ix_workflow_steps_assigned_to_id", "assigned_to_id"),
+        # in-progress steps by start time (SLA watchdog, bottleneck alerts)
+        Index("ix_workflow_steps_status_started_at", "status", "started_at"),
+    )
+
 
 class OfferFile(Base):
     __tablename__ = "offer_files"
@@ -297,3 +340,95 @@ class UserPerformanceMetrics(Base):
     
     # Relationships
     user = relationship("User")
+
+    __table_args__ = (
+        # team performance of a period / period range
+        Index("ix_user_performance_metrics_period_user", "period", "user_id"),
+    )
+
+
+class OfferCounter(Base):
+    """Offer count and value per dashboard bucket, kept up to date by backend.rollups.
+
+    Missing dimensions are stored as 0 / "" so that every bucket has a plain
+    primary key (NULLs never compare equal).
+    """
+    __tablename__ = "offer_counters"
+
+    year_stats = Column(Integer, primary_key=True)
+    mail_year = Column(Integer, primary_key=True)
+    mail_month = Column(Integer, primary_key=True)
+    status = Column(String(50), primary_key=True)
+    client_id = Column(Integer, primary_key=True)
+    managed_by_id = Column(Integer, primary_key=True)
+    offer_count = Column(Integer, nullable=False, default=0)
+    offer_value = Column(Float, nullable=False, default=0.0)
+
+
+class OfferMonthlyFact(Base):
+    """Offer count and value per (year, month, client, sector, status, new item,
+    manager), kept up to date by backend.rollups; read by the year analytics.
+
+    Missing dimensions are stored as 0 / "" / False, as in offer_counters.
+    valued_count counts the offers with an amount (for averages).
+    """
+    __tablename__ = "offer_monthly_facts"
+
+    year_stats = Column(Integer, primary_key=True)
+    mail_year = Column(Integer, primary_key=True)
+    mail_month = Column(Integer, primary_key=True)
+    client_id = Column(Integer, primary_key=True)
+    sector = Column(String(255), primary_key=True)
+    status = Column(String(50), primary_key=True)
+    is_new_item = Column(Boolean, primary_key=True)
+    managed_by_id = Column(Integer, primary_key=True)
+    offer_count = Column(Integer, nullable=False, default=0)
+    offer_value = Column(Float, nullable=False, default=0.0)
+    valued_count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        # Covering indexes for the year analytics (no table lookups)
+        Index("ix_offer_monthly_facts_year_month", "year_stats", "mail_month", "mail_year", "status",
+              "is_new_item", "offer_count", "offer_value", "valued_count"),
+        Index("ix_offer_monthly_facts_year_mix", "year_stats", "sector", "is_new_item", "client_id",
+              "offer_count", "offer_value"),
+        Index("ix_offer_monthly_facts_client_id", "client_id"),  # sector changes
+    )
+
+
+class DepartmentStepCounter(Base):
+    """Workflow step count per (offer year, department, still open), kept up to
+    date by backend.rollups; read by the by_department part of the dashboard.
+
+    Missing dimensions are stored as 0 / "", as in offer_counters. Steps count
+    under the year_stats of their offer.
+    """
+    __tablename__ = "department_step_counters"
+
+    year_stats = Column(Integer, primary_key=True)
+    department = Column(String(100), primary_key=True)
+    is_open = Column(Boolean, primary_key=True)
+    step_count = Column(Integer, nullable=False, default=0)
+
+
+class SchemaMigration(Base):
+    """Versions applied by backend.migrations"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(255))
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
+
+class DataVersion(Base):
+    """Write counter per table (plus "global"), bumped by backend.data_version on every ORM write"""
+    __tablename__ = "data_versions"
+
+    name = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+# Register the write hooks that keep DataVersion and the offer rollups up to date (needs the models above)
+import backend.data_version  # noqa: E402,F401
+import backend.rollups  # noqa: E402,F401
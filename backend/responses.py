@@ -0,0 +1,140 @@
+"""
+Response helpers for the read-heavy list and analytics endpoints.
+
+- FastJSONResponse: used when endpoints are called with ?fast=true; the
+  content (plain dicts/tuples fetched from the database) is encoded directly,
+  skipping FastAPI's response_model validation and jsonable_encoder passes.
+- conditional(): ETag / Last-Modified validators and 304 answers.
+- ndjson_chunks() / csv_chunks(): encoders for streamed exports, one chunk
+  of bytes per batch of rows.
+"""
+import csv
+import enum
+import io
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # fall back to the stdlib encoder, still without the validation pass
+    orjson = None
+    import json
+
+
+def _default(obj: Any):
+    """Encode the few types orjson/json do not handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if orjson is None:
+        if hasattr(obj, "isoformat"):
+            return obj.isoformat()
+        if hasattr(obj, "value"):  # Enum
+            return obj.value
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes with the fastest available encoder"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match (weak comparison), or If-Modified-Since when no ETag was sent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        bare = etag[2:] if etag.startswith("W/") else etag
+        return "*" in tags or any((t[2:] if t.startswith("W/") else t) == bare for t in tags)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
+
+def conditional(
+    request: Request,
+    response: Response,
+    validator: Tuple[str, Optional[datetime]],
+    compute: Callable[[], Any]
+):
+    """Answer 304 if the client copy is current, otherwise compute() and attach the validators.
+
+    `validator` is (etag token, last modified as naive UTC) from backend.data_version;
+    compute() only runs when the data actually has to be sent.
+    """
+    token, last_modified = validator
+    etag = f'W/"{token}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+
+    if _not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    content = compute()
+    target = content if isinstance(content, Response) else response
+    target.headers.update(headers)
+    return content
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ndjson_chunks(rows: Iterable, batch_size: int = 1000) -> Iterator[bytes]:
+    """Encode rows (SQLAlchemy Row or mappings) as newline-delimited JSON"""
+    for batch in _batches(rows, batch_size):
+        yield b"".join(dumps(dict(row._mapping) if hasattr(row, "_mapping") else row) + b"\n" for row in batch)
+
+
+def _csv_value(value: Any):
+    if value is None:
+        return ""
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns: Sequence[str], rows: Iterable, batch_size: int = 1000) -> Iterator[bytes]:
+    """Encode rows (tuples in `columns` order) as CSV, header first"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for batch in _batches(rows, batch_size):
+        writer.writerows([_csv_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():  # header only, no rows
+        yield buffer.getvalue().encode("utf-8")
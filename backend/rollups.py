@@ -0,0 +1,489 @@
+"""
+Offer rollups, kept in step with the offers by one write hook on the Session:
+
+- offer_counters: count and value per dashboard bucket, behind /dashboard/stats;
+- offer_monthly_facts: count and value per (year, month, client, sector,
+  status, new item, manager), behind the year analytics;
+- department_step_counters: workflow steps per (offer year, department,
+  open), behind the by_department part of /dashboard/stats.
+
+Every flush that inserts, updates or deletes Offer objects (crud, email
+importer, Excel importer...) moves the offer out of its old buckets and into
+its new ones, in the same transaction; a changed Client.sector moves the
+client's facts, and WorkflowStep writes (or an offer changing year) move the
+step counters. Bulk UPDATE/DELETE statements on offers, and on the
+department/status/offer of workflow steps, would bypass the hooks, so the
+Session refuses them unless they carry the execution option
+refill_rollups=True, which refills the rollups right after the statement in
+the same transaction. Raw sqlite3 scripts still bypass it; run the rebuild
+after them (it also derives the mail calendar columns those scripts leave
+empty).
+
+Usage: python -m backend.rollups [--check]   (rebuild, or only report drift)
+"""
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from sqlalchemy import bindparam, case, delete, event, exc, extract, false, func, insert, inspect, literal, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from backend import models
+
+# Offer attributes that decide the buckets or the measures
+TRACKED_ATTRIBUTES = ("year_stats", "mail_year", "mail_month", "status", "client_id", "managed_by_id", "offer_amount", "is_new_item")
+KEY_COLUMNS = ("year_stats", "mail_year", "mail_month", "status", "client_id", "managed_by_id")
+FACT_COLUMNS = ("year_stats", "mail_year", "mail_month", "client_id", "sector", "status", "is_new_item", "managed_by_id")
+
+# WorkflowStep attributes that decide its department counter
+STEP_ATTRIBUTES = ("offer_id", "department", "status")
+STEP_COLUMNS = ("year_stats", "department", "is_open")
+OPEN_STEP_STATUSES = (models.WorkflowStepStatus.PENDING.value, models.WorkflowStepStatus.IN_PROGRESS.value)
+
+Bucket = Tuple[int, int, int, str, int, int]
+Fact = Tuple[int, int, int, int, str, str, bool, int]
+
+
+def _status_key(status) -> str:
+    if status is None:
+        return ""
+    return str(getattr(status, "value", status)).upper()
+
+
+def bucket_of(values: Dict) -> Bucket:
+    return (
+        values.get("year_stats") or 0,
+        values.get("mail_year") or 0,
+        values.get("mail_month") or 0,
+        _status_key(values.get("status")),
+        values.get("client_id") or 0,
+        values.get("managed_by_id") or 0,
+    )
+
+
+def fact_of(values: Dict, sectors: Dict[int, str]) -> Fact:
+    """Facts key of an offer; sectors maps client_id to the client's sector"""
+    status = values.get("status")
+    client_id = values.get("client_id") or 0
+    return (
+        values.get("year_stats") or 0,
+        values.get("mail_year") or 0,
+        values.get("mail_month") or 0,
+        client_id,
+        sectors.get(client_id) or "",
+        "" if status is None else str(getattr(status, "value", status)),
+        bool(values.get("is_new_item")),
+        values.get("managed_by_id") or 0,
+    )
+
+
+def _current_values(obj, attrs=TRACKED_ATTRIBUTES) -> Dict:
+    return {attr: getattr(obj, attr) for attr in attrs}
+
+
+def _previous_values(obj, attrs=TRACKED_ATTRIBUTES) -> Dict:
+    """Values as last loaded from the database (before the pending changes)"""
+    state = inspect(obj)
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif history.unchanged:
+            values[attr] = history.unchanged[0]
+        else:
+            values[attr] = getattr(obj, attr)
+    return values
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the old value when a tracked attribute is assigned, so the old bucket is known
+for _attr in TRACKED_ATTRIBUTES:
+    event.listen(getattr(models.Offer, _attr), "set", _keep_old_value, active_history=True)
+for _attr in STEP_ATTRIBUTES:
+    event.listen(getattr(models.WorkflowStep, _attr), "set", _keep_old_value, active_history=True)
+
+
+def _upsert(connection, model, keys: Tuple[str, ...], rows: List[Dict]):
+    """Add the deltas to existing buckets, creating the missing ones"""
+    table = model.__table__
+    measures = [k for k in rows[0] if k not in keys]
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        stmt = (sqlite.insert if dialect == "sqlite" else postgresql.insert)(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={m: table.c[m] + stmt.excluded[m] for m in measures},
+        )
+        connection.execute(stmt, rows)
+        return
+    for row in rows:  # other backends: update, then insert if the bucket is new
+        key = [table.c[k] == row[k] for k in keys]
+        result = connection.execute(table.update().where(*key).values(
+            {m: table.c[m] + row[m] for m in measures}
+        ))
+        if result.rowcount == 0:
+            connection.execute(insert(table), row)
+
+
+def _offer_changes(session) -> List[Tuple[Dict, int]]:
+    """(values, +1/-1) for every offer entering or leaving its buckets in this flush"""
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, models.Offer):
+            changes.append((_current_values(obj), 1))
+    for obj in session.deleted:
+        if isinstance(obj, models.Offer):
+            changes.append((_previous_values(obj), -1))
+    for obj in session.dirty:
+        if isinstance(obj, models.Offer) and session.is_modified(obj):
+            old, new = _previous_values(obj), _current_values(obj)
+            if old != new:
+                changes.append((old, -1))
+                changes.append((new, 1))
+    return changes
+
+
+@event.listens_for(Session, "after_flush")
+def _update_rollups(session, flush_context):
+    connection = None
+
+    # A client's sector changed: its facts follow (before the offer deltas,
+    # which are keyed on the current sector)
+    for obj in session.dirty:
+        if isinstance(obj, models.Client) and inspect(obj).attrs.sector.history.has_changes():
+            connection = connection or session.connection()
+            connection.execute(
+                update(models.OfferMonthlyFact)
+                .where(models.OfferMonthlyFact.client_id == obj.id)
+                .values(sector=obj.sector or "")
+            )
+
+    changes = _offer_changes(session)
+    if not changes:
+        return
+    connection = connection or session.connection()
+    client_ids = {values["client_id"] for values, _ in changes if values.get("client_id")}
+    sectors = dict(connection.execute(
+        select(models.Client.id, models.Client.sector).where(models.Client.id.in_(client_ids))
+    ).all()) if client_ids else {}
+
+    counters = defaultdict(lambda: [0, 0.0])
+    facts = defaultdict(lambda: [0, 0.0, 0])
+    for values, sign in changes:
+        amount = values.get("offer_amount")
+        counter = counters[bucket_of(values)]
+        counter[0] += sign
+        counter[1] += sign * float(amount or 0)
+        fact = facts[fact_of(values, sectors)]
+        fact[0] += sign
+        fact[1] += sign * float(amount or 0)
+        fact[2] += sign if amount is not None else 0
+
+    rows = [
+        dict(zip(KEY_COLUMNS, key), offer_count=count, offer_value=value)
+        for key, (count, value) in counters.items() if count or value
+    ]
+    if rows:
+        _upsert(connection, models.OfferCounter, KEY_COLUMNS, rows)
+    rows = [
+        dict(zip(FACT_COLUMNS, key), offer_count=count, offer_value=value, valued_count=valued)
+        for key, (count, value, valued) in facts.items() if count or value or valued
+    ]
+    if rows:
+        _upsert(connection, models.OfferMonthlyFact, FACT_COLUMNS, rows)
+
+
+def _step_key(values: Dict, year) -> Tuple[int, str, bool]:
+    status = values.get("status")
+    return year or 0, values.get("department") or "", getattr(status, "value", status) in OPEN_STEP_STATUSES
+
+
+@event.listens_for(Session, "after_flush")
+def _update_step_counters(session, flush_context):
+    # (step values, +1/-1, counted under the offer year before this flush)
+    changes = []
+    touched = set()
+    for obj in session.new:
+        if isinstance(obj, models.WorkflowStep):
+            changes.append((_current_values(obj, STEP_ATTRIBUTES), 1, False))
+            touched.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, models.WorkflowStep):
+            changes.append((_previous_values(obj, STEP_ATTRIBUTES), -1, True))
+            touched.add(obj.id)
+    for obj in session.dirty:
+        if isinstance(obj, models.WorkflowStep) and session.is_modified(obj):
+            old, new = _previous_values(obj, STEP_ATTRIBUTES), _current_values(obj, STEP_ATTRIBUTES)
+            if old != new:
+                changes.append((old, -1, True))
+                changes.append((new, 1, False))
+                touched.add(obj.id)
+
+    # Offers deleted or moved to another year take their other steps along
+    years_before = {}
+    for obj in session.deleted:
+        if isinstance(obj, models.Offer):
+            years_before[obj.id] = _previous_values(obj)["year_stats"]
+    for obj in session.dirty:
+        if isinstance(obj, models.Offer) and session.is_modified(obj):
+            year = _previous_values(obj)["year_stats"]
+            if year != obj.year_stats:
+                years_before[obj.id] = year
+    if not changes and not years_before:
+        return
+
+    connection = session.connection()
+    step = models.WorkflowStep
+    if years_before:
+        for row in connection.execute(
+            select(step.id, step.offer_id, step.department, step.status).where(step.offer_id.in_(years_before))
+        ):
+            if row.id not in touched:
+                values = dict(zip(STEP_ATTRIBUTES, row[1:]))
+                changes.append((values, -1, True))
+                changes.append((values, 1, False))
+    offer_ids = {values["offer_id"] for values, _, _ in changes} | set(years_before)
+    years_now = dict(connection.execute(
+        select(models.Offer.id, models.Offer.year_stats).where(models.Offer.id.in_(offer_ids))
+    ).all())
+
+    counters = defaultdict(int)
+    for values, sign, before in changes:
+        offer_id = values["offer_id"]
+        if before and offer_id in years_before:
+            year = years_before[offer_id]
+        elif offer_id in years_now:
+            year = years_now[offer_id]
+        else:
+            continue  # no such offer: the step is not counted, as in the steps x offers join
+        counters[_step_key(values, year)] += sign
+    rows = [dict(zip(STEP_COLUMNS, key), step_count=count) for key, count in counters.items() if count]
+    if rows:
+        _upsert(connection, models.DepartmentStepCounter, STEP_COLUMNS, rows)
+
+
+def _set_attributes(state) -> set:
+    """Names of the columns a bulk UPDATE sets (values() or per-row parameters)"""
+    names = {getattr(column, "key", column) for column in state.statement._values or ()}
+    parameters = state.parameters
+    for row in parameters if isinstance(parameters, list) else [parameters or {}]:
+        names |= set(row)
+    return names
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _guard_bulk_offer_writes(orm_execute_state):
+    """Bulk UPDATE/DELETE of offers and steps skip after_flush: refuse them, or refill the rollups after them"""
+    state = orm_execute_state
+    if not (state.is_update or state.is_delete):
+        return None
+    if state.bind_mapper is inspect(models.Offer):
+        table, rollup_models = "offers", ()
+    elif state.bind_mapper is inspect(models.WorkflowStep):
+        if state.is_update and not _set_attributes(state) & set(STEP_ATTRIBUTES):
+            return None  # e.g. the SLA watchdog's bottleneck_flag: no counter moves
+        table, rollup_models = "workflow_steps", (models.DepartmentStepCounter,)
+    else:
+        return None
+    if not state.execution_options.get("refill_rollups"):
+        raise exc.InvalidRequestError(
+            f"Bulk UPDATE/DELETE on {table} bypasses the rollups: write through the ORM, "
+            "or pass execution_options(refill_rollups=True)"
+        )
+    result = state.invoke_statement()
+    if not rollup_models:
+        fill_mail_calendar(state.session)
+    refill(state.session, *rollup_models)
+    return result
+
+
+def _mail_calendar_columns(from_mail_date: bool):
+    """mail year and month of an offer: the stored columns, or derived from mail_date"""
+    offer = models.Offer
+    if from_mail_date:  # databases older than migration 4, which adds the stored columns
+        return extract("year", offer.mail_date), extract("month", offer.mail_date)
+    return offer.mail_year, offer.mail_month
+
+
+def counters_query(from_mail_date: bool = False):
+    """Counters recomputed from offers (same buckets and NULL handling as the hook)"""
+    offer = models.Offer
+    mail_year, mail_month = _mail_calendar_columns(from_mail_date)
+    columns = (
+        func.coalesce(offer.year_stats, 0),
+        func.coalesce(mail_year, 0),
+        func.coalesce(mail_month, 0),
+        func.upper(func.coalesce(offer.status, literal(""))),
+        func.coalesce(offer.client_id, 0),
+        func.coalesce(offer.managed_by_id, 0),
+    )
+    return select(
+        *[c.label(k) for c, k in zip(columns, KEY_COLUMNS)],
+        func.count(offer.id).label("offer_count"),
+        func.coalesce(func.sum(offer.offer_amount), 0.0).label("offer_value"),
+    ).group_by(*columns)
+
+
+def facts_query(from_mail_date: bool = False):
+    """Facts recomputed from offers and clients (same keys and NULL handling as the hook)"""
+    offer, client = models.Offer, models.Client
+    mail_year, mail_month = _mail_calendar_columns(from_mail_date)
+    columns = (
+        func.coalesce(offer.year_stats, 0),
+        func.coalesce(mail_year, 0),
+        func.coalesce(mail_month, 0),
+        func.coalesce(offer.client_id, 0),
+        func.coalesce(client.sector, literal("")),
+        func.coalesce(offer.status, literal("")),
+        func.coalesce(offer.is_new_item, false()),
+        func.coalesce(offer.managed_by_id, 0),
+    )
+    return select(
+        *[c.label(k) for c, k in zip(columns, FACT_COLUMNS)],
+        func.count(offer.id).label("offer_count"),
+        func.coalesce(func.sum(offer.offer_amount), 0.0).label("offer_value"),
+        func.count(offer.offer_amount).label("valued_count"),
+    ).select_from(offer).outerjoin(client, client.id == offer.client_id).group_by(*columns)
+
+
+def department_steps_query(from_mail_date: bool = False):
+    """Step counters recomputed from workflow steps and their offers (same keys and NULL handling as the hook)"""
+    step, offer = models.WorkflowStep, models.Offer
+    columns = (
+        func.coalesce(offer.year_stats, 0),
+        func.coalesce(step.department, literal("")),
+        case((step.status.in_(OPEN_STEP_STATUSES), True), else_=False),
+    )
+    return select(
+        *[c.label(k) for c, k in zip(columns, STEP_COLUMNS)],
+        func.count(step.id).label("step_count"),
+    ).select_from(step).join(offer, offer.id == step.offer_id).group_by(*columns)
+
+
+# model -> (key columns, measure columns, query recomputing it from the offers)
+ROLLUPS = {
+    models.OfferCounter: (KEY_COLUMNS, ("offer_count", "offer_value"), counters_query),
+    models.OfferMonthlyFact: (FACT_COLUMNS, ("offer_count", "offer_value", "valued_count"), facts_query),
+    models.DepartmentStepCounter: (STEP_COLUMNS, ("step_count",), department_steps_query),
+}
+
+
+def find_drift(db: Session) -> List[Tuple[str, Tuple, Tuple, Tuple]]:
+    """Buckets whose stored measures differ from the offers: (table, key, stored, expected)"""
+    drift = []
+    for model, (keys, measures, query) in ROLLUPS.items():
+        def as_map(rows):
+            return {
+                tuple(int(v) if isinstance(v, float) else v for v in r[:len(keys)]):
+                tuple(round(float(v), 2) for v in r[len(keys):])
+                for r in rows
+            }
+
+        table = model.__table__
+        stored = as_map(db.execute(select(*[table.c[k] for k in keys + measures])))
+        expected = as_map(db.execute(query()))
+        zero = (0.0,) * len(measures)
+        for key in stored.keys() | expected.keys():
+            have, want = stored.get(key, zero), expected.get(key, zero)
+            if any(abs(h - w) > 0.005 for h, w in zip(have, want)):
+                drift.append((table.name, key, have, want))
+    return drift
+
+
+def fill_mail_calendar(bind) -> int:
+    """Derive the missing mail_year/mail_month/mail_week of offers written around the ORM; return the count"""
+    offers = models.Offer.__table__
+    rows = bind.execute(select(offers.c.id, offers.c.mail_date).where(
+        offers.c.mail_date.is_not(None), offers.c.mail_year.is_(None)
+    )).all()
+    if rows:
+        bind.execute(
+            offers.update().where(offers.c.id == bindparam("offer_id")).values(
+                mail_year=bindparam("m_year"), mail_month=bindparam("m_month"), mail_week=bindparam("m_week"),
+                updated_at=offers.c.updated_at),  # derived columns: not an edit, keep Offer.updated_at's onupdate out
+            [dict(zip(("m_year", "m_month", "m_week"), models.mail_calendar(mail_date)), offer_id=offer_id)
+             for offer_id, mail_date in rows],
+        )
+    return len(rows)
+
+
+def _has_mail_calendar(bind) -> bool:
+    connection = bind.connection() if isinstance(bind, Session) else bind
+    columns = {column["name"] for column in inspect(connection).get_columns(models.Offer.__tablename__)}
+    return {"mail_year", "mail_month"} <= columns
+
+
+def refill(bind, *rollup_models, from_mail_date: bool = False):
+    """Replace the rollups (all by default) with the ones recomputed from offers (Session or Connection).
+
+    from_mail_date derives the mail year/month from mail_date instead of the
+    stored columns: migrations 2 and 3 use it, since they run before
+    migration 4 adds the columns.
+    """
+    if not from_mail_date and not _has_mail_calendar(bind):
+        raise RuntimeError("offers has no mail_year/mail_month columns: run python -m backend.migrations first")
+    for model in rollup_models or ROLLUPS:
+        keys, measures, query = ROLLUPS[model]
+        bind.execute(delete(model))
+        bind.execute(insert(model).from_select(list(keys + measures), query(from_mail_date)))
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup from the offers (reconciles any drift); return the bucket count"""
+    fill_mail_calendar(db)
+    refill(db)
+    db.commit()
+    return sum(db.query(func.count()).select_from(model).scalar() for model in ROLLUPS)
+
+
+def dashboard_buckets(db: Session, year: int = None):
+    """(year_stats, mail_year, month, status, count, value) rows, as the aggregate in crud"""
+    c = models.OfferCounter
+    query = db.query(c.year_stats, c.mail_year, c.mail_month, c.status,
+                     func.sum(c.offer_count), func.sum(c.offer_value))
+    if year:
+        query = query.filter(c.year_stats == year)
+    rows = query.group_by(c.year_stats, c.mail_year, c.mail_month, c.status).having(func.sum(c.offer_count) != 0)
+    return [(y or None, my, m or None, s, n, v) for y, my, m, s, n, v in rows]
+
+
+def client_buckets(db: Session, year: int = None):
+    """(client_id, count, value) rows"""
+    c = models.OfferCounter
+    query = db.query(c.client_id, func.sum(c.offer_count), func.sum(c.offer_value))
+    if year:
+        query = query.filter(c.year_stats == year)
+    rows = query.group_by(c.client_id).having(func.sum(c.offer_count) != 0)
+    return [(client_id or None, n, v) for client_id, n, v in rows]
+
+
+def department_buckets(db: Session, year: int = None):
+    """(department, total steps, open steps) rows, as the steps x offers aggregate in crud"""
+    c = models.DepartmentStepCounter
+    query = db.query(c.department, func.sum(c.step_count),
+                     func.sum(case((c.is_open, c.step_count), else_=0)))
+    if year:
+        query = query.filter(c.year_stats == year)
+    rows = query.group_by(c.department).having(func.sum(c.step_count) != 0)
+    return [(department or None, n, open_count) for department, n, open_count in rows]
+
+
+if __name__ == "__main__":
+    from backend.database import SessionLocal
+    db = SessionLocal()
+    try:
+        drift = find_drift(db)
+        print(f"{len(drift)} bucket(s) out of date")
+        for table, key, have, want in drift[:20]:
+            keys, measures, _ = ROLLUPS[next(m for m in ROLLUPS if m.__tablename__ == table)]
+            print(f"  {table} {dict(zip(keys, key))}: stored {dict(zip(measures, have))}, "
+                  f"expected {dict(zip(measures, want))}")
+        if "--check" not in sys.argv[1:]:
+            print(f"Rebuilt {rebuild(db)} bucket(s)")
+    finally:
+        db.close()
@@ -176,6 +176,33 @@ class Offer(OfferBase):
         from_attributes = True
 
 
+class OfferPage(BaseModel):
+    offers: List[Offer]
+    next_cursor: Optional[str] = None
+
+
+class OfferSummary(BaseModel):
+    """Offer grid row; every field is optional because `fields=` may drop any of them"""
+    id: Optional[int] = None
+    offer_number: Optional[str] = None
+    status: Optional[str] = None
+    priority: Optional[str] = None
+    mail_date: Optional[datetime] = None
+    year_stats: Optional[int] = None
+    client_id: Optional[int] = None
+    client_name: Optional[str] = None
+    item_name: Optional[str] = None
+    email_subject: Optional[str] = None
+    offer_amount: Optional[float] = None
+    managed_by_name: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+
+class OfferSummaryPage(BaseModel):
+    offers: List[OfferSummary]
+    next_cursor: Optional[str] = None
+
+
 # ============= Workflow Schemas =============
 
 class WorkflowStepBase(BaseModel):
@@ -413,6 +440,12 @@ class WorkflowTimingStats(BaseModel):
     max_duration_hours: float
     bottleneck_count: int
     total_steps: int
+    p50_duration_hours: float = 0.0
+    p90_duration_hours: float = 0.0
+    p99_duration_hours: float = 0.0
+    histogram: List[dict] = []  # {from_hours, to_hours (None = open-ended), count}
+    avg_business_hours: float = 0.0  # started_at -> completed_at on the working calendar
+    p90_business_hours: float = 0.0
 
 
 class BottleneckAlert(BaseModel):
@@ -423,6 +456,7 @@ class BottleneckAlert(BaseModel):
     duration_hours: float
     threshold_hours: float
     assigned_user: Optional[str] = None
+    business_hours: Optional[float] = None  # working-calendar hours since started_at
 
 
 # ============= Seasonal Trends Schemas =============
@@ -0,0 +1,97 @@
+"""
+SLA watchdog: keeps WorkflowStep.bottleneck_flag up to date in the background.
+
+Every SLA_CHECK_SECONDS the app runs tick(): an in-progress step started
+more than SLA_THRESHOLD_HOURS ago gets the flag, an in-progress step back
+under the threshold (e.g. started_at moved) loses it. Hours are wall-clock
+hours, or business hours of backend.business_calendar with SLA_CLOCK=business. Each pass is one
+UPDATE ... RETURNING whose WHERE only matches steps whose flag must change,
+read through ix_workflow_steps_status_started_at (status, started_at): the
+cost follows the in-progress steps, not the size of workflow_steps, and a
+tick that changes nothing writes nothing (no data version bump). Flags of
+steps that are no longer in progress are history and left alone.
+
+Every change is pushed to the WebSocket clients (type "sla_bottleneck").
+SLA_CHECK_SECONDS=0 disables the watchdog.
+"""
+import asyncio
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, List, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from backend import business_calendar, models
+
+SLA_THRESHOLD_HOURS = float(os.getenv("SLA_THRESHOLD_HOURS", "48"))
+SLA_CHECK_SECONDS = float(os.getenv("SLA_CHECK_SECONDS", "60"))
+SLA_CLOCK = os.getenv("SLA_CLOCK", "wall")  # "wall" or "business"
+
+
+def _flag(db: Session, condition, flagged: bool, now: datetime) -> List[int]:
+    """Set bottleneck_flag on the in-progress steps matching condition whose flag differs; return their ids"""
+    step = models.WorkflowStep
+    stmt = update(step).where(
+        step.status == models.WorkflowStepStatus.IN_PROGRESS.value,
+        condition,
+        func.coalesce(step.bottleneck_flag, False) != flagged,
+    ).values(bottleneck_flag=flagged, updated_at=now).returning(step.id)
+    return list(db.execute(stmt, execution_options={"synchronize_session": False}).scalars())
+
+
+def _notifications(db: Session, ids: List[int], flagged: bool, threshold_hours: float, clock: str) -> List[dict]:
+    step = models.WorkflowStep
+    rows = db.query(step.id, step.offer_id, step.department, models.Offer.offer_number).join(
+        models.Offer, models.Offer.id == step.offer_id
+    ).filter(step.id.in_(ids)).order_by(step.id).all()
+    unit = "ore lavorative" if clock == "business" else "ore"
+    return [{
+        "type": "sla_bottleneck",
+        "step_id": row.id,
+        "offer_id": row.offer_id,
+        "offer_number": row.offer_number,
+        "phase": row.department,
+        "bottleneck": flagged,
+        "message": (f"Offerta {row.offer_number}: fase {row.department} oltre {threshold_hours:g} {unit}"
+                    if flagged else f"Offerta {row.offer_number}: fase {row.department} rientrata nei tempi"),
+    } for row in rows]
+
+
+def tick(db: Session, now: Optional[datetime] = None, threshold_hours: float = SLA_THRESHOLD_HOURS,
+         clock: str = SLA_CLOCK) -> List[dict]:
+    """Set / clear the flags that changed and commit; return one notification per changed step"""
+    now = now or datetime.utcnow()
+    cutoff = business_calendar.sla_cutoff(db, now, threshold_hours, clock)
+    started_at = models.WorkflowStep.started_at
+    flagged = _flag(db, started_at < cutoff, True, now)
+    cleared = _flag(db, started_at >= cutoff, False, now)
+    if not flagged and not cleared:
+        db.rollback()  # nothing changed: no data version bump
+        return []
+    notifications = (_notifications(db, flagged, True, threshold_hours, clock)
+                     + _notifications(db, cleared, False, threshold_hours, clock))
+    db.commit()
+    return notifications
+
+
+async def run(session_factory: Callable[[], Session], broadcast: Callable[[dict], Awaitable[None]],
+              interval: float = SLA_CHECK_SECONDS, threshold_hours: float = SLA_THRESHOLD_HOURS,
+              clock: str = SLA_CLOCK):
+    """Run tick() every `interval` seconds (in a worker thread) and broadcast its notifications"""
+    def check():
+        db = session_factory()
+        try:
+            return tick(db, threshold_hours=threshold_hours, clock=clock)
+        finally:
+            db.close()
+
+    while True:
+        try:
+            for message in await asyncio.to_thread(check):
+                await broadcast(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"SLA watchdog: tick failed: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,131 @@
+"""
+Benchmark: the analytics on the SQL path against the columnar snapshot
+(backend.analytics_snapshot), result cache bypassed.
+
+Seeds a throw-away SQLite database (see benchmark_fast_json.seed) plus three
+workflow steps per offer, checks that both engines return the same data for
+the busiest year, then times each function on both, the snapshot's first
+load and its incremental refresh after one offer update.
+
+Usage: python benchmark_analytics_snapshot.py [n_offers ...]   (default: 10000 100000)
+"""
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+import backend.analytics_enrichment as analytics_enrichment
+from backend import analytics_snapshot, rollups
+from backend.analytics_snapshot import AnalyticsSnapshot
+from backend.database import create_sqlite_engine
+from benchmark_fast_json import seed
+
+REPEAT = 5
+DEPARTMENTS = ("tecnico", "acquisti", "produzione")
+
+
+def seed_steps(engine):
+    with engine.begin() as conn:
+        offer_ids = conn.execute(select(models.Offer.id)).scalars().all()
+        rows = [
+            {"offer_id": offer_id, "department": department, "order_index": n, "status": "completed",
+             "assigned_to_id": random.randint(1, 10), "actual_duration_minutes": random.uniform(10, 5000),
+             "bottleneck_flag": random.random() < 0.1}
+            for offer_id in offer_ids for n, department in enumerate(DEPARTMENTS)
+        ]
+        for i in range(0, len(rows), 10000):
+            conn.execute(insert(models.WorkflowStep), rows[i:i + 10000])
+
+
+def _same(a, b):
+    """Equal results, floats up to summation order"""
+    if hasattr(a, "model_dump"):
+        return _same(a.model_dump(), b.model_dump())
+    if isinstance(a, dict):
+        return isinstance(b, dict) and list(a) == list(b) and all(_same(a[k], b[k]) for k in a)
+    if isinstance(a, list):
+        return isinstance(b, list) and len(a) == len(b) and all(_same(x, y) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-6)
+    return a == b
+
+
+def timed(fn):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - t0) / REPEAT
+
+
+def run(n_offers):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, n_offers)
+    seed_steps(engine)
+    db = sessionmaker(bind=engine)()
+    rollups.rebuild(db)
+    year = db.query(models.Offer.year_stats).group_by(models.Offer.year_stats).order_by(
+        func.count(models.Offer.id).desc()).limit(1).scalar()  # busiest year
+    functions = {
+        "monthly evolution": lambda: analytics_crud.get_monthly_evolution.uncached(db, year),
+        "reasons": lambda: analytics_crud.get_reasons_stats.uncached(db, year),
+        "client ranking": lambda: analytics_crud.get_client_ranking.uncached(db, year),
+        "sector distribution": lambda: analytics_crud.get_sector_distribution.uncached(db, year),
+        "new vs reorder": lambda: analytics_crud.get_new_vs_reorder_stats.uncached(db, year),
+        "seasonal trends": lambda: analytics_enrichment.calculate_seasonal_trends.uncached(db, year),
+        "workflow timing": lambda: analytics_enrichment.calculate_workflow_timing_stats.uncached(db, year),
+    }
+
+    analytics_snapshot.snapshot = AnalyticsSnapshot()
+    t0 = time.perf_counter()
+    analytics_snapshot.snapshot.refresh(db)
+    load = time.perf_counter() - t0
+
+    print(f"\n{n_offers:,} offers, {n_offers * len(DEPARTMENTS):,} steps, year {year}")
+    print(f"  {'':<22} {'SQL':>9} {'snapshot':>9}")
+    totals = [0.0, 0.0]
+    for label, fn in functions.items():
+        analytics_snapshot.ANALYTICS_ENGINE = "sql"
+        sql, sql_result = timed(fn), fn()
+        analytics_snapshot.ANALYTICS_ENGINE = "snapshot"
+        columnar, columnar_result = timed(fn), fn()
+        same = _same(sql_result, columnar_result)
+        totals[0] += sql
+        totals[1] += columnar
+        print(f"  {label:<22} {sql * 1e3:6.1f} ms {columnar * 1e3:6.1f} ms{'' if same else '   (results differ)'}")
+    print(f"  {'all':<22} {totals[0] * 1e3:6.1f} ms {totals[1] * 1e3:6.1f} ms")
+
+    offer = db.query(models.Offer).filter(models.Offer.year_stats == year).first()
+    offer.status = models.OfferStatus.ACCETTATA
+    db.commit()
+    t0 = time.perf_counter()
+    analytics_snapshot.snapshot.refresh(db)
+    refresh = time.perf_counter() - t0
+    stats = analytics_snapshot.snapshot.stats()
+    size = (stats["offers"]["bytes"] + stats["workflow_steps"]["bytes"]) / 1e6
+    print(f"  snapshot: first load {load * 1e3:.0f} ms, refresh after one update {refresh * 1e3:.1f} ms, {size:.1f} MB")
+
+    db.close()
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    for n in sizes:
+        run(n)
@@ -0,0 +1,74 @@
+"""
+Benchmark: the year-based analytics of the analytics page, result cache bypassed.
+
+Seeds a throw-away SQLite database (see benchmark_fast_json.seed) and times
+monthly evolution, seasonal trends, sector distribution and new-vs-reorder
+for the busiest year, and the comparison of every year (at most 10).
+The seed spreads offers uniformly over 500 clients and 10 managers, so
+nearly every offer gets its own facts row: a worst case for the rollup.
+
+Usage: python benchmark_analytics_year.py [n_offers ...]   (default: 10000 100000)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+import backend.analytics_enrichment as analytics_enrichment
+from backend import rollups
+from backend.database import create_sqlite_engine
+from benchmark_fast_json import seed
+
+REPEAT = 5
+
+
+def run(n_offers):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, n_offers)  # bulk Core inserts: rollups filled afterwards
+    db = sessionmaker(bind=engine)()
+    rollups.rebuild(db)
+    year = db.query(models.Offer.year_stats).group_by(models.Offer.year_stats).order_by(
+        func.count(models.Offer.id).desc()).limit(1).scalar()  # busiest year
+    years = [y for (y,) in db.query(models.Offer.year_stats).distinct().order_by(models.Offer.year_stats)][-10:]
+    functions = {
+        "monthly evolution": lambda: analytics_crud.get_monthly_evolution.uncached(db, year),
+        f"comparison ({len(years)} years)": lambda: analytics_crud.get_comparison_data.uncached(db, years),
+        "seasonal trends": lambda: analytics_enrichment.calculate_seasonal_trends.uncached(db, year),
+        "sector distribution": lambda: analytics_crud.get_sector_distribution.uncached(db, year),
+        "new vs reorder": lambda: analytics_crud.get_new_vs_reorder_stats.uncached(db, year),
+    }
+    n_facts = db.query(func.count()).select_from(models.OfferMonthlyFact).scalar()
+    print(f"\n{n_offers:,} offers ({n_facts:,} offer_monthly_facts rows), year {year}")
+    total = 0.0
+    for label, fn in functions.items():
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(REPEAT):
+            fn()
+        seconds = (time.perf_counter() - t0) / REPEAT
+        total += seconds
+        print(f"  {label:<22} {seconds * 1e3:8.2f} ms")
+    print(f"  {'all five':<22} {total * 1e3:8.2f} ms")
+
+    db.close()
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    for n in sizes:
+        run(n)
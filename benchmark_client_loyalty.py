@@ -0,0 +1,132 @@
+"""
+Benchmark: analytics_enrichment.calculate_client_loyalty (one grouped query
+joined to clients, result cache bypassed) against the previous version,
+one offers query per client, reproduced below.
+
+Seeds a throw-away SQLite database with n clients (a third without offers in
+the year, like the clients auto-created by the email importer) and ten
+offers per client spread over ten years, checks that both versions return
+the same data for the busiest year and times them, with and without a top 50.
+
+Usage: python benchmark_client_loyalty.py [n_clients ...]   (default: 10000)
+"""
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import sessionmaker
+
+import backend.models as models
+import backend.analytics_enrichment as analytics_enrichment
+from backend.database import create_sqlite_engine
+
+REPEAT = 5
+OFFERS_PER_CLIENT = 10
+
+
+def seed(engine, n_clients):
+    models.Base.metadata.create_all(bind=engine)
+    start = datetime(2016, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Client), [
+            {"id": i, "name": f"Cliente {i}", "email_domain": f"cliente{i}.com", "strategic": False,
+             "loyalty_score": round(random.uniform(0, 10), 1), "created_at": start}
+            for i in range(1, n_clients + 1)
+        ])
+        rows = []
+        for i in range(n_clients * OFFERS_PER_CLIENT):
+            mail_date = start + timedelta(days=random.randint(0, 3650))
+            rows.append({
+                "offer_number": f"L{i:07d}", "mail_date": mail_date, "year_stats": mail_date.year,
+                "client_id": random.randint(1, n_clients), "status": "accettata", "priority": "media",
+                "is_new_item": random.random() < 0.4,
+                "order_date": mail_date + timedelta(days=30) if random.random() < 0.5 else None,
+                "created_at": mail_date, "updated_at": mail_date,
+            })
+            if len(rows) == 10000:
+                conn.execute(insert(models.Offer), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Offer), rows)
+
+
+def legacy_client_loyalty(db, year):
+    """The per-client version this benchmark compares against"""
+    loyalty_data = []
+    for client in db.query(models.Client).all():
+        offers = db.query(models.Offer).filter(
+            models.Offer.client_id == client.id,
+            models.Offer.year_stats == year
+        ).all()
+        if not offers:
+            continue
+        new_items = sum(1 for o in offers if o.is_new_item)
+        reorders = len(offers) - new_items
+        total = len(offers)
+        loyalty_data.append({
+            'client_id': client.id,
+            'client_name': client.name,
+            'loyalty_score': client.loyalty_score,
+            'new_items_count': new_items,
+            'reorder_count': reorders,
+            'total_offers': total,
+            'reorder_percentage': (reorders / total * 100) if total > 0 else 0,
+            'last_order_date': max((o.order_date for o in offers if o.order_date), default=None),
+        })
+    loyalty_data.sort(key=lambda x: x['loyalty_score'], reverse=True)
+    return loyalty_data
+
+
+def _same(a, b):
+    return a.keys() == b.keys() and all(
+        math.isclose(a[k], b[k], rel_tol=1e-9) if isinstance(a[k], float) else a[k] == b[k] for k in a)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - t0) / REPEAT
+
+
+def run(n_clients):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, n_clients)
+    db = sessionmaker(bind=engine)()
+    year = db.query(models.Offer.year_stats).group_by(models.Offer.year_stats).order_by(
+        func.count(models.Offer.id).desc()).limit(1).scalar()  # busiest year
+
+    new = analytics_enrichment.calculate_client_loyalty.uncached(db, year)
+    old = legacy_client_loyalty(db, year)
+    assert len(new) == len(old) and all(_same(a, b) for a, b in zip(new, old))
+
+    print(f"\n{n_clients:,} clients, {n_clients * OFFERS_PER_CLIENT:,} offers, year {year} ({len(new):,} clients with offers)")
+    legacy = timed(lambda: (legacy_client_loyalty(db, year), db.expunge_all()))
+    grouped = timed(lambda: analytics_enrichment.calculate_client_loyalty.uncached(db, year))
+    top = timed(lambda: analytics_enrichment.calculate_client_loyalty.uncached(db, year, 50))
+    print(f"  one query per client   {legacy * 1e3:8.1f} ms")
+    print(f"  one grouped query      {grouped * 1e3:8.1f} ms   ({legacy / grouped:.0f}x)")
+    print(f"  grouped, top 50        {top * 1e3:8.1f} ms")
+
+    db.close()
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10000]
+    for n in sizes:
+        run(n)
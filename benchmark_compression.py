@@ -0,0 +1,87 @@
+"""
+Benchmark: response compression on the offer list and /analytics/comparison.
+
+Seeds a throw-away SQLite database (see benchmark_fast_json.seed) and fetches
+each endpoint with Accept-Encoding identity / gzip / br. Reports the bytes on
+the wire, the server CPU time per request, and the transfer time estimated at
+the given LAN bandwidth.
+
+Usage: python benchmark_compression.py [n_offers] [mbit_per_s]   (default: 10000 100)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+
+import backend.auth as auth
+from backend.compression import brotli
+from backend.database import create_sqlite_engine
+from backend.main import app
+from benchmark_fast_json import seed
+
+N_OFFERS = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+MBIT_PER_S = float(sys.argv[2]) if len(sys.argv) > 2 else 100.0
+REPEAT = 5
+URLS = [
+    "/offers/?limit=1000",
+    "/offers/?limit=1000&fast=true",
+    "/offers/summary?limit=1000",
+    "/analytics/comparison?years=2016,2017,2018,2019,2020,2021,2022,2023,2024,2025",
+]
+ENCODINGS = ["identity", "gzip"] + (["br"] if brotli is not None else [])
+
+
+def measure(client, url, encoding):
+    """Return (wire bytes, server cpu seconds) averaged over REPEAT requests"""
+    wire, cpu = 0, 0.0
+    for _ in range(REPEAT):
+        t0 = time.process_time()  # TestClient runs the app in-process
+        response = client.get(url, headers={"Accept-Encoding": encoding})
+        cpu += time.process_time() - t0
+        assert response.status_code == 200, response.text
+        assert response.headers.get("content-encoding", "identity") == encoding
+        wire = int(response.headers["content-length"])
+    return wire, cpu / REPEAT
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, N_OFFERS)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[auth.get_db] = get_db
+    client = TestClient(app)
+    bytes_per_s = MBIT_PER_S * 1e6 / 8
+    print(f"{N_OFFERS:,} offers, LAN {MBIT_PER_S:g} Mbit/s, {REPEAT} requests each")
+    for url in URLS:
+        print(f"\n{url}")
+        for encoding in ENCODINGS:
+            wire, cpu = measure(client, url, encoding)
+            print(f"  {encoding:<8} {wire / 1e3:9.1f} kB  cpu {cpu * 1e3:7.1f} ms"
+                  f"  transfer {wire / bytes_per_s * 1e3:7.1f} ms")
+
+    app.dependency_overrides.pop(auth.get_db, None)
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
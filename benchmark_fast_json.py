@@ -0,0 +1,120 @@
+"""
+Benchmark: validated (response_model) vs fast JSON path on the offer list endpoints.
+
+Seeds a throw-away SQLite database with N synthetic offers and walks the whole
+register page by page (limit=1000) through each path.
+
+Usage: python benchmark_fast_json.py [n_offers ...]   (default: 10000 100000)
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+
+import backend.models as models
+import backend.auth as auth
+from backend.database import create_sqlite_engine
+from backend.main import app
+
+PAGE_SIZE = 1000
+STATUSES = [s.value for s in models.OfferStatus]
+
+
+def seed(engine, n_offers):
+    models.Base.metadata.create_all(bind=engine)
+    start = datetime(2016, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "username": f"user{i}", "email": f"user{i}@benozzi.com", "password_hash": "x",
+             "role": "commerciale", "active": True, "created_at": start}
+            for i in range(1, 11)
+        ])
+        conn.execute(insert(models.Client), [
+            {"id": i, "name": f"Cliente {i}", "email_domain": f"cliente{i}.com", "sector": f"Settore {i % 12}",
+             "strategic": False, "created_at": start}
+            for i in range(1, 501)
+        ])
+        rows = []
+        for i in range(n_offers):
+            mail_date = start + timedelta(minutes=i * 47)
+            rows.append({
+                "offer_number": f"B{i:07d}", "mail_date": mail_date, "client_id": random.randint(1, 500),
+                "status": random.choice(STATUSES), "priority": "media", "is_new_item": i % 3 != 0,
+                "check_feasibility": "Da esaminare", "check_technical": "Da esaminare",
+                "check_purchasing": "Da esaminare", "check_planning": "Da esaminare",
+                "item_name": f"Articolo {i}", "email_subject": f"Richiesta offerta articolo {i}",
+                "managed_by_id": random.randint(1, 10), "purchasing_manager_id": random.randint(1, 10),
+                "offer_amount": round(random.uniform(100, 50000), 2), "order_amount": 0.0,
+                "year_stats": mail_date.year, "created_at": mail_date, "updated_at": mail_date,
+                **dict(zip(("mail_year", "mail_month", "mail_week"), models.mail_calendar(mail_date))),
+            })
+            if len(rows) == 10000:
+                conn.execute(insert(models.Offer), rows)
+                rows = []
+        if rows:
+            conn.execute(insert(models.Offer), rows)
+
+
+def walk(client, url, fast):
+    """Fetch every page of url; return (seconds, bytes, rows)"""
+    cursor, total_bytes, total_rows = None, 0, 0
+    t0 = time.perf_counter()
+    while True:
+        params = {"limit": PAGE_SIZE, "fast": fast}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get(url, params=params)
+        assert response.status_code == 200, response.text
+        total_bytes += len(response.content)
+        data = response.json()
+        total_rows += len(data["offers"])
+        cursor = data["next_cursor"]
+        if not cursor:
+            break
+    return time.perf_counter() - t0, total_bytes, total_rows
+
+
+def run(n_offers):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, n_offers)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[auth.get_db] = get_db
+    client = TestClient(app)
+    print(f"\n{n_offers:,} offers (pages of {PAGE_SIZE})")
+    for url in ("/offers/", "/offers/summary"):
+        for fast in (False, True):
+            seconds, size, rows = walk(client, url, fast)
+            label = f"{url:<16} {'fast' if fast else 'validated':<9}"
+            print(f"  {label}  {seconds:7.2f}s  {rows / seconds:9.0f} rows/s  {size / 1e6:8.1f} MB")
+
+    app.dependency_overrides.pop(auth.get_db, None)
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    for n in sizes:
+        run(n)
@@ -0,0 +1,94 @@
+"""
+Benchmark: analytics_crud.get_monthly_evolution (one conditional-aggregation
+query, result cache bypassed) against the previous four GROUP BY queries,
+reproduced below.
+
+Seeds a throw-away SQLite database (see benchmark_fast_json.seed), checks that
+both versions return the same data for every year and times them.
+
+Usage: python benchmark_monthly_evolution.py [n_offers]   (default: 100000)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy import extract, func
+from sqlalchemy.orm import sessionmaker
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+from backend import rollups
+from backend.database import create_sqlite_engine
+from benchmark_fast_json import seed
+
+N_OFFERS = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEAT = 5
+
+
+def legacy_monthly_evolution(db, year):
+    """The four-scan version this benchmark compares against"""
+    month = extract('month', models.Offer.mail_date)
+    base = models.Offer.year_stats == year
+    queries = {
+        "requests": db.query(month, func.count(models.Offer.id), func.sum(0)).filter(base),
+        "proposed": db.query(month, func.count(models.Offer.id), func.sum(0)).filter(
+            base, models.Offer.status != models.OfferStatus.PENDING_REGISTRATION),
+        "accepted": db.query(month, func.count(models.Offer.id), func.sum(models.Offer.offer_amount)).filter(
+            base, models.Offer.status == models.OfferStatus.ACCETTATA),
+        "declined": db.query(month, func.count(models.Offer.id), func.sum(0)).filter(
+            base, models.Offer.status.in_(analytics_crud.DECLINED_STATUSES)),
+    }
+    result = {m: {"requests": 0, "proposed": 0, "accepted": 0, "declined": 0, "order_value": 0.0} for m in range(1, 13)}
+    for metric, query in queries.items():
+        for m, count, value in query.group_by(month).all():
+            if m:
+                result[int(m)][metric] = count
+                if metric == "accepted":
+                    result[int(m)]["order_value"] = float(value or 0)
+    return result
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    for _ in range(REPEAT):
+        fn()
+    return (time.perf_counter() - t0) / REPEAT
+
+
+def main():
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, N_OFFERS)
+    db = sessionmaker(bind=engine)()
+    rollups.rebuild(db)
+    years = [y for (y,) in db.query(models.Offer.year_stats).distinct().order_by(models.Offer.year_stats)]
+
+    for year in years:
+        new = analytics_crud.get_monthly_evolution.uncached(db, year)
+        old = legacy_monthly_evolution(db, year)
+        for i, e in enumerate(new, start=1):
+            got = {k: getattr(e, k) for k in old[i]}
+            assert got.keys() == old[i].keys() and all(
+                abs(got[k] - old[i][k]) < 1e-6 for k in got), (year, i, got, old[i])
+
+    print(f"{N_OFFERS:,} offers, {len(years)} years, mean of {REPEAT} runs per year")
+    legacy = sum(timed(lambda: legacy_monthly_evolution(db, y)) for y in years) / len(years)
+    single = sum(timed(lambda: analytics_crud.get_monthly_evolution.uncached(db, y)) for y in years) / len(years)
+    print(f"  four GROUP BY queries   {legacy * 1e3:8.1f} ms/year")
+    print(f"  one conditional query   {single * 1e3:8.1f} ms/year   ({legacy / single:.1f}x)")
+
+    db.close()
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
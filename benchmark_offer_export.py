@@ -0,0 +1,75 @@
+"""
+Benchmark: peak Python memory of the streamed /offers/export vs building the
+whole register in one list (what `/offers/?limit=N` amounts to).
+
+Seeds a throw-away SQLite database (see benchmark_fast_json.seed) and drives
+the same crud/encoder code the endpoint uses, discarding the chunks as a
+socket would. The streamed peak should not grow with the register size.
+
+Usage: python benchmark_offer_export.py [n_offers ...]   (default: 10000 100000)
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy.orm import sessionmaker
+
+import backend.crud as crud
+from backend.database import create_sqlite_engine
+from backend.responses import csv_chunks, dumps, ndjson_chunks
+from benchmark_fast_json import seed
+
+
+def measure(fn):
+    """Return (seconds, peak MB, bytes produced)"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    size = fn()
+    seconds = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak / 1e6, size
+
+
+def run(n_offers):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    engine = create_sqlite_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+    seed(engine, n_offers)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    columns = [c.name for c in crud.offer_export_statement().selected_columns]
+
+    def in_memory():
+        with Session() as db:
+            return len(dumps(crud.get_offer_rows_page(db, limit=n_offers)))
+
+    def streamed(encoder):
+        def fn():
+            with Session() as db:
+                rows = crud.iter_offer_export_rows(db)
+                chunks = csv_chunks(columns, rows) if encoder == "csv" else ndjson_chunks(rows)
+                return sum(len(chunk) for chunk in chunks)
+        return fn
+
+    print(f"\n{n_offers:,} offers")
+    for label, fn in (("whole list (JSON)", in_memory), ("stream NDJSON", streamed("ndjson")),
+                      ("stream CSV", streamed("csv"))):
+        seconds, peak, size = measure(fn)
+        print(f"  {label:<18} {seconds:6.2f}s  peak {peak:7.1f} MB  output {size / 1e6:7.1f} MB")
+
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    sizes = [int(n) for n in sys.argv[1:]] or [10000, 100000]
+    for n in sizes:
+        run(n)
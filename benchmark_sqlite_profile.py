@@ -0,0 +1,128 @@
+"""
+Benchmark: concurrent read throughput on GET /offers/ while an import is writing.
+
+Compares the plain SQLite engine (rollback journal, no PRAGMAs) with the
+production connection profile from backend/database.py (WAL, busy timeout...).
+Each run works on a throw-away copy of backend/sql_app.db.
+
+Usage: python benchmark_sqlite_profile.py [seconds] [readers]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+# Add project root to sys.path
+current_dir = Path(__file__).resolve().parent
+if str(current_dir) not in sys.path:
+    sys.path.insert(0, str(current_dir))
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from fastapi.testclient import TestClient
+
+import backend.models as models
+import backend.auth as auth
+from backend import migrations
+from backend.database import DB_PATH, create_sqlite_engine
+from backend.main import app
+
+DURATION = float(sys.argv[1]) if len(sys.argv) > 1 else 10.0
+READERS = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+BATCH_SIZE = 100  # ExcelImporter commits every 100 offers
+
+
+def writer(Session, stop, result):
+    """Simulate an import: insert offers and commit every BATCH_SIZE rows"""
+    db = Session()
+    n = 0
+    try:
+        while not stop.is_set():
+            try:
+                for _ in range(BATCH_SIZE):
+                    n += 1
+                    db.add(models.Offer(
+                        offer_number=f"BENCH-{threading.get_ident()}-{n}",
+                        mail_date=datetime.utcnow(),
+                        status="PENDING_REGISTRATION",
+                        item_name="benchmark row",
+                        year_stats=datetime.utcnow().year,
+                    ))
+                db.commit()
+                result["rows"] += BATCH_SIZE
+            except OperationalError:
+                db.rollback()
+                result["errors"] += 1
+    finally:
+        db.close()
+
+
+def reader(client, stop, result):
+    """Hit the offer list endpoint in a loop"""
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            response = client.get("/offers/?limit=200")
+            ok = response.status_code == 200
+        except OperationalError:
+            ok = False
+        elapsed = time.perf_counter() - t0
+        with result["lock"]:
+            if ok:
+                result["latencies"].append(elapsed)
+            else:
+                result["errors"] += 1
+
+
+def run(label, tuned):
+    tmp_dir = tempfile.mkdtemp(prefix="m54_bench_")
+    db_file = os.path.join(tmp_dir, "bench.db")
+    shutil.copy(DB_PATH, db_file)
+    engine = create_sqlite_engine(f"sqlite:///{db_file}", tuned=tuned)
+    models.Base.metadata.create_all(bind=engine)
+    migrations.run_migrations(engine)  # the copy may predate the schema the app expects
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = Session()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[auth.get_db] = get_db
+    client = TestClient(app, raise_server_exceptions=False)
+
+    stop = threading.Event()
+    write_result = {"rows": 0, "errors": 0}
+    read_result = {"latencies": [], "errors": 0, "lock": threading.Lock()}
+    threads = [threading.Thread(target=writer, args=(Session, stop, write_result))]
+    threads += [threading.Thread(target=reader, args=(client, stop, read_result)) for _ in range(READERS)]
+
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    app.dependency_overrides.pop(auth.get_db, None)
+    engine.dispose()
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    latencies = sorted(read_result["latencies"])
+    p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0
+    print(f"{label:<12} reads/s={len(latencies) / DURATION:8.1f}  p50={p50:7.1f}ms  p95={p95:7.1f}ms  "
+          f"read_errors={read_result['errors']:<4} rows_written={write_result['rows']:<7} "
+          f"write_errors={write_result['errors']}")
+
+
+if __name__ == "__main__":
+    print(f"{READERS} readers on /offers/?limit=200 + 1 importer, {DURATION:.0f}s per profile\n")
+    run("default", tuned=False)
+    run("production", tuned=True)
@@ -3,6 +3,8 @@ Calculate and update client loyalty scores from existing offer data
 """
 import sqlite3
 
+from backend import data_version
+
 conn = sqlite3.connect('backend/sql_app.db')
 cursor = conn.cursor()
 
@@ -58,6 +60,7 @@ for client_id, client_name in clients:
     if updated <= 5:  # Show first 5
         print(f"  {client_name}: {new_items} new, {reorders} reorders, loyalty: {loyalty_score:.1f}%")
 
+data_version.bump(conn, "clients")
 conn.commit()
 
 print(f"\n[OK] Updated {updated} clients with loyalty scores")
@@ -5,6 +5,8 @@ import sqlite3
 from datetime import datetime
 from collections import defaultdict
 
+from backend import data_version
+
 conn = sqlite3.connect('backend/sql_app.db')
 cursor = conn.cursor()
 
@@ -101,6 +103,7 @@ for user_id, periods in user_metrics.items():
         ))
         inserted += 1
 
+data_version.bump(conn, "user_performance_metrics")
 conn.commit()
 
 print(f"[OK] Inserted/Updated {inserted} performance metrics records")
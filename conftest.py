@@ -0,0 +1,64 @@
+"""
+Shared pytest setup for the regression tests (test_*.py run with pytest).
+
+Every test gets a fresh in-memory SQLite database: DATABASE_URL is set
+before any backend module is imported, so backend/sql_app.db is never
+opened. The in-process caches keyed on data versions (analytics results,
+working calendar) are emptied too, since versions restart with each
+database.
+"""
+import os
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import backend.auth as auth
+import backend.models as models
+from backend import analytics_cache, business_calendar
+
+_engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+_Session = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+
+
+@pytest.fixture
+def engine():
+    """The test engine, with an empty schema"""
+    models.Base.metadata.drop_all(bind=_engine)
+    models.Base.metadata.create_all(bind=_engine)
+    analytics_cache.cache.clear()
+    business_calendar._cache = (None, None)
+    return _engine
+
+
+@pytest.fixture
+def session_factory(engine):
+    return _Session
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def api(session_factory):
+    """TestClient on the app, reading the test database"""
+    from backend.main import app
+
+    def get_test_db():
+        session = session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[auth.get_db] = get_test_db
+    yield TestClient(app)
+    app.dependency_overrides.pop(auth.get_db, None)
@@ -20,6 +20,8 @@ const AnalyticsPage = () => {
     const [activeTab, setActiveTab] = useState('performance');
 
     const availableYears = [2024, 2025];
+    // compared years: previous and selected, as the server default of /analytics/bundle
+    const comparisonYears = [year - 1, year];
 
     const [comparisonData, setComparisonData] = useState({
         requests: [], declined: [], proposed: [], accepted: [], order_value: []
@@ -29,21 +31,14 @@ const AnalyticsPage = () => {
         const fetchData = async () => {
             setLoading(true);
             try {
-                const [monthlyRes, reasonsRes, comparisonRes, clientsRes, sectorRes, itemMixRes] = await Promise.allSettled([
-                    analyticsAPI.getMonthlyEvolution(year),
-                    analyticsAPI.getReasons(year),
-                    analyticsAPI.getComparison("2024,2025"),
-                    analyticsAPI.getClientRanking(year),
-                    analyticsAPI.getSectorDistribution(year),
-                    analyticsAPI.getItemMix(year)
-                ]);
+                const { data } = await analyticsAPI.getBundle(year, { years: comparisonYears.join(',') });
 
-                if (monthlyRes.status === 'fulfilled') setMonthlyData(monthlyRes.value.data || []);
-                if (reasonsRes.status === 'fulfilled') setReasonsData(reasonsRes.value.data || { declined_reasons: [], not_accepted_reasons: [] });
-                if (comparisonRes.status === 'fulfilled') setComparisonData(comparisonRes.value.data || { requests: [], declined: [], proposed: [], accepted: [], order_value: [] });
-                if (clientsRes.status === 'fulfilled') setClientRanking(clientsRes.value.data || []);
-                if (sectorRes.status === 'fulfilled') setSectorData(sectorRes.value.data || []);
-                if (itemMixRes.status === 'fulfilled') setItemMixData(itemMixRes.value.data || { new: { count: 0, value: 0 }, reorder: { count: 0, value: 0 } });
+                setMonthlyData(data.monthly_evolution || []);
+                setReasonsData(data.reasons || { declined_reasons: [], not_accepted_reasons: [] });
+                setComparisonData(data.comparison || { requests: [], declined: [], proposed: [], accepted: [], order_value: [] });
+                setClientRanking(data.client_ranking || []);
+                setSectorData(data.sector_distribution || []);
+                setItemMixData(data.item_mix || { new: { count: 0, value: 0 }, reorder: { count: 0, value: 0 } });
 
             } catch (error) {
                 console.error("Error fetching analytics:", error);
@@ -66,8 +61,8 @@ const AnalyticsPage = () => {
 
     const renderComparisonLines = () => (
         <>
-            <Line type="monotone" dataKey="2024" name="2024" stroke="#82ca9d" strokeWidth={3} dot={{ r: 4 }} />
-            <Line type="monotone" dataKey="2025" name="2025" stroke="#ffc658" strokeWidth={2} dot={{ r: 4 }} />
+            <Line type="monotone" dataKey={String(comparisonYears[0])} name={String(comparisonYears[0])} stroke="#82ca9d" strokeWidth={3} dot={{ r: 4 }} />
+            <Line type="monotone" dataKey={String(comparisonYears[1])} name={String(comparisonYears[1])} stroke="#ffc658" strokeWidth={2} dot={{ r: 4 }} />
         </>
     );
 
@@ -261,7 +256,7 @@ const AnalyticsPage = () => {
                 <div className="tab-content fade-in">
                     <div className="grid-2">
                         <div className="card chart-card">
-                            <h3>📊 Richieste Ricevute (2024 vs 2025)</h3>
+                            <h3>📊 Richieste Ricevute ({comparisonYears[0]} vs {comparisonYears[1]})</h3>
                             <div style={{ height: 300 }}>
                                 <ResponsiveContainer width="100%" height="100%">
                                     <LineChart data={comparisonData.requests} margin={{ top: 5, right: 30, left: 20, bottom: 5 }}>
@@ -277,7 +272,7 @@ const AnalyticsPage = () => {
                         </div>
 
                         <div className="card chart-card">
-                            <h3>💰 Valore Ordini (2024 vs 2025)</h3>
+                            <h3>💰 Valore Ordini ({comparisonYears[0]} vs {comparisonYears[1]})</h3>
                             <div style={{ height: 300 }}>
                                 <ResponsiveContainer width="100%" height="100%">
                                     <BarChart data={comparisonData.order_value} margin={{ top: 5, right: 30, left: 20, bottom: 5 }}>
@@ -286,8 +281,8 @@ const AnalyticsPage = () => {
                                         <YAxis tick={{ fill: '#aaa', fontSize: 12 }} tickFormatter={formatYAxis} />
                                         <Tooltip formatter={(val) => formatCurrency(val)} />
                                         <Legend />
-                                        <Bar dataKey="2024" name="2024" fill="#8884d8" />
-                                        <Bar dataKey="2025" name="2025" fill="#82ca9d" />
+                                        <Bar dataKey={String(comparisonYears[0])} name={String(comparisonYears[0])} fill="#8884d8" />
+                                        <Bar dataKey={String(comparisonYears[1])} name={String(comparisonYears[1])} fill="#82ca9d" />
                                     </BarChart>
                                 </ResponsiveContainer>
                             </div>
@@ -7,6 +7,8 @@ import './OfferList.css';
 function OfferList({ filterStatus = null, filterYear = null, myOffers = false }) {
     const [offers, setOffers] = useState([]);
     const [loading, setLoading] = useState(true);
+    const [nextCursor, setNextCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [filters, setFilters] = useState({
         status: filterStatus || '',
         priority: '',
@@ -20,31 +22,46 @@ function OfferList({ filterStatus = null, filterYear = null, myOffers = false })
         fetchOffers();
     }, [filterStatus, myOffers]);
 
-    const fetchOffers = async () => {
-        try {
-            setLoading(true);
+    const fetchPage = async (cursor = null) => {
+        const params = {};
+        if (filterStatus) params.status = filterStatus;
+        if (cursor) params.cursor = cursor;
 
-            const params = {};
-            if (filterStatus) params.status = filterStatus;
+        const response = myOffers
+            ? await offersAPI.getMyOffers(cursor)
+            : await offersAPI.getSummary(params);
 
-            let response;
-            if (myOffers) {
-                response = await offersAPI.getMyOffers();
-            } else {
-                response = await offersAPI.getAll(params);
-            }
+        // Handle both list response (legacy API) and paginated wrapper
+        const offersData = Array.isArray(response.data) ? response.data : (response.data.offers || []);
+        setNextCursor(Array.isArray(response.data) ? null : response.data.next_cursor);
+        return offersData;
+    };
 
-            // Handle both list response (real API) and object wrapper (if any)
-            const offersData = Array.isArray(response.data) ? response.data : (response.data.offers || []);
-            setOffers(offersData);
+    const fetchOffers = async () => {
+        try {
+            setLoading(true);
+            setOffers(await fetchPage());
         } catch (error) {
             console.error('[OfferList] Error:', error);
             setOffers([]);
+            setNextCursor(null);
         } finally {
             setLoading(false);
         }
     };
 
+    const loadMore = async () => {
+        try {
+            setLoadingMore(true);
+            const moreOffers = await fetchPage(nextCursor);
+            setOffers(prev => [...prev, ...moreOffers]);
+        } catch (error) {
+            console.error('[OfferList] Error:', error);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     const getStatusBadge = (status) => {
         const statusMap = {
             'PENDING_REGISTRATION': { class: 'badge-warning', label: 'Da Registrare' },
@@ -77,7 +94,7 @@ function OfferList({ filterStatus = null, filterYear = null, myOffers = false })
             const search = filters.search.toLowerCase();
             return (
                 offer.offer_number?.toString().toLowerCase().includes(search) || // Changed to toString()
-                offer.client?.name?.toLowerCase().includes(search) ||
+                (offer.client_name ?? offer.client?.name)?.toLowerCase().includes(search) ||
                 offer.item_name?.toLowerCase().includes(search) // Added item_name
             );
         }
@@ -195,7 +212,7 @@ function OfferList({ filterStatus = null, filterYear = null, myOffers = false })
                                     <div className="offer-info">
                                         <span className="offer-label">Cliente</span>
                                         <span className="offer-value">
-                                            {offer.client?.name || 'N/A'}
+                                            {offer.client_name || offer.client?.name || 'N/A'}
                                         </span>
                                     </div>
 
@@ -239,6 +256,14 @@ function OfferList({ filterStatus = null, filterYear = null, myOffers = false })
                     })}
                 </div>
             )}
+
+            {nextCursor && (
+                <div className="load-more">
+                    <button className="btn btn-secondary" onClick={loadMore} disabled={loadingMore}>
+                        {loadingMore ? 'Caricamento...' : 'Carica altre offerte'}
+                    </button>
+                </div>
+            )}
         </div>
     );
 }
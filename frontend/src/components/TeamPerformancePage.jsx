@@ -4,9 +4,18 @@ import './Analytics.css';
 
 const COLORS = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#8884D8'];
 
+const TREND_MONTHS = 12;
+
+// First period ("YYYY-MM") of the trend ending at `period`
+const trendStart = (period) => {
+    const [year, month] = period.split('-').map(Number);
+    const start = new Date(year, month - TREND_MONTHS, 1);
+    return `${start.getFullYear()}-${String(start.getMonth() + 1).padStart(2, '0')}`;
+};
+
 const TeamPerformancePage = () => {
     const [period, setPeriod] = useState('2026-01');
-    const [teamMetrics, setTeamMetrics] = useState([]);
+    const [rangeMetrics, setRangeMetrics] = useState([]);
     const [loading, setLoading] = useState(true);
 
     useEffect(() => {
@@ -16,7 +25,8 @@ const TeamPerformancePage = () => {
     const fetchTeamPerformance = async () => {
         try {
             setLoading(true);
-            const response = await fetch(`/analytics/team-performance?period=${period}`, {
+            // One request for the whole trend: one row per user and period
+            const response = await fetch(`/analytics/team-performance?period_from=${trendStart(period)}&period_to=${period}`, {
                 headers: {
                     'Authorization': `Bearer ${localStorage.getItem('token')}`
                 }
@@ -25,7 +35,7 @@ const TeamPerformancePage = () => {
             if (response.ok) {
                 const data = await response.json();
                 // Backend now includes user_name directly
-                setTeamMetrics(data);
+                setRangeMetrics(data);
             }
         } catch (error) {
             console.error('Error fetching team performance:', error);
@@ -34,6 +44,17 @@ const TeamPerformancePage = () => {
         }
     };
 
+    const teamMetrics = rangeMetrics.filter(m => m.period === period);
+
+    // Team totals per period, in period order
+    const trend = Object.values(rangeMetrics.reduce((acc, m) => {
+        const point = acc[m.period] || (acc[m.period] = { period: m.period, offers_handled: 0, success_rate_sum: 0, members: 0 });
+        point.offers_handled += m.offers_handled;
+        point.success_rate_sum += m.success_rate;
+        point.members += 1;
+        return acc;
+    }, {})).map(p => ({ ...p, avg_success_rate: p.success_rate_sum / p.members }));
+
     if (loading) {
         return <div className="analytics-container"><p>Chargement...</p></div>;
     }
@@ -110,6 +131,27 @@ const TeamPerformancePage = () => {
                 </div>
             </div>
 
+            {/* Team Trend */}
+            <div className="card">
+                <div className="card-header">
+                    <h2>Évolution de l'Équipe ({TREND_MONTHS} mois)</h2>
+                </div>
+                <div className="card-body">
+                    <ResponsiveContainer width="100%" height={300}>
+                        <LineChart data={trend}>
+                            <CartesianGrid strokeDasharray="3 3" />
+                            <XAxis dataKey="period" />
+                            <YAxis yAxisId="left" />
+                            <YAxis yAxisId="right" orientation="right" domain={[0, 100]} />
+                            <Tooltip />
+                            <Legend />
+                            <Line yAxisId="left" type="monotone" dataKey="offers_handled" stroke="#0088FE" name="Offres Gérées" />
+                            <Line yAxisId="right" type="monotone" dataKey="avg_success_rate" stroke="#00C49F" name="Taux de Succès Moyen (%)" />
+                        </LineChart>
+                    </ResponsiveContainer>
+                </div>
+            </div>
+
             {/* Success Rate Comparison */}
             <div className="card">
                 <div className="card-header">
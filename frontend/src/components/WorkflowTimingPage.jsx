@@ -2,6 +2,8 @@ import React, { useState, useEffect } from 'react';
 import { BarChart, Bar, LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, Legend, ResponsiveContainer } from 'recharts';
 import './Analytics.css';
 
+const BOTTLENECK_REFRESH_MS = 60 * 1000;
+
 const WorkflowTimingPage = () => {
     const [year, setYear] = useState(2024);
     const [timingStats, setTimingStats] = useState([]);
@@ -12,6 +14,25 @@ const WorkflowTimingPage = () => {
         fetchData();
     }, [year]);
 
+    // Alert durations are computed live by the backend: refresh them every minute
+    useEffect(() => {
+        const timer = setInterval(fetchBottlenecks, BOTTLENECK_REFRESH_MS);
+        return () => clearInterval(timer);
+    }, []);
+
+    const fetchBottlenecks = async () => {
+        try {
+            const bottleneckResponse = await fetch('/analytics/bottlenecks?threshold_hours=48', {
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+            });
+            if (bottleneckResponse.ok) {
+                setBottlenecks(await bottleneckResponse.json());
+            }
+        } catch (error) {
+            console.error('Error fetching bottlenecks:', error);
+        }
+    };
+
     const fetchData = async () => {
         try {
             setLoading(true);
@@ -25,12 +46,7 @@ const WorkflowTimingPage = () => {
             }
 
             // Fetch bottlenecks
-            const bottleneckResponse = await fetch('/analytics/bottlenecks?threshold_hours=48', {
-                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
-            });
-            if (bottleneckResponse.ok) {
-                setBottlenecks(await bottleneckResponse.json());
-            }
+            await fetchBottlenecks();
         } catch (error) {
             console.error('Error fetching workflow timing:', error);
         } finally {
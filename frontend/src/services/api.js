@@ -87,7 +87,7 @@ export const offersAPI = {
 
     getAll: (params = {}) => {
         const queryParams = new URLSearchParams();
-        if (params.skip !== undefined) queryParams.append('skip', params.skip);
+        if (params.cursor) queryParams.append('cursor', params.cursor);
         if (params.limit !== undefined) queryParams.append('limit', params.limit);
         if (params.status) queryParams.append('status', params.status);
         if (params.priority) queryParams.append('priority', params.priority);
@@ -97,8 +97,22 @@ export const offersAPI = {
         return api.get(`/offers/?${queryParams.toString()}`);
     },
 
-    getMyOffers: (skip = 0, limit = 100) =>
-        api.get(`/offers/my-offers?skip=${skip}&limit=${limit}`),
+    // Lightweight rows for the offer grid (client_name instead of nested client)
+    getSummary: (params = {}) => {
+        const queryParams = new URLSearchParams();
+        if (params.cursor) queryParams.append('cursor', params.cursor);
+        if (params.limit !== undefined) queryParams.append('limit', params.limit);
+        if (params.fields) queryParams.append('fields', params.fields);
+        if (params.status) queryParams.append('status', params.status);
+        if (params.priority) queryParams.append('priority', params.priority);
+        if (params.client_id) queryParams.append('client_id', params.client_id);
+        if (params.managed_by_id) queryParams.append('managed_by_id', params.managed_by_id);
+
+        return api.get(`/offers/summary?${queryParams.toString()}`);
+    },
+
+    getMyOffers: (cursor = null, limit = 100) =>
+        api.get(`/offers/my-offers?limit=${limit}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`),
 
     getById: (id) => api.get(`/offers/${id}`),
 
@@ -166,6 +180,7 @@ export const analyticsAPI = {
     getClientRanking: (year) => api.get(`/analytics/client-ranking/${year}`),
     getSectorDistribution: (year) => api.get(`/analytics/sector-distribution/${year}`),
     getItemMix: (year) => api.get(`/analytics/item-mix/${year}`),
+    getBundle: (year, { parts, years } = {}) => api.get(`/analytics/bundle/${year}`, { params: { parts, years } }),
 };
 
 // ============= Dashboard API =============
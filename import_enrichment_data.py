@@ -4,6 +4,8 @@ import os
 from datetime import datetime
 import sys
 
+from backend import data_version
+
 # Add backend to path to use models if needed, but direct SQL is safer for migrations
 DB_PATH = r"C:\Users\HP STORE\Desktop\M54\backend\sql_app.db"
 EXCEL_PATH = r"C:\Users\HP STORE\Desktop\M54\M77_REGISTRO ORDINI_Rev00 DEL 13_09_2024.xlsx"
@@ -60,11 +62,13 @@ def migration():
             for d in dates:
                 # Format to ISO for SQLite
                 d_str = d.strftime('%Y-%m-%d 00:00:00')
+                # dated entries (weekends and holidays of a given year): not recurring
                 cursor.execute("INSERT OR IGNORE INTO holidays (date, description, is_recurring) VALUES (?, ?, ?)", 
-                             (d_str, 'Festivita M77', 1))
+                             (d_str, 'Festivita M77', 0))
     except Exception as e:
         print(f"Error importing holidays: {e}")
 
+    data_version.bump(conn, "clients", "holidays")  # holidays: the working calendar cache
     conn.commit()
     conn.close()
     print("Migration completed successfully.")
@@ -96,8 +96,8 @@ class ExcelImporter:
 
     def run_import(self):
         print("[INFO] Nettoyage et Import...")
-        self.db.query(models.WorkflowStep).delete()
-        self.db.query(models.Offer).delete()
+        self.db.query(models.WorkflowStep).execution_options(refill_rollups=True).delete()
+        self.db.query(models.Offer).execution_options(refill_rollups=True).delete()
         self.db.commit()
 
         m54_file = 'M54_REGISTRO OFFERTE_REV03 DEL 20_03_2024.xlsx'
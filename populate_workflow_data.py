@@ -4,6 +4,8 @@ import random
 from datetime import datetime, timedelta
 import os
 
+from backend import data_version
+
 # Database path
 DB_PATH = 'backend/sql_app.db'
 
@@ -95,6 +97,7 @@ def populate_workflow():
         if count % 100 == 0:
             print(f"Processed {count} offers...")
 
+    data_version.bump(conn, "workflow_steps")
     conn.commit()
     conn.close()
     print(f"Successfully populated workflow steps for {count} offers.")
@@ -0,0 +1,84 @@
+"""
+backend/analytics_cache.py: LRU and TTL eviction, single-flight on
+concurrent misses, and invalidation by the data version (an offer written
+through the ORM must change the cached analytics bundle).
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+from backend import analytics_cache
+from backend.analytics_cache import AnalyticsCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = AnalyticsCache(max_entries=2, ttl=60)
+    cache.get_or_compute("a", lambda: 1)
+    cache.get_or_compute("b", lambda: 2)
+    assert cache.get_or_compute("a", lambda: "recomputed") == 1  # "a" is now the most recent
+    cache.get_or_compute("c", lambda: 3)  # evicts "b"
+    assert cache.get_or_compute("b", lambda: "recomputed") == "recomputed"
+    assert cache.get_or_compute("c", lambda: "recomputed") == 3
+    assert cache.stats()["entries"] == 2
+
+
+def test_ttl_expires_entries(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(analytics_cache.time, "monotonic", lambda: now[0])
+    cache = AnalyticsCache(max_entries=10, ttl=5)
+    cache.get_or_compute("a", lambda: 1)
+    now[0] += 4
+    assert cache.get_or_compute("a", lambda: "recomputed") == 1
+    now[0] += 2
+    assert cache.get_or_compute("a", lambda: "recomputed") == "recomputed"
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_concurrent_misses_compute_once():
+    cache = AnalyticsCache(max_entries=10, ttl=60)
+    calls = []
+    start = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    def worker(results):
+        start.wait()
+        results.append(cache.get_or_compute("key", compute))
+
+    results = []
+    threads = [threading.Thread(target=worker, args=(results,)) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["value"] * 8
+    assert len(calls) == 1
+    assert (cache.hits, cache.misses) == (7, 1)
+
+
+def test_write_invalidates_cached_bundle(db):
+    client = models.Client(name="Cliente", email_domain="cliente.com", sector="Meccanica")
+    db.add(client)
+    db.flush()
+    for i in range(5):
+        db.add(models.Offer(offer_number=f"25{i:05d}", client_id=client.id, mail_date=datetime(2025, 3, 1) + timedelta(days=i),
+                            year_stats=2025, offer_amount=100.0, status=models.OfferStatus.IN_LAVORO))
+    db.commit()
+
+    parts = ["monthly_evolution", "client_ranking"]
+    first = analytics_crud.get_analytics_bundle(db, 2025, parts, [2024])
+    assert analytics_crud.get_analytics_bundle(db, 2025, parts, [2024]) is first  # served from the cache
+
+    db.add(models.Offer(offer_number="2500099", client_id=client.id, mail_date=datetime(2025, 3, 20),
+                        year_stats=2025, offer_amount=1000.0, status=models.OfferStatus.ACCETTATA))
+    db.commit()
+    second = analytics_crud.get_analytics_bundle(db, 2025, parts, [2024])
+    assert second is not first
+    assert second == analytics_crud.get_analytics_bundle.uncached(db, 2025, parts, [2024])
+    assert second != first
+
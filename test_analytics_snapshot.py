@@ -0,0 +1,134 @@
+"""
+ANALYTICS_ENGINE=snapshot must return what the SQL path returns, for every
+analytics function it serves, also after incremental refreshes (rows
+changed since the last updated_at) and after full reloads (deletes).
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+import backend.analytics_enrichment as analytics_enrichment
+import backend.analytics_snapshot as analytics_snapshot
+
+YEAR = 2025
+STATUSES = list(models.OfferStatus) + [None]
+REASONS = list(models.DeclinedReason)
+
+
+def seed(db, n_offers=200):
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com", sector=[None, "Meccanica", "Edile"][i % 3])
+               for i in range(8)]
+    db.add_all(clients)
+    db.flush()
+    start = datetime(2024, 6, 1)
+    for i in range(n_offers):
+        mail_date = start + timedelta(days=i * 3)
+        status = STATUSES[i % len(STATUSES)]
+        offer = models.Offer(
+            offer_number=f"24{i:05d}",
+            client_id=None if i % 17 == 0 else clients[i % len(clients)].id,
+            status=status,
+            mail_date=mail_date,
+            year_stats=mail_date.year,
+            offer_amount=None if i % 6 == 0 else 12.5 * i,
+            is_new_item=i % 3 == 0,
+            declined_reason=REASONS[i % len(REASONS)] if status == models.OfferStatus.DECLINATA else None,
+            not_accepted_reason=f"Motivo {i % 4}" if status == models.OfferStatus.NON_ACCETTATA else None,
+        )
+        offer.workflow_steps = [
+            models.WorkflowStep(department=d, order_index=n, bottleneck_flag=(i + n) % 5 == 0,
+                                actual_duration_minutes=None if (i + n) % 7 == 0 else 30.0 * (i % 50 + n),
+                                started_at=mail_date + timedelta(hours=9),
+                                completed_at=mail_date + timedelta(hours=9 + (i % 40)))
+            for n, d in enumerate(("tecnico", "acquisti"))
+        ]
+        db.add(offer)
+    db.commit()
+
+
+def rounded(value):
+    """Results with floats rounded (pandas and SQLite sum in different orders)"""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, dict):
+        return {k: rounded(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [rounded(v) for v in value]
+    return value
+
+
+def results(db):
+    return rounded({
+        "monthly_evolution": analytics_crud.get_monthly_evolution.uncached(db, YEAR),
+        "comparison": analytics_crud.get_comparison_data.uncached(db, [YEAR - 1, YEAR]),
+        "reasons": analytics_crud.get_reasons_stats.uncached(db, YEAR),
+        "client_ranking": analytics_crud.get_client_ranking.uncached(db, YEAR),
+        "sector_distribution": analytics_crud.get_sector_distribution.uncached(db, YEAR),
+        "item_mix": analytics_crud.get_new_vs_reorder_stats.uncached(db, YEAR),
+        "seasonal_trends": analytics_enrichment.calculate_seasonal_trends.uncached(db, YEAR),
+        "workflow_timing": analytics_enrichment.calculate_workflow_timing_stats.uncached(db, YEAR),
+    })
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    """results() on the SQL path and on the snapshot"""
+    monkeypatch.setattr(analytics_snapshot, "snapshot", analytics_snapshot.AnalyticsSnapshot())
+
+    def run(db):
+        monkeypatch.setattr(analytics_snapshot, "ANALYTICS_ENGINE", "sql")
+        sql = results(db)
+        monkeypatch.setattr(analytics_snapshot, "ANALYTICS_ENGINE", "snapshot")
+        return sql, results(db)
+    return run
+
+
+def test_snapshot_matches_sql(db, engines):
+    seed(db)
+    sql, snapshot = engines(db)
+    assert sql["monthly_evolution"] and sql["client_ranking"] and sql["reasons"]["declined_reasons"]
+    for part in sql:
+        assert snapshot[part] == sql[part], part
+
+
+def test_snapshot_matches_sql_after_incremental_refresh(db, engines, monkeypatch):
+    seed(db)
+    engines(db)  # first load
+    loads = []
+    load = analytics_snapshot.AnalyticsSnapshot._load
+
+    def counting_load(self, db, model, columns, since=None):
+        loads.append((model.__tablename__, since is not None))
+        return load(self, db, model, columns, since)
+    monkeypatch.setattr(analytics_snapshot.AnalyticsSnapshot, "_load", counting_load)
+
+    later = datetime.utcnow() + timedelta(hours=1)  # updated_at after the watermark
+    for offer in db.query(models.Offer).filter(models.Offer.id % 9 == 0):
+        offer.status = models.OfferStatus.ACCETTATA
+        offer.offer_amount = (offer.offer_amount or 0) + 100
+        offer.updated_at = later
+    db.add(models.Offer(offer_number="2599999", client_id=2, status=models.OfferStatus.DECLINATA,
+                        declined_reason=REASONS[0], mail_date=datetime(2025, 8, 1), year_stats=YEAR,
+                        offer_amount=7.0, updated_at=later))
+    step = db.query(models.WorkflowStep).filter_by(department="tecnico").order_by(models.WorkflowStep.id.desc()).first()
+    step.actual_duration_minutes = 600.0
+    step.updated_at = later
+    db.get(models.Client, 3).sector = "Alimentare"
+    db.commit()
+
+    sql, snapshot = engines(db)
+    assert ("offers", True) in loads and ("workflow_steps", True) in loads
+    assert ("offers", False) not in loads  # incremental, no full reload
+    for part in sql:
+        assert snapshot[part] == sql[part], part
+
+    db.delete(db.get(models.Offer, 4))
+    db.commit()
+    sql, snapshot = engines(db)
+    assert ("offers", False) in loads  # row count changed: full reload
+    for part in sql:
+        assert snapshot[part] == sql[part], part
@@ -0,0 +1,74 @@
+"""
+analytics_enrichment.get_bottleneck_alerts: in-progress steps over the
+threshold with durations computed live from started_at (stored durations
+only without a start), offer, client and user read in the same statement,
+longest first.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import backend.models as models
+import backend.analytics_enrichment as analytics_enrichment
+
+IN_PROGRESS = models.WorkflowStepStatus.IN_PROGRESS.value
+COMPLETED = models.WorkflowStepStatus.COMPLETED.value
+
+
+def seed(db):
+    user = models.User(username="tecnico", email="tecnico@benozzi.com", password_hash="x", full_name="Mario Rossi", role="tecnico")
+    client = models.Client(name="Cliente", email_domain="cliente.com")
+    db.add_all([user, client])
+    db.flush()
+    now = datetime.utcnow()
+    # (offer number, client, department, status, started hours ago, stored minutes, flagged, assigned)
+    steps = [
+        ("2500001", client.id, "tecnico", IN_PROGRESS, 50, None, False, user.id),  # live: never flagged or timed
+        ("2500002", client.id, "acquisti", IN_PROGRESS, 10, 6000, True, None),  # stale stored duration: under
+        ("2500003", client.id, "tecnico", COMPLETED, 100, 6000, True, user.id),  # done: history
+        ("2500004", None, "commerciale", IN_PROGRESS, None, 60 * 60, False, None),  # no start: stored 60 h
+        ("2500005", client.id, "tecnico", IN_PROGRESS, None, 60, False, None),  # no start, stored 1 h
+        ("2500006", client.id, "pianificazione", IN_PROGRESS, 200, None, False, user.id),
+    ]
+    for number, client_id, department, status, hours_ago, minutes, flagged, assigned in steps:
+        offer = models.Offer(offer_number=number, client_id=client_id, year_stats=2025)
+        offer.workflow_steps = [models.WorkflowStep(
+            department=department, order_index=0, status=status, assigned_to_id=assigned, bottleneck_flag=flagged,
+            started_at=None if hours_ago is None else now - timedelta(hours=hours_ago), actual_duration_minutes=minutes,
+        )]
+        db.add(offer)
+    db.commit()
+
+
+def test_alerts_are_live_and_joined_in_one_statement(engine, db):
+    seed(db)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        alerts = analytics_enrichment.get_bottleneck_alerts(db, threshold_hours=48)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    assert [(a["offer_number"], a["phase"]) for a in alerts] == [
+        ("2500006", "pianificazione"), ("2500004", "commerciale"), ("2500001", "tecnico")]
+    assert [a["duration_hours"] for a in alerts] == [pytest.approx(200, abs=0.01), 60, pytest.approx(50, abs=0.01)]
+    assert [a["client_name"] for a in alerts] == ["Cliente", "Unknown", "Cliente"]
+    assert [a["assigned_user"] for a in alerts] == ["Mario Rossi", None, "Mario Rossi"]
+    assert alerts[1]["business_hours"] is None  # no start time
+    assert all(a["threshold_hours"] == 48 for a in alerts)
+    assert len([s for s in statements if "workflow_steps" in s]) == 1
+
+
+def test_threshold_and_clock(db, api):
+    seed(db)
+    assert [a["phase"] for a in analytics_enrichment.get_bottleneck_alerts(db, threshold_hours=100)] == ["pianificazione"]
+    assert len(analytics_enrichment.get_bottleneck_alerts(db, threshold_hours=5)) == 4
+    business = analytics_enrichment.get_bottleneck_alerts(db, threshold_hours=48, clock="business")
+    assert {a["phase"] for a in business} <= {"pianificazione", "commerciale", "tecnico"}
+    assert all(a["business_hours"] is None or a["business_hours"] <= a["duration_hours"] for a in business)
+    assert api.get("/analytics/bottlenecks?clock=lunar").status_code == 400
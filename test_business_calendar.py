@@ -0,0 +1,124 @@
+"""
+backend/business_calendar.py: position, at, add_minutes and minutes_between
+around weekends, holidays and shift boundaries, and SLA cut-offs /
+deadlines longer than a year.
+"""
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+import backend.models as models
+from backend import business_calendar, data_version
+from backend.business_calendar import BusinessCalendar
+
+# 2025: 1 January (Wednesday, recurring), 25 April (Friday, this year only), 25 December (Thursday, recurring)
+HOLIDAYS = [(date(2025, 1, 1), True), (date(2025, 4, 25), False), (date(2025, 12, 25), True)]
+DAY = 8 * 60  # 08:00-12:00, 13:00-17:00
+
+
+def calendar():
+    return BusinessCalendar(date(2025, 1, 1), date(2025, 12, 31), HOLIDAYS)
+
+
+def t(*args):
+    return np.datetime64(datetime(*args), "s")
+
+
+def test_open_days_skip_weekends_and_holidays():
+    cal = calendar()
+    assert cal.day_minutes[:5].tolist() == [0, DAY, DAY, 0, 0]  # 1 Jan holiday, Thu, Fri, Sat, Sun
+    assert not cal.open_days[(date(2025, 4, 25) - date(2025, 1, 1)).days]
+    assert not cal.open_days[(date(2025, 12, 25) - date(2025, 1, 1)).days]
+    assert cal.prefix[-1] == DAY * int(cal.open_days.sum())
+
+
+def test_position_inside_and_between_shifts():
+    cal = calendar()
+    monday = cal.position(t(2025, 3, 3, 8, 0))
+    assert cal.position(t(2025, 3, 3, 7, 0)) == monday  # before the shift
+    assert cal.position(t(2025, 3, 3, 12, 30)) - monday == 240  # lunch break
+    assert cal.position(t(2025, 3, 3, 14, 15)) - monday == 315
+    assert cal.position(t(2025, 3, 3, 22, 0)) - monday == DAY
+    assert cal.position(t(2025, 3, 8, 11, 0)) == cal.position(t(2025, 3, 10, 8, 0))  # Saturday = Monday open
+    assert np.isnan(cal.position(np.datetime64("NaT")))
+
+
+def test_minutes_between_spans_weekend_and_holiday():
+    cal = calendar()
+    assert cal.minutes_between(t(2025, 3, 7, 16, 0), t(2025, 3, 10, 9, 0)) == 120  # Friday -> Monday
+    assert cal.minutes_between(t(2025, 4, 24, 16, 0), t(2025, 4, 28, 9, 0)) == 120  # holiday Friday 25 April
+    assert cal.minutes_between(t(2025, 4, 26, 10, 0), t(2025, 4, 27, 10, 0)) == 0
+
+
+def test_at_inverts_position_on_open_days():
+    cal = calendar()
+    times = np.array([t(2025, 3, 3, 8, 1), t(2025, 3, 3, 11, 59), t(2025, 3, 3, 13, 30), t(2025, 6, 30, 16, 0)])
+    assert (cal.at(cal.position(times)) == times).all()
+
+
+def test_at_never_resolves_to_a_closed_day():
+    cal = calendar()
+    # calendar start: 1 January is a holiday, the first open time is Thursday 2 January 08:00
+    assert cal.at(0.0) == t(2025, 1, 2, 8, 0)
+    # every day boundary is the close of an open day
+    times = cal.at(cal.prefix)
+    days = (times.astype("datetime64[D]") - cal.start).astype(int)
+    assert cal.open_days[days].all()
+
+
+def test_add_minutes_at_friday_close_and_holiday_eve():
+    cal = calendar()
+    assert cal.add_minutes(t(2025, 3, 7, 9, 0), 7 * 60) == t(2025, 3, 7, 17, 0)  # Friday close
+    assert cal.add_minutes(t(2025, 3, 7, 17, 0), 1) == t(2025, 3, 10, 8, 1)  # over the weekend
+    assert cal.add_minutes(t(2025, 3, 7, 18, 0), 60) == t(2025, 3, 10, 9, 0)
+    assert cal.add_minutes(t(2025, 4, 24, 16, 0), 120) == t(2025, 4, 28, 9, 0)  # eve of 25 April
+    assert cal.add_minutes(t(2025, 12, 24, 17, 0), 30) == t(2025, 12, 26, 8, 30)  # eve of Christmas
+    assert cal.add_minutes(t(2025, 3, 10, 9, 0), -120) == t(2025, 3, 7, 16, 0)  # backwards
+    # Friday 08:00 and Thursday 17:00 are the same position: the earliest one is returned
+    assert cal.add_minutes(t(2025, 3, 10, 8, 0), -DAY) == t(2025, 3, 6, 17, 0)
+
+
+def test_recurring_holidays_repeat_every_year():
+    cal = BusinessCalendar(date(2025, 1, 1), date(2026, 12, 31), HOLIDAYS)
+    assert not cal.open_days[(date(2026, 12, 25) - date(2025, 1, 1)).days]
+    assert cal.open_days[(date(2026, 4, 27) - date(2025, 1, 1)).days]  # 25 April 2026 is a Saturday anyway
+    assert cal.add_minutes(t(2025, 12, 31, 17, 0), 60) == t(2026, 1, 2, 9, 0)  # over New Year's Day
+
+
+def seed(db):
+    db.add_all([models.Holiday(date=datetime(d.year, d.month, d.day), description="Festa", is_recurring=recurring)
+                for d, recurring in HOLIDAYS])
+    db.commit()
+
+
+def test_sla_cutoff_and_deadline_longer_than_a_year(db):
+    seed(db)
+    hours = 3000  # 375 working days: about a year and a half
+    now = datetime(2027, 3, 10, 10, 0)
+    cutoff = business_calendar.sla_cutoff(db, now, hours)
+    assert cutoff < datetime(2026, 1, 1)
+    assert business_calendar.business_minutes(db, [cutoff], [now])[0] == hours * 60
+    deadline = business_calendar.add_business_hours(db, cutoff, hours)
+    assert deadline == now
+    assert business_calendar.sla_cutoff(db, now, hours, clock="wall") == datetime(2026, 11, 5, 10, 0)
+    with pytest.raises(ValueError):
+        business_calendar.sla_cutoff(db, now, 1, clock="lunar")
+
+
+def test_calendar_is_rebuilt_after_a_plain_sql_holiday_import(engine, db):
+    seed(db)
+    friday = datetime(2025, 3, 7, 9, 0)
+    assert business_calendar.add_business_hours(db, friday, 8) == datetime(2025, 3, 10, 9, 0)
+
+    # what import_enrichment_data.py does: sqlite3 insert, then bump before the commit
+    raw = engine.raw_connection()
+    try:
+        raw.execute("INSERT INTO holidays (date, description, is_recurring) VALUES ('2025-03-10 00:00:00', 'Festivita M77', 0)")
+        data_version.bump(raw, "holidays")
+        raw.commit()
+    finally:
+        raw.close()
+    db.expire_all()
+    assert business_calendar.add_business_hours(db, friday, 8) == datetime(2025, 3, 11, 9, 0)
+
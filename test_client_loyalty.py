@@ -0,0 +1,76 @@
+"""
+analytics_enrichment.calculate_client_loyalty: one grouped query returning
+what the original per-client loop returned, with the top-N limit applied in
+SQL.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+import backend.models as models
+import backend.analytics_enrichment as analytics_enrichment
+
+
+def seed(db, n_clients=12):
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com", loyalty_score=float(i % 4 * 25))
+               for i in range(n_clients)]  # ties on loyalty_score on purpose
+    db.add_all(clients)
+    db.flush()
+    for c, client in enumerate(clients[:-2]):  # the last two have no offers
+        for i in range(c % 5 + 1):
+            db.add(models.Offer(
+                offer_number=f"{c:03d}{i:03d}", client_id=client.id, year_stats=2024 + i % 2,
+                is_new_item=(c + i) % 3 == 0,
+                order_date=None if (c + i) % 4 == 0 else datetime(2024, 1, 1) + timedelta(days=17 * c + i),
+            ))
+    db.commit()
+
+
+def reference_client_loyalty(db, year):
+    """The original implementation: one offers query per client, counted in Python"""
+    loyalty_data = []
+    for client in db.query(models.Client).order_by(models.Client.id).all():
+        offers = db.query(models.Offer).filter(models.Offer.client_id == client.id, models.Offer.year_stats == year).all()
+        if not offers:
+            continue
+        new_items = sum(1 for o in offers if o.is_new_item)
+        total = len(offers)
+        loyalty_data.append({
+            'client_id': client.id,
+            'client_name': client.name,
+            'loyalty_score': client.loyalty_score,
+            'new_items_count': new_items,
+            'reorder_count': total - new_items,
+            'total_offers': total,
+            'reorder_percentage': pytest.approx((total - new_items) / total * 100),
+            'last_order_date': max((o.order_date for o in offers if o.order_date), default=None),
+        })
+    loyalty_data.sort(key=lambda x: x['loyalty_score'], reverse=True)
+    return loyalty_data
+
+
+@pytest.mark.parametrize("year", [2024, 2025, 2030])
+def test_client_loyalty_matches_the_per_client_loop(engine, db, year):
+    seed(db)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        rows = analytics_enrichment.calculate_client_loyalty.uncached(db, year)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert rows == reference_client_loyalty(db, year)
+    assert len(statements) == 1
+
+
+def test_limit_keeps_the_top_clients(db, api):
+    seed(db)
+    everything = analytics_enrichment.calculate_client_loyalty.uncached(db, 2024)
+    assert analytics_enrichment.calculate_client_loyalty.uncached(db, 2024, 3) == everything[:3]
+    response = api.get("/analytics/client-loyalty/2024?limit=3")
+    assert [r["client_id"] for r in response.json()] == [r["client_id"] for r in everything[:3]]
+    assert api.get("/analytics/client-loyalty/2024?limit=0").status_code == 422
@@ -0,0 +1,101 @@
+"""
+crud.get_dashboard_stats (grouped aggregates and rollups) must return the
+numbers of the original per-offer loop, for every role and year filter.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+
+import backend.models as models
+import backend.crud as crud
+
+STATUSES = list(models.OfferStatus) + [None]
+COUNTERS = crud.DASHBOARD_STATUS_COUNTERS
+
+
+def seed(db, n_offers=120):
+    users = [
+        models.User(username=f"user{i}", email=f"user{i}@benozzi.com", password_hash="x",
+                    role=["admin", "commerciale", "tecnico"][i % 3])
+        for i in range(6)
+    ]
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com") for i in range(5)]
+    db.add_all(users + clients)
+    db.flush()
+    start = datetime(2024, 10, 1)
+    for i in range(n_offers):
+        mail_date = None if i % 29 == 0 else start + timedelta(days=i * 4)
+        offer = models.Offer(
+            offer_number=f"24{i:05d}",
+            client_id=None if i % 23 == 0 else clients[i % len(clients)].id,
+            status=STATUSES[i % len(STATUSES)],
+            mail_date=mail_date,
+            year_stats=None if i % 31 == 0 else (mail_date or start).year,
+            offer_amount=None if i % 6 == 0 else 25.0 * i,
+        )
+        offer.workflow_steps = [
+            models.WorkflowStep(department=d, order_index=n, assigned_to_id=users[(i + n) % len(users)].id,
+                                status=["pending", "in_progress", "completed"][(i + n) % 3])
+            for n, d in enumerate(("tecnico", "acquisti")[:1 + i % 2])
+        ]
+        db.add(offer)
+    db.commit()
+    return users
+
+
+def reference_stats(db, user_role=None, user_id=None, year=None):
+    """The original loop over every offer, extended to the monthly, client and department breakdowns"""
+    stats = {k: 0 for k in ("total_offers", "pending_registration", "in_progress", "ready_to_send", "sent",
+                            "accepted", "declined")}
+    stats.update(total_value=0.0, monthly_stats={}, by_client={}, by_department={}, by_year={})
+    offers = db.query(models.Offer).all()
+    if user_role not in (None, "admin", "commerciale"):
+        offers = [o for o in offers if any(s.assigned_to_id == user_id for s in o.workflow_steps)]
+    if year:
+        offers = [o for o in offers if o.year_stats == year]
+    for offer in offers:
+        stats["total_offers"] += 1
+        offer_year = str(offer.year_stats) if offer.year_stats else "N/A"
+        stats["by_year"][offer_year] = stats["by_year"].get(offer_year, 0) + 1
+        counter = COUNTERS.get(str(offer.status).upper() if offer.status else "")
+        if counter:
+            stats[counter] += 1
+        value = offer.offer_amount or 0.0
+        stats["total_value"] += value
+        month = offer.mail_date.strftime("%Y-%m") if offer.mail_date else "N/A"
+        client = offer.client.name if offer.client else "N/A"
+        for target, key in ((stats["monthly_stats"], month), (stats["by_client"], client)):
+            bucket = target.setdefault(key, {"count": 0, "value": 0.0})
+            bucket["count"] += 1
+            bucket["value"] += value
+        for step in offer.workflow_steps:
+            department = stats["by_department"].setdefault(step.department or "N/A", {"total": 0, "open": 0})
+            department["total"] += 1
+            department["open"] += step.status in ("pending", "in_progress")
+    return stats
+
+
+def approx(stats):
+    stats = dict(stats, total_value=pytest.approx(stats["total_value"]))
+    for key in ("monthly_stats", "by_client"):
+        stats[key] = {k: {"count": v["count"], "value": pytest.approx(v["value"])} for k, v in stats[key].items()}
+    return stats
+
+
+@pytest.mark.parametrize("year", [None, 2024, 2025])
+def test_dashboard_matches_the_per_offer_loop(db, year):
+    users = seed(db)
+    for user in users[:3]:  # admin, commerciale, department user
+        got = crud.get_dashboard_stats(db, user.role, user.id, year)
+        assert approx(got) == reference_stats(db, user.role, user.id, year), (user.role, year)
+
+
+def test_dashboard_follows_writes(db):
+    seed(db)
+    offer = db.get(models.Offer, 5)
+    offer.status = models.OfferStatus.ACCETTATA
+    offer.offer_amount = 999.0
+    offer.workflow_steps[0].status = "completed"
+    db.delete(db.get(models.Offer, 6))
+    db.commit()
+    assert approx(crud.get_dashboard_stats(db)) == reference_stats(db)
@@ -0,0 +1,68 @@
+"""
+backend/data_version.py: conditional GETs answer 304 while the data is
+unchanged, and the validators move after ORM writes and after plain SQL
+writes followed by data_version.bump().
+"""
+from datetime import datetime
+
+import pytest
+
+import backend.models as models
+from backend import data_version
+
+
+def seed(db):
+    client = models.Client(name="Cliente", email_domain="cliente.com")
+    db.add(client)
+    db.flush()
+    db.add(models.Offer(offer_number="2500001", client_id=client.id, mail_date=datetime(2025, 3, 1), year_stats=2025))
+    db.commit()
+
+
+def get(api, url, etag=None):
+    response = api.get(url, headers={"If-None-Match": etag} if etag else {})
+    assert response.status_code in (200, 304), response.text
+    return response
+
+
+def test_matching_etag_gets_304_until_a_write(db, api):
+    seed(db)
+    for url in ("/clients/", "/offers/", "/analytics/monthly-evolution/2025"):
+        first = get(api, url)
+        assert first.status_code == 200 and first.headers["ETag"].startswith('W/"')
+        assert get(api, url, first.headers["ETag"]).status_code == 304
+
+    etags = {url: get(api, url).headers["ETag"] for url in ("/clients/", "/analytics/monthly-evolution/2025")}
+    db.add(models.Client(name="Altro cliente", email_domain="altro.com"))
+    db.commit()
+    for url, etag in etags.items():
+        after = get(api, url, etag)
+        assert after.status_code == 200 and after.headers["ETag"] != etag
+
+
+def test_rolled_back_write_keeps_the_validator(db):
+    seed(db)
+    before = data_version.version_validator(db, "clients")
+    db.add(models.Client(name="Altro cliente", email_domain="altro.com"))
+    db.flush()
+    db.rollback()
+    assert data_version.version_validator(db, "clients") == before
+
+
+def test_plain_sql_write_with_bump_changes_the_validator(engine, db, api):
+    seed(db)
+    etag = get(api, "/clients/").headers["ETag"]
+
+    raw = engine.raw_connection()
+    try:
+        raw.execute("UPDATE clients SET loyalty_score = 50")
+        data_version.bump(raw, "clients")
+        raw.commit()
+        with pytest.raises(ValueError):
+            data_version.bump(raw, "no_such_table")
+    finally:
+        raw.close()
+
+    after = get(api, "/clients/", etag)
+    assert after.status_code == 200 and after.headers["ETag"] != etag
+    assert after.json()[0]["loyalty_score"] == 50
@@ -90,12 +90,18 @@ except Exception as e:
 # Test 5: Offers list
 print("\n--- TEST LISTE OFFRES ---")
 try:
-    r = requests.get("http://localhost:8000/offers?skip=0&limit=10", headers=headers, timeout=5)
+    r = requests.get("http://localhost:8000/offers/?limit=10", headers=headers, timeout=5)
     if r.status_code == 200:
-        offers = r.json()
+        page = r.json()
+        offers = page["offers"]
         print(f"[OK] Offres récupérées: {len(offers)}")
         if offers:
             print(f"[OK] Première offre: ID={offers[0].get('id')}, Client={offers[0].get('client_name', 'N/A')}")
+        if page.get("next_cursor"):
+            r = requests.get("http://localhost:8000/offers/", params={"limit": 10, "cursor": page["next_cursor"]},
+                             headers=headers, timeout=5)
+            print(f"[OK] Page suivante: {len(r.json()['offers'])} offres" if r.status_code == 200
+                  else f"[ERREUR] Page suivante: {r.status_code}")
     else:
         print(f"[ERREUR] Offers: {r.status_code}")
         print(f"Réponse: {r.text[:200]}")
@@ -0,0 +1,65 @@
+"""
+The offer list endpoints must issue a constant number of SQL statements
+whatever the page size (no per-row lazy loads of client, manager or
+purchasing_manager).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import backend.models as models
+
+
+def seed(db, n_offers=60):
+    users = [
+        models.User(username=f"user{i}", email=f"user{i}@benozzi.com", password_hash="x", role="commerciale")
+        for i in range(5)
+    ]
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com") for i in range(10)]
+    db.add_all(users + clients)
+    db.flush()
+    start = datetime(2025, 1, 1)
+    for i in range(n_offers):
+        db.add(models.Offer(
+            offer_number=f"25{i:05d}",
+            client_id=clients[i % len(clients)].id,
+            managed_by_id=users[i % len(users)].id,
+            purchasing_manager_id=users[(i + 1) % len(users)].id,
+            mail_date=start + timedelta(days=i),
+            created_at=start + timedelta(hours=i // 3),  # ties on created_at on purpose
+            year_stats=2025,
+        ))
+    db.commit()
+
+
+def count_statements(engine, api, url):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = api.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+
+def test_offer_list_query_count_is_constant(engine, db, api):
+    seed(db)
+    counts = {}
+    for limit in (1, 10, 50):
+        counts[limit], page = count_statements(engine, api, f"/offers/?limit={limit}")
+        assert len(page["offers"]) == limit
+        assert all(o["client"] and o["manager"] and o["purchasing_manager"] for o in page["offers"])
+    assert len(set(counts.values())) == 1, f"statement count grows with page size: {counts}"
+
+    # Following a cursor must not add per-row statements either
+    n, page = count_statements(engine, api, f"/offers/?limit=50&cursor={page['next_cursor']}")
+    assert n == counts[50], f"cursor page used {n} statements, first page {counts[50]}"
+
+    n_detail, offer = count_statements(engine, api, f"/offers/{page['offers'][0]['id']}")
+    assert offer["client"] and offer["manager"]
+    assert n_detail == 1, f"offer detail used {n_detail} statements"
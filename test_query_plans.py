@@ -0,0 +1,142 @@
+"""
+The analytics, offer list and workflow queries must use the indexes created
+by backend/migrations.py (checked with EXPLAIN QUERY PLAN on the SQL the
+crud functions actually emit).
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect
+
+import backend.models as models
+import backend.crud as crud
+import backend.analytics_crud as analytics_crud
+import backend.analytics_enrichment as analytics_enrichment
+from backend import rollups
+from backend.migrations import MIGRATIONS, run_migrations
+
+
+def seed(engine, db, n_offers=200):
+    users = [
+        models.User(username=f"user{i}", email=f"user{i}@benozzi.com", password_hash="x", role="commerciale")
+        for i in range(20)
+    ]
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com", sector=f"S{i % 3}") for i in range(20)]
+    db.add_all(users + clients)
+    db.flush()
+    statuses = list(models.OfferStatus)
+    start = datetime(2024, 1, 1)
+    for i in range(n_offers):
+        offer = models.Offer(
+            offer_number=f"24{i:05d}",
+            client_id=clients[i % len(clients)].id,
+            managed_by_id=users[i % len(users)].id,
+            status=statuses[i % len(statuses)],
+            mail_date=start + timedelta(days=i * 3),
+            year_stats=(start + timedelta(days=i * 3)).year,
+            offer_amount=100.0 * i,
+        )
+        offer.workflow_steps = [
+            models.WorkflowStep(department=d, order_index=n, assigned_to_id=users[(i + n) % len(users)].id)
+            for n, d in enumerate(("tecnico", "acquisti"))
+        ]
+        db.add(offer)
+    db.commit()
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+
+def query_plans(engine, session_factory, fn):
+    """Run fn(db) and return the EXPLAIN QUERY PLAN text of every SELECT it issued"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = session_factory()
+    try:
+        fn(db)
+    finally:
+        db.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            plans.append("\n".join(row[-1] for row in rows))
+    assert plans, "no SELECT issued"
+    return plans
+
+
+def assert_uses(plan, index, covering=False):
+    marker = f"COVERING INDEX {index}" if covering else f"INDEX {index}"
+    assert marker in plan, f"expected {marker}:\n{plan}"
+
+
+def test_analytics_queries_use_year_indexes(engine, session_factory, db):
+    seed(engine, db)
+    year_analytics = (
+        lambda db: analytics_crud.get_monthly_evolution.uncached(db, 2024),
+        lambda db: analytics_crud.get_comparison_data.uncached(db, [2024, 2025]),
+        lambda db: analytics_enrichment.calculate_seasonal_trends.uncached(db, 2024),
+        lambda db: analytics_crud.get_sector_distribution.uncached(db, 2024),
+        lambda db: analytics_crud.get_new_vs_reorder_stats.uncached(db, 2024),
+    )
+    for fn in year_analytics:  # offer_monthly_facts, searched on its primary key
+        for plan in query_plans(engine, session_factory, fn):
+            assert "SEARCH offer_monthly_facts" in plan and "(year_stats=?)" in plan, plan
+    for plan in query_plans(engine, session_factory, lambda db: analytics_crud.get_client_ranking.uncached(db, 2024)):
+        assert_uses(plan, "ix_offers_client_year", covering=True)
+        assert "SCAN offers" not in plan, plan
+
+
+def test_offer_list_uses_keyset_indexes(engine, session_factory, db):
+    seed(engine, db)
+    for plan in query_plans(engine, session_factory, lambda db: crud.get_offers_page(db, limit=20)):
+        assert_uses(plan, "ix_offers_created_at_id")
+        assert "TEMP B-TREE" not in plan, plan
+    for plan in query_plans(engine, session_factory, lambda db: crud.get_offer_summaries_page(db, limit=20, managed_by_id=1)):
+        assert_uses(plan, "ix_offers_managed_by_created_at")
+        assert "TEMP B-TREE" not in plan, plan
+
+
+def test_workflow_steps_use_offer_order_index(engine, session_factory, db):
+    seed(engine, db)
+    for plan in query_plans(engine, session_factory, lambda db: crud.get_workflow_steps(db, 1)):
+        assert_uses(plan, "ix_workflow_steps_offer_order")
+        assert "TEMP B-TREE" not in plan, plan
+    for plan in query_plans(engine, session_factory, lambda db: crud.get_offers_for_department(db, 1)):
+        assert_uses(plan, "ix_workflow_steps_assigned_to_id")
+
+
+def test_migration_adds_indexes_to_existing_database(engine, session_factory, db):
+    seed(engine, db)
+    updated_at = dict(db.query(models.Offer.id, models.Offer.updated_at))
+    db.close()
+    with engine.begin() as conn:
+        for table in (models.Offer.__table__, models.WorkflowStep.__table__):
+            for index in table.indexes:
+                if index.name.startswith(("ix_offers_year", "ix_offers_client", "ix_offers_created", "ix_offers_managed",
+                                          "ix_offers_mail", "ix_workflow_steps_offer", "ix_workflow_steps_assigned")):
+                    index.drop(bind=conn)
+        for column in ("mail_year", "mail_month", "mail_week"):
+            conn.exec_driver_sql(f"ALTER TABLE offers DROP COLUMN {column}")
+        models.SchemaMigration.__table__.drop(bind=conn, checkfirst=True)
+        models.OfferCounter.__table__.drop(bind=conn)  # a database from before the rollups
+        models.OfferMonthlyFact.__table__.drop(bind=conn)
+        models.DepartmentStepCounter.__table__.drop(bind=conn)
+
+    assert run_migrations(engine) == [v for v, _, _ in MIGRATIONS]
+    assert run_migrations(engine) == []
+    names = {i["name"] for i in inspect(engine).get_indexes("offers")}
+    assert {"ix_offers_year_status_mail_date", "ix_offers_created_at_id"} <= names
+    with session_factory() as db:
+        assert db.query(models.OfferMonthlyFact).count() > 0
+        assert db.query(models.DepartmentStepCounter).count() > 0
+        assert rollups.find_drift(db) == []
+        for offer in db.query(models.Offer):
+            assert (offer.mail_year, offer.mail_month, offer.mail_week) == models.mail_calendar(offer.mail_date)
+            assert offer.updated_at == updated_at[offer.id]  # deriving the mail columns is not an edit
+
@@ -0,0 +1,185 @@
+"""
+offer_counters, offer_monthly_facts and department_step_counters must stay
+equal to the offers and steps after every ORM write path (find_drift() ==
+[]), and bulk UPDATE/DELETE statements must not leave them stale. Outside migrations, refill() refuses
+a database without the mail calendar columns.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import exc, func, select, update
+
+import backend.models as models
+import backend.crud as crud
+from backend import rollups
+
+
+def seed(db, n_offers=30):
+    users = [
+        models.User(username=f"user{i}", email=f"user{i}@benozzi.com", password_hash="x", role="commerciale")
+        for i in range(3)
+    ]
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com", sector=f"S{i % 2}") for i in range(4)]
+    db.add_all(users + clients)
+    db.flush()
+    start = datetime(2024, 11, 1)
+    for i in range(n_offers):
+        db.add(models.Offer(
+            offer_number=f"24{i:05d}",
+            client_id=clients[i % len(clients)].id,
+            managed_by_id=users[i % len(users)].id,
+            status=models.OfferStatus.IN_LAVORO,
+            mail_date=start + timedelta(days=i * 5),
+            year_stats=(start + timedelta(days=i * 5)).year,
+            offer_amount=None if i % 7 == 0 else 100.0 * i,
+            is_new_item=i % 2 == 0,
+        ))
+    db.commit()
+
+
+def counted(db):
+    return db.query(func.sum(models.OfferCounter.offer_count)).scalar()
+
+
+def test_create_keeps_rollups_in_step(db):
+    seed(db)
+    assert counted(db) == 30
+    assert rollups.find_drift(db) == []
+    db.add(models.Offer(offer_number="2500001", client_id=1, managed_by_id=1, status=models.OfferStatus.ACCETTATA,
+                        mail_date=datetime(2025, 3, 4), year_stats=2025, offer_amount=50.0))
+    db.commit()
+    assert counted(db) == 31
+    assert rollups.find_drift(db) == []
+
+
+def test_status_change_keeps_rollups_in_step(db):
+    seed(db)
+    for offer in db.query(models.Offer).filter(models.Offer.id <= 10):
+        offer.status = models.OfferStatus.ACCETTATA
+    db.commit()
+    assert rollups.find_drift(db) == []
+    assert db.query(func.sum(models.OfferCounter.offer_count)).filter(
+        models.OfferCounter.status == "ACCETTATA").scalar() == 10
+
+
+def test_mail_date_change_moves_buckets(db):
+    seed(db)
+    offer = db.get(models.Offer, 1)
+    offer.mail_date = datetime(2026, 6, 15)
+    offer.year_stats = 2026
+    offer.offer_amount = 999.0
+    db.commit()
+    assert (offer.mail_year, offer.mail_month) == (2026, 6)
+    assert rollups.find_drift(db) == []
+    assert db.query(func.sum(models.OfferMonthlyFact.offer_value)).filter(
+        models.OfferMonthlyFact.mail_year == 2026).scalar() == 999.0
+
+
+def test_delete_keeps_rollups_in_step(db):
+    seed(db)
+    for offer in db.query(models.Offer).filter(models.Offer.id % 3 == 0):
+        db.delete(offer)
+    db.commit()
+    assert counted(db) == 20
+    assert rollups.find_drift(db) == []
+
+
+def test_client_sector_change_moves_facts(db):
+    seed(db)
+    db.get(models.Client, 1).sector = "Nuovo"
+    db.commit()
+    assert rollups.find_drift(db) == []
+
+
+def test_bulk_offer_writes_are_refused_or_refilled(db):
+    seed(db)
+    with pytest.raises(exc.InvalidRequestError):
+        db.execute(update(models.Offer).values(status=models.OfferStatus.DECLINATA))
+    db.rollback()
+    with pytest.raises(exc.InvalidRequestError):
+        db.query(models.Offer).filter(models.Offer.id < 5).delete()
+    db.rollback()
+    assert rollups.find_drift(db) == []
+
+    db.execute(update(models.Offer).where(models.Offer.id <= 5).values(offer_amount=1.0),
+               execution_options={"refill_rollups": True})
+    db.query(models.Offer).filter(models.Offer.id > 25).execution_options(refill_rollups=True).delete()
+    db.commit()
+    assert counted(db) == 25
+    assert rollups.find_drift(db) == []
+
+
+
+def test_refill_needs_the_mail_calendar_outside_migrations(engine, db):
+    seed(db)
+    expected = {model: db.query(model).count() for model in rollups.ROLLUPS}
+    db.close()
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_offers_mail_year_month")
+        for column in ("mail_year", "mail_month", "mail_week"):
+            conn.exec_driver_sql(f"ALTER TABLE offers DROP COLUMN {column}")
+        with pytest.raises(RuntimeError):
+            rollups.refill(conn)
+        # what migrations 2 and 3 do on a database older than migration 4
+        rollups.refill(conn, from_mail_date=True)
+        for model, count in expected.items():
+            assert conn.execute(select(func.count()).select_from(model)).scalar() == count
+
+
+def add_steps(db):
+    for offer in db.query(models.Offer).filter(models.Offer.id <= 10):
+        offer.workflow_steps = [
+            models.WorkflowStep(department=d, order_index=n, status=s)
+            for n, (d, s) in enumerate((("tecnico", "completed"), ("acquisti", "in_progress"), ("commerciale", "pending")))
+        ]
+    db.commit()
+
+
+def by_department(db, year=None):
+    """by_department from the rollup, and from the steps x offers join it replaces"""
+    stats = crud.get_dashboard_stats(db, year=year)["by_department"]
+    filters = [models.Offer.year_stats == year] if year else []
+    joined = {d or "N/A": {"total": n, "open": int(o or 0)} for d, n, o in crud._aggregate_department_steps(db, filters)}
+    return stats, joined
+
+
+def test_step_writes_keep_department_counters_in_step(db):
+    seed(db)
+    add_steps(db)
+    stats, joined = by_department(db)
+    assert stats == joined and stats["acquisti"] == {"total": 10, "open": 10}
+
+    step = db.query(models.WorkflowStep).filter_by(department="acquisti").first()
+    step.status = "completed"
+    db.query(models.WorkflowStep).filter_by(department="tecnico").first().department = "pianificazione"
+    db.delete(db.query(models.WorkflowStep).filter_by(department="commerciale").first())
+    db.get(models.Offer, 2).year_stats = 2030  # its steps move to 2030
+    db.delete(db.get(models.Offer, 3))  # its steps go with it
+    db.commit()
+    assert rollups.find_drift(db) == []
+    for year in (None, 2024, 2030):
+        stats, joined = by_department(db, year)
+        assert stats == joined, year
+    assert by_department(db, 2030)[0] == {
+        "tecnico": {"total": 1, "open": 0}, "acquisti": {"total": 1, "open": 1}, "commerciale": {"total": 1, "open": 1}}
+
+
+def test_bulk_step_writes_are_refused_or_refilled(db):
+    seed(db)
+    add_steps(db)
+    # flags only: allowed, no counter moves (SLA watchdog)
+    db.execute(update(models.WorkflowStep).values(bottleneck_flag=True))
+    with pytest.raises(exc.InvalidRequestError):
+        db.execute(update(models.WorkflowStep).values(status="completed"))
+    db.rollback()
+    with pytest.raises(exc.InvalidRequestError):
+        db.query(models.WorkflowStep).filter(models.WorkflowStep.id < 5).delete()
+    db.rollback()
+
+    db.execute(update(models.WorkflowStep).where(models.WorkflowStep.department == "acquisti").values(status="completed"),
+               execution_options={"refill_rollups": True})
+    db.query(models.WorkflowStep).filter(models.WorkflowStep.id > 20).execution_options(refill_rollups=True).delete()
+    db.commit()
+    assert rollups.find_drift(db) == []
+    stats, joined = by_department(db)
+    assert stats == joined and stats["acquisti"]["open"] == 0
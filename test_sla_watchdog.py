@@ -0,0 +1,108 @@
+"""
+backend/sla_watchdog.py: tick() flags and clears the in-progress steps
+crossing the threshold, writes nothing (no data version bump) when nothing
+changes, and run() survives a failing tick.
+"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import backend.models as models
+from backend import data_version, sla_watchdog
+
+NOW = datetime(2025, 3, 12, 10, 0)  # a Wednesday
+IN_PROGRESS = models.WorkflowStepStatus.IN_PROGRESS.value
+COMPLETED = models.WorkflowStepStatus.COMPLETED.value
+
+
+def seed(db, steps):
+    """One offer with a step per (department, status, started_at)"""
+    client = models.Client(name="Cliente", email_domain="cliente.com")
+    db.add(client)
+    db.flush()
+    offer = models.Offer(offer_number="2500001", client_id=client.id, mail_date=datetime(2025, 3, 1), year_stats=2025)
+    offer.workflow_steps = [
+        models.WorkflowStep(department=department, status=status, started_at=started_at, order_index=i)
+        for i, (department, status, started_at) in enumerate(steps)
+    ]
+    db.add(offer)
+    db.commit()
+
+
+def flags(db):
+    db.expire_all()
+    return {s.department: bool(s.bottleneck_flag) for s in db.query(models.WorkflowStep)}
+
+
+def versions(db):
+    return data_version.get_versions(db, [data_version.GLOBAL, "workflow_steps"])
+
+
+def test_tick_flags_and_clears_on_the_wall_clock(db):
+    seed(db, [
+        ("tecnico", IN_PROGRESS, NOW - timedelta(hours=50)),
+        ("acquisti", IN_PROGRESS, NOW - timedelta(hours=10)),
+        ("pianificazione", COMPLETED, NOW - timedelta(hours=100)),  # history: left alone
+        ("commerciale", IN_PROGRESS, None),
+    ])
+    notifications = sla_watchdog.tick(db, now=NOW, threshold_hours=48, clock="wall")
+    assert [(n["phase"], n["bottleneck"]) for n in notifications] == [("tecnico", True)]
+    assert notifications[0]["offer_number"] == "2500001" and "48 ore" in notifications[0]["message"]
+    assert flags(db) == {"tecnico": True, "acquisti": False, "pianificazione": False, "commerciale": False}
+
+    # started_at moved forward: back under the threshold
+    db.query(models.WorkflowStep).filter_by(department="tecnico").one().started_at = NOW - timedelta(hours=1)
+    db.commit()
+    notifications = sla_watchdog.tick(db, now=NOW, threshold_hours=48, clock="wall")
+    assert [(n["phase"], n["bottleneck"]) for n in notifications] == [("tecnico", False)]
+    assert "rientrata" in notifications[0]["message"]
+    assert not any(flags(db).values())
+
+
+def test_tick_without_changes_writes_nothing(db):
+    seed(db, [("tecnico", IN_PROGRESS, NOW - timedelta(hours=50))])
+    assert sla_watchdog.tick(db, now=NOW, threshold_hours=48, clock="wall")
+    before = versions(db)
+    assert sla_watchdog.tick(db, now=NOW, threshold_hours=48, clock="wall") == []
+    assert sla_watchdog.tick(db, now=NOW + timedelta(hours=1), threshold_hours=48, clock="wall") == []
+    assert versions(db) == before
+
+
+def test_tick_counts_business_hours(db):
+    # 24 business hours (3 days of 8 h) before Wednesday 10:00 is Friday 10:00 (120 wall hours)
+    seed(db, [
+        ("tecnico", IN_PROGRESS, datetime(2025, 3, 7, 9, 0)),
+        ("acquisti", IN_PROGRESS, datetime(2025, 3, 7, 11, 0)),
+    ])
+    notifications = sla_watchdog.tick(db, now=NOW, threshold_hours=24, clock="business")
+    assert [(n["phase"], n["bottleneck"]) for n in notifications] == [("tecnico", True)]
+    assert "ore lavorative" in notifications[0]["message"]
+    with pytest.raises(ValueError):
+        sla_watchdog.tick(db, now=NOW, clock="lunar")
+
+
+def test_run_survives_a_failing_tick(db, session_factory, capsys):
+    seed(db, [("tecnico", IN_PROGRESS, datetime.utcnow() - timedelta(hours=50))])
+    calls = []
+
+    def failing_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("database is locked")
+        return session_factory()
+
+    async def scenario():
+        received = asyncio.Queue()
+        task = asyncio.create_task(sla_watchdog.run(failing_once, received.put, interval=0,
+                                                    threshold_hours=48, clock="wall"))
+        try:
+            return await asyncio.wait_for(received.get(), timeout=5)
+        finally:
+            task.cancel()
+
+    message = asyncio.run(scenario())
+    assert message["type"] == "sla_bottleneck" and message["bottleneck"] is True
+    assert len(calls) >= 2
+    assert "tick failed: database is locked" in capsys.readouterr().out
+
@@ -0,0 +1,83 @@
+"""
+analytics_enrichment.get_team_performance: one joined statement returning
+what the original per-metric user lookups returned, for one period or a
+period_from/period_to range, and the period validation of the endpoint.
+"""
+import pytest
+from sqlalchemy import event
+
+import backend.models as models
+import backend.analytics_enrichment as analytics_enrichment
+
+PERIODS = ["2024-11", "2024-12", "2025-01", "2025-02"]
+
+
+def seed(db):
+    users = [models.User(username=f"user{i}", email=f"user{i}@benozzi.com", password_hash="x",
+                         full_name=f"Utente {i}", role="tecnico") for i in range(4)]
+    db.add_all(users)
+    db.flush()
+    for p, period in enumerate(PERIODS):
+        for u, user in enumerate(users):
+            db.add(models.UserPerformanceMetrics(
+                user_id=user.id, period=period, offers_handled=p * 10 + u, avg_processing_time_hours=1.5 * u,
+                success_rate=10.0 * p, current_workload=u, accepted_count=p, declined_count=u,
+            ))
+    db.add(models.UserPerformanceMetrics(user_id=99, period="2025-01", offers_handled=1))  # user since removed
+    db.commit()
+
+
+def reference_team_performance(db, period):
+    """The original implementation: metrics of the period, then one user lookup per metric"""
+    result = []
+    for metric in db.query(models.UserPerformanceMetrics).filter(models.UserPerformanceMetrics.period == period).all():
+        user = db.query(models.User).filter(models.User.id == metric.user_id).first()
+        result.append({
+            'user_id': metric.user_id,
+            'user_name': user.full_name if user else f'User {metric.user_id}',
+            'period': metric.period,
+            'offers_handled': metric.offers_handled,
+            'avg_processing_time_hours': metric.avg_processing_time_hours,
+            'success_rate': metric.success_rate,
+            'current_workload': metric.current_workload,
+            'accepted_count': metric.accepted_count,
+            'declined_count': metric.declined_count,
+        })
+    return result
+
+
+def test_team_performance_matches_the_per_metric_lookups(engine, db):
+    seed(db)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        rows = analytics_enrichment.get_team_performance.uncached(db, "2025-01")
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert rows == reference_team_performance(db, "2025-01")
+    assert rows[-1]["user_name"] == "User 99"
+    assert len(statements) == 1
+
+
+def test_period_range_is_one_row_per_member_and_period(db):
+    seed(db)
+    rows = analytics_enrichment.get_team_performance.uncached(db, "2024-12", "2025-02")
+    assert rows == [row for period in PERIODS[1:] for row in reference_team_performance(db, period)]
+    assert analytics_enrichment.get_team_performance.uncached(db, "2023-01", "2023-12") == []
+
+
+def test_period_parameters_are_validated(db, api):
+    seed(db)
+    assert analytics_enrichment.parse_period_range(None, "2024-12", None) == ("2024-12", "2024-12")
+    assert analytics_enrichment.parse_period_range(None, None, "2025-01") == ("2025-01", "2025-01")
+    for bad in ((None, None, None), ("2025-01", "2024-12", None), (None, "2025-02", "2024-12"),
+                ("2025-13", None, None), ("25-01", None, None)):
+        with pytest.raises(ValueError):
+            analytics_enrichment.parse_period_range(*bad)
+    assert api.get("/analytics/team-performance?period=2025-1").status_code == 400
+    response = api.get("/analytics/team-performance?period_from=2024-11&period_to=2024-12")
+    assert response.status_code == 200 and len(response.json()) == 8
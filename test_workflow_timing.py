@@ -0,0 +1,102 @@
+"""
+/analytics/workflow-timing statistics (percentiles, histogram, business
+hours) against values computed by hand on a fixture, on both the SQL path
+and the snapshot path.
+"""
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import backend.models as models
+import backend.analytics_enrichment as analytics_enrichment
+import backend.analytics_snapshot as analytics_snapshot
+
+# (department, duration hours or None, bottleneck, started_at, completed_at)
+STEPS = [
+    ("tecnico", 0.5, False, datetime(2025, 3, 3, 8), datetime(2025, 3, 3, 17)),  # Monday: 8 business hours
+    ("tecnico", 2, False, datetime(2025, 3, 7, 16), datetime(2025, 3, 10, 9)),  # Friday -> Monday: 2
+    ("tecnico", 6, False, None, None),
+    ("tecnico", 10, False, None, None),
+    ("tecnico", 30, False, None, None),
+    ("tecnico", 50, True, None, None),
+    ("tecnico", 100, True, None, None),
+    ("tecnico", 200, True, None, None),
+    ("tecnico", None, False, None, None),  # no duration: only counted in total_steps
+    ("tecnico", 0, False, None, None),  # zero duration: same as no duration
+    ("acquisti", 1, False, None, None),  # bucket edges are inclusive on the left
+    ("acquisti", 1, False, None, None),
+    ("acquisti", 4, False, None, None),
+    ("acquisti", 47.5, True, None, None),
+    ("acquisti", 168, True, None, None),
+]
+
+
+def seed(db):
+    client = models.Client(name="Cliente", email_domain="cliente.com")
+    db.add(client)
+    db.flush()
+    offer = models.Offer(offer_number="2500001", client_id=client.id, mail_date=datetime(2025, 3, 1), year_stats=2025)
+    offer.workflow_steps = [
+        models.WorkflowStep(department=department, order_index=i, bottleneck_flag=bottleneck,
+                            actual_duration_minutes=None if hours is None else int(hours * 60),
+                            started_at=started_at, completed_at=completed_at)
+        for i, (department, hours, bottleneck, started_at, completed_at) in enumerate(STEPS)
+    ]
+    db.add(offer)
+    db.commit()
+
+
+def histogram(*counts):
+    edges = [0, 1, 4, 8, 24, 48, 72, 168, None]
+    return [{"from_hours": low, "to_hours": high, "count": n} for low, high, n in zip(edges, edges[1:], counts)]
+
+
+EXPECTED = {
+    "tecnico": {
+        "avg_duration_hours": 398.5 / 8, "min_duration_hours": 0.5, "max_duration_hours": 200,
+        "bottleneck_count": 3, "total_steps": 10,
+        # 8 durations, linear interpolation: p50 at rank 3.5, p90 at 6.3, p99 at 6.93
+        "p50_duration_hours": 20, "p90_duration_hours": 130, "p99_duration_hours": 193,
+        "avg_business_hours": 5, "p90_business_hours": 7.4,
+        "histogram": histogram(1, 1, 1, 1, 1, 1, 1, 1),
+    },
+    "acquisti": {
+        "avg_duration_hours": 221.5 / 5, "min_duration_hours": 1, "max_duration_hours": 168,
+        "bottleneck_count": 2, "total_steps": 5,
+        "p50_duration_hours": 4, "p90_duration_hours": 119.8, "p99_duration_hours": 163.18,
+        "avg_business_hours": 0, "p90_business_hours": 0,
+        "histogram": histogram(0, 2, 1, 0, 1, 0, 0, 1),
+    },
+}
+
+
+def assert_matches(results):
+    assert [r["phase"] for r in results] == ["tecnico", "acquisti"]
+    for result in results:
+        for key, want in EXPECTED[result["phase"]].items():
+            assert result[key] == (want if key == "histogram" else pytest.approx(want)), (result["phase"], key)
+
+
+def test_sql_path_matches_hand_computed_stats(db):
+    seed(db)
+    assert_matches(analytics_enrichment.calculate_workflow_timing_stats.uncached(db, 2025))
+
+
+def test_snapshot_path_matches_hand_computed_stats(db, monkeypatch):
+    monkeypatch.setattr(analytics_snapshot, "ANALYTICS_ENGINE", "snapshot")
+    monkeypatch.setattr(analytics_snapshot, "snapshot", analytics_snapshot.AnalyticsSnapshot())
+    seed(db)
+    assert_matches(analytics_enrichment.calculate_workflow_timing_stats.uncached(db, 2025))
+
+
+def test_steps_without_department_are_left_out():
+    steps = pd.DataFrame({
+        "department": ["tecnico", None, "", "tecnico"],
+        "actual_duration_minutes": [60.0, 120.0, 180.0, np.nan],
+        "bottleneck_flag": [False, True, True, None],
+    })
+    results = analytics_enrichment._workflow_timing_from(steps, np.full(4, np.nan))
+    assert [(r["phase"], r["total_steps"], r["bottleneck_count"]) for r in results] == [("tecnico", 2, 0)]
+
@@ -0,0 +1,173 @@
+"""
+Year analytics read from offer_monthly_facts must return what the original
+queries on offers returned (reference implementations below, from before
+the rollup), also after incremental updates, and the reports reuse the
+cached results.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import case, func
+
+import backend.models as models
+import backend.analytics_crud as analytics_crud
+import backend.analytics_enrichment as analytics_enrichment
+from backend import analytics_cache, rollups
+from backend.reports import ReportGenerator
+
+STATUSES = list(models.OfferStatus) + [None]
+DECLINED = [models.OfferStatus.DECLINATA, models.OfferStatus.NON_ACCETTATA]
+
+
+def seed(db, n_offers=240):
+    clients = [models.Client(name=f"Cliente {i}", email_domain=f"cliente{i}.com", sector=[None, "Meccanica", "Edile"][i % 3])
+               for i in range(6)]
+    db.add_all(clients)
+    db.flush()
+    start = datetime(2024, 1, 3)
+    for i in range(n_offers):
+        mail_date = None if i % 41 == 0 else start + timedelta(days=i * 3)
+        db.add(models.Offer(
+            offer_number=f"24{i:05d}",
+            client_id=clients[i % len(clients)].id,
+            status=STATUSES[i % len(STATUSES)],
+            mail_date=mail_date,
+            year_stats=(mail_date or start).year,
+            offer_amount=None if i % 5 == 0 else 10.0 * i,
+            is_new_item=i % 4 == 0,
+        ))
+    db.commit()
+
+
+def month_counts(db, year, *filters, value=False):
+    """{month: count} (or {month: (count, value)}) from offers, as before offer_monthly_facts"""
+    month = func.strftime('%m', models.Offer.mail_date)
+    columns = [month, func.count(models.Offer.id)] + ([func.sum(models.Offer.offer_amount)] if value else [])
+    rows = db.query(*columns).filter(models.Offer.year_stats == year, *filters).group_by(month).all()
+    return {int(r[0]): (r[1], float(r[2] or 0)) if value else r[1] for r in rows if r[0]}
+
+
+def reference_monthly_evolution(db, year):
+    requests = month_counts(db, year)
+    proposed = month_counts(db, year, models.Offer.status != models.OfferStatus.PENDING_REGISTRATION)
+    accepted = month_counts(db, year, models.Offer.status == models.OfferStatus.ACCETTATA, value=True)
+    declined = month_counts(db, year, models.Offer.status.in_(DECLINED))
+    return [
+        {
+            "month": datetime(year, m, 1).strftime('%B'), "year": year,
+            "requests": requests.get(m, 0), "proposed": proposed.get(m, 0),
+            "accepted": accepted.get(m, (0, 0.0))[0], "declined": declined.get(m, 0),
+            "total_value": 0.0, "order_value": accepted.get(m, (0, 0.0))[1],
+        }
+        for m in range(1, 13)
+    ]
+
+
+def test_monthly_evolution_matches_the_per_metric_queries(db):
+    seed(db)
+    for year in (2024, 2025, 2026):
+        got = [e.model_dump() for e in analytics_crud.get_monthly_evolution.uncached(db, year)]
+        assert got == reference_monthly_evolution(db, year), year
+
+
+def test_reports_share_the_cached_monthly_evolution(db):
+    seed(db)
+    ReportGenerator(db).generate_excel_analytics(2024)
+    misses = analytics_cache.cache.misses
+    pdf = ReportGenerator(db).generate_pdf_summary(2024)
+    assert pdf.getvalue().startswith(b"%PDF")
+    assert analytics_cache.cache.misses == misses  # second generator: served from the cache
+
+
+def reference_comparison(db, years):
+    metrics = {k: [dict({"month": datetime(2000, m, 1).strftime('%B')}, **{str(y): 0 for y in years}) for m in range(1, 13)]
+               for k in ("requests", "declined", "proposed", "accepted", "order_value")}
+    for year in years:
+        for m, n in month_counts(db, year).items():
+            metrics["requests"][m - 1][str(year)] = n
+        for m, n in month_counts(db, year, models.Offer.status.in_(DECLINED)).items():
+            metrics["declined"][m - 1][str(year)] = n
+        for m, n in month_counts(db, year, models.Offer.status != models.OfferStatus.PENDING_REGISTRATION).items():
+            metrics["proposed"][m - 1][str(year)] = n
+        for m, (n, value) in month_counts(db, year, models.Offer.status == models.OfferStatus.ACCETTATA, value=True).items():
+            metrics["accepted"][m - 1][str(year)] = n
+            metrics["order_value"][m - 1][str(year)] = value
+    return metrics
+
+
+def test_comparison_matches_the_per_year_queries(db):
+    seed(db)
+    for years in ([2024], [2025, 2024], [2023, 2024, 2025, 2026]):
+        assert analytics_crud.get_comparison_data.uncached(db, years) == reference_comparison(db, years), years
+
+
+def test_comparison_years_are_validated():
+    assert analytics_crud.parse_years("2025, 2024,2025,") == [2025, 2024]
+    for bad in ("", "2024,abc", "1999", "2101", ",".join(str(y) for y in range(2000, 2011))):
+        with pytest.raises(ValueError):
+            analytics_crud.parse_years(bad)
+
+
+def reference_sector_distribution(db, year):
+    rows = db.query(
+        models.Client.sector, func.count(models.Offer.id), func.sum(models.Offer.offer_amount)
+    ).join(models.Offer).filter(models.Offer.year_stats == year).group_by(models.Client.sector).all()
+    return {sector or "Altro": (n, float(value or 0)) for sector, n, value in rows}
+
+
+def reference_new_vs_reorder(db, year):
+    stats = {"new": {"count": 0, "value": 0.0}, "reorder": {"count": 0, "value": 0.0}}
+    for is_new, n, value in db.query(models.Offer.is_new_item, func.count(models.Offer.id), func.sum(models.Offer.offer_amount)
+                                      ).filter(models.Offer.year_stats == year).group_by(models.Offer.is_new_item):
+        stats["new" if is_new else "reorder"] = {"count": n, "value": float(value or 0)}
+    return stats
+
+
+def reference_seasonal_trends(db, year):
+    month = func.strftime('%Y-%m', models.Offer.mail_date)
+    rows = db.query(
+        month, func.count(models.Offer.id),
+        func.sum(case((models.Offer.status == 'ACCETTATA', 1), else_=0)),
+        func.sum(case((models.Offer.status == 'DECLINATA', 1), else_=0)),
+        func.avg(models.Offer.offer_amount),
+    ).filter(models.Offer.year_stats == year).group_by(month).order_by(month).all()
+    return [{"month": m, "total_offers": n, "accepted": a, "declined": d, "avg_value": pytest.approx(v or 0),
+             "prediction_next_month": None} for m, n, a, d, v in rows]
+
+
+def assert_facts_match_offers(db):
+    assert rollups.find_drift(db) == []
+    for year in (2024, 2025, 2026):
+        sectors = {s["sector"]: (s["count"], pytest.approx(s["value"]))
+                   for s in analytics_crud.get_sector_distribution.uncached(db, year)}
+        assert sectors == reference_sector_distribution(db, year), year
+        assert analytics_crud.get_new_vs_reorder_stats.uncached(db, year) == reference_new_vs_reorder(db, year), year
+        assert analytics_enrichment.calculate_seasonal_trends.uncached(db, year) == reference_seasonal_trends(db, year), year
+        got = [e.model_dump() for e in analytics_crud.get_monthly_evolution.uncached(db, year)]
+        assert got == reference_monthly_evolution(db, year), year
+
+
+def test_year_analytics_match_the_offer_queries_after_incremental_updates(db):
+    seed(db)
+    assert_facts_match_offers(db)
+
+    db.get(models.Client, 2).sector = "Alimentare"
+    for offer in db.query(models.Offer).filter(models.Offer.id % 7 == 0):
+        offer.status = models.OfferStatus.ACCETTATA
+        offer.offer_amount = (offer.offer_amount or 0) + 5
+    db.get(models.Offer, 10).mail_date = datetime(2025, 12, 31)
+    db.delete(db.get(models.Offer, 11))
+    db.add(models.Offer(offer_number="2599999", client_id=3, status=models.OfferStatus.DECLINATA,
+                        mail_date=datetime(2025, 6, 1), year_stats=2025, offer_amount=42.0, is_new_item=True))
+    db.commit()
+    assert_facts_match_offers(db)
+
+
+def test_bundle_checks_the_path_year(db, api):
+    seed(db)
+    assert api.get("/analytics/bundle/2000?parts=comparison").json()["comparison"]["requests"][0].keys() == {"month", "2000"}
+    body = api.get("/analytics/bundle/2025?parts=comparison").json()
+    assert body["comparison"] == reference_comparison(db, [2024, 2025])
+    for year in (1999, 2101):
+        assert api.get(f"/analytics/bundle/{year}").status_code == 400
+    assert api.get("/analytics/bundle/2025?years=1999").status_code == 400